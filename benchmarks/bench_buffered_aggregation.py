@@ -0,0 +1,138 @@
+"""Wall-clock time to a target accuracy: synchronous FedAvg vs buffered FedBuff at the edge.
+
+The edge aggregation code (StreamingAggregator, staleness_weight, mix) is the one used by
+FedAvgLogger/FedBuffLogger; clients are simulated with a multinomial logistic regression
+trained by local SGD on synthetic data. Client training times are drawn from a heavy
+tailed distribution (a fraction of the clients are stragglers) and the clock is virtual,
+so the benchmark is deterministic and runs in seconds.
+
+Usage (from the repository root):
+    python benchmarks/bench_buffered_aggregation.py --clients 20 --buffer-size 5 --target 0.65
+"""
+import argparse
+import heapq
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from common.aggregation import StreamingAggregator, staleness_weight, mix  # noqa: E402
+
+
+def make_data(rng, num_clients, samples_per_client, dim, classes):
+    centers = rng.normal(scale=0.5, size=(classes, dim))
+    def sample(n):
+        y = rng.integers(0, classes, size=n)
+        return centers[y] + rng.normal(size=(n, dim)), y
+    shards = [sample(samples_per_client) for _ in range(num_clients)]
+    return shards, sample(2000)
+
+
+def local_sgd(weights, shard, epochs, lr, batch_size, rng):
+    w, b = weights[0].copy(), weights[1].copy()
+    X, y = shard
+    for _ in range(epochs):
+        order = rng.permutation(len(y))
+        for start in range(0, len(y), batch_size):
+            idx = order[start:start + batch_size]
+            logits = X[idx] @ w + b
+            logits -= logits.max(axis=1, keepdims=True)
+            p = np.exp(logits)
+            p /= p.sum(axis=1, keepdims=True)
+            p[np.arange(len(idx)), y[idx]] -= 1.0
+            w -= lr * X[idx].T @ p / len(idx)
+            b -= lr * p.mean(axis=0)
+    return [w, b]
+
+
+def accuracy(weights, test):
+    X, y = test
+    return float(((X @ weights[0] + weights[1]).argmax(axis=1) == y).mean())
+
+
+def training_time(rng, speed):
+    return speed * rng.lognormal(mean=0.0, sigma=0.25)
+
+
+def run_sync(args, shards, test, speeds, init, rng):
+    weights, clock, rnd, acc = init, 0.0, 0, accuracy(init, test)
+    aggregator = StreamingAggregator()
+    while clock < args.max_time:
+        rnd += 1
+        aggregator.reset()
+        round_time = 0.0
+        for shard, speed in zip(shards, speeds):
+            update = local_sgd(weights, shard, args.local_epochs, args.lr, args.batch_size, rng)
+            aggregator.add_ndarrays(update, len(shard[1]))
+            round_time = max(round_time, training_time(rng, speed))
+        weights = aggregator.result()
+        clock += round_time
+        acc = accuracy(weights, test)
+        if acc >= args.target:
+            return clock, rnd, acc
+    return None, rnd, acc
+
+
+def run_buffered(args, shards, test, speeds, init, rng):
+    weights, version = init, 0
+    aggregator = StreamingAggregator()
+    events = []
+    for cid, (shard, speed) in enumerate(zip(shards, speeds)):
+        update = local_sgd(weights, shard, args.local_epochs, args.lr, args.batch_size, rng)
+        heapq.heappush(events, (training_time(rng, speed), cid, version, update))
+    buffered, clock = 0, 0.0
+    aggregator.reset()
+    while clock < args.max_time:
+        clock, cid, dispatched, update = heapq.heappop(events)
+        weight = len(shards[cid][1]) * staleness_weight(version - dispatched, args.staleness_exponent)
+        aggregator.add_ndarrays(update, weight)
+        buffered += 1
+        if buffered == args.buffer_size:
+            weights = mix(weights, aggregator.result(), args.server_lr)
+            version += 1
+            buffered = 0
+            aggregator.reset()
+            acc = accuracy(weights, test)
+            if acc >= args.target:
+                return clock, version, acc
+        # the client is dispatched again right away with the current model
+        update = local_sgd(weights, shards[cid], args.local_epochs, args.lr, args.batch_size, rng)
+        heapq.heappush(events, (clock + training_time(rng, speeds[cid]), cid, version, update))
+    return None, version, accuracy(weights, test)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20, help="clients on the edge server")
+    parser.add_argument("--buffer-size", type=int, default=5, help="FedBuff K")
+    parser.add_argument("--staleness-exponent", type=float, default=0.5)
+    parser.add_argument("--server-lr", type=float, default=1.0)
+    parser.add_argument("--stragglers", type=float, default=0.2, help="fraction of slow clients")
+    parser.add_argument("--straggler-slowdown", type=float, default=5.0)
+    parser.add_argument("--target", type=float, default=0.65, help="target test accuracy")
+    parser.add_argument("--local-epochs", type=int, default=1)
+    parser.add_argument("--lr", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--samples", type=int, default=200, help="samples per client")
+    parser.add_argument("--max-time", type=float, default=2000.0, help="simulated seconds before giving up")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    shards, test = make_data(rng, args.clients, args.samples, dim=20, classes=10)
+    speeds = rng.lognormal(mean=0.0, sigma=0.3, size=args.clients)
+    slow = rng.random(args.clients) < args.stragglers
+    speeds[slow] *= args.straggler_slowdown
+    init = [rng.normal(scale=1.0, size=(20, 10)), np.zeros(10)]
+
+    print(f"{args.clients} clients, {slow.sum()} stragglers (x{args.straggler_slowdown}), target accuracy {args.target}")
+    print(f"{'mode':<10}{'time to target':>16}{'rounds':>8}{'accuracy':>10}")
+    for name, run in (("sync", run_sync), ("buffered", run_buffered)):
+        elapsed, rounds, acc = run(args, shards, test, speeds, init, np.random.default_rng(args.seed + 1))
+        shown = f"{elapsed:.2f}s" if elapsed is not None else "not reached"
+        print(f"{name:<10}{shown:>16}{rounds:>8}{acc:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
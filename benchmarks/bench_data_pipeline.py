@@ -0,0 +1,85 @@
+"""Samples per second of the client data pipeline: torchvision + ToTensor vs the cached loader.
+
+The legacy pipeline is the one client.py used: a FashionMNIST-like dataset decoding each
+item through PIL and ToTensor, wrapped by random_split, batched by a default DataLoader.
+The cached pipeline is client/fl_data: the shard is decoded once into a uint8 .npy cache,
+memory mapped and served by whole batches. Synthetic 28x28 images are used, so nothing
+is downloaded.
+
+Usage (from the repository root):
+    python benchmarks/bench_data_pipeline.py --samples 60000 --fraction 0.1 --workers 0 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset, random_split
+from torchvision.transforms import ToTensor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "client"))
+from fl_data import build_cache, CachedDataset, make_loader  # noqa: E402
+
+
+class FashionMNISTLike(Dataset):
+    """Same storage and per-item decoding as torchvision.datasets.FashionMNIST."""
+
+    def __init__(self, samples, seed=0):
+        rng = np.random.default_rng(seed)
+        self.data = torch.from_numpy(rng.integers(0, 256, size=(samples, 28, 28), dtype=np.uint8))
+        self.targets = torch.from_numpy(rng.integers(0, 10, size=samples))
+        self.transform = ToTensor()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        img = Image.fromarray(self.data[index].numpy(), mode="L")
+        return self.transform(img), int(self.targets[index])
+
+
+def samples_per_second(loader, epochs):
+    for _ in loader:  # warm up workers and page cache
+        break
+    samples, start = 0, time.perf_counter()
+    for _ in range(epochs):
+        for X, y in loader:
+            samples += y.size(0)
+    return samples / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=60000, help="size of the full dataset")
+    parser.add_argument("--fraction", type=float, default=0.1, help="client shard, as a fraction of the dataset")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0])
+    args = parser.parse_args()
+
+    full = FashionMNISTLike(args.samples)
+    shard = int(args.fraction * args.samples)
+    generator = torch.Generator()
+    legacy_shard, _ = random_split(full, [shard, args.samples - shard], generator=generator)
+    indices = torch.randperm(args.samples, generator=torch.Generator())[:shard].numpy()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        cache = build_cache(cache_dir, "bench", lambda: full)
+        print(f"cache built in {time.perf_counter() - start:.2f}s, shard of {shard} samples, batch size {args.batch_size}")
+        cached_shard = CachedDataset(*cache, indices=indices)
+
+        print(f"{'pipeline':<10}{'workers':>8}{'samples/s':>12}")
+        for workers in args.workers:
+            legacy = DataLoader(legacy_shard, batch_size=args.batch_size, shuffle=True, num_workers=workers)
+            cached = make_loader(cached_shard, args.batch_size, shuffle=True, num_workers=workers)
+            for name, loader in (("legacy", legacy), ("cached", cached)):
+                print(f"{name:<10}{workers:>8}{samples_per_second(loader, args.epochs):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Wall time of the local training of a client round: the legacy loop vs LocalTrainer.
+
+The legacy loop is the one FlowerClient.fit used: a new SGD optimizer every round and a
+tqdm progress bar over one epoch. LocalTrainer (client/fl_utils/trainer.py) keeps its
+optimizer and is measured in fp32, with bfloat16 CPU autocast, in channels-last layout
+and compiled. Synthetic 28x28 batches are used, so nothing is downloaded.
+
+Usage (from the repository root):
+    python benchmarks/bench_local_training.py --samples 6000 --hidden-units 10 --threads 1 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import torch
+from torch import optim
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "client"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from common.models import build_model  # noqa: E402
+from fl_utils.trainer import LocalTrainer  # noqa: E402
+
+
+def synthetic_batches(samples, batch_size, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    X = torch.rand(samples, 1, 28, 28, generator=generator)
+    y = torch.randint(0, 10, (samples,), generator=generator)
+    return [(X[i:i + batch_size], y[i:i + batch_size]) for i in range(0, samples, batch_size)]
+
+
+def legacy_round(model, loader):
+    criterion = torch.nn.CrossEntropyLoss()
+    opt = optim.SGD(model.parameters(), lr=0.01, momentum=0.9)
+    model.train()
+    for X, y in tqdm(loader, desc="Training...", file=open(os.devnull, "w")):
+        opt.zero_grad()
+        loss = criterion(model(X), y)
+        loss.backward()
+        opt.step()
+
+
+def round_time(train_round, rounds):
+    train_round()  # warm up (and compile)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        train_round()
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=6000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--hidden-units", type=int, default=10)
+    parser.add_argument("--architecture", type=json.loads, default=None,
+                        help='common/models architecture as JSON, e.g. \'{"name": "cnn", "channels": [32, 64, 128]}\' '
+                             '(default: ModelV2 with --hidden-units)')
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--compile", action="store_true", help="also measure torch.compile")
+    args = parser.parse_args()
+    architecture = args.architecture or {"name": "model_v2", "hidden_units": args.hidden_units}
+
+    loader = synthetic_batches(args.samples, args.batch_size)
+    variants = {
+        "legacy": None,
+        "trainer_fp32": {},
+        "trainer_bf16": {"precision": "bf16"},
+        "trainer_channels_last": {"channels_last": True},
+        "trainer_bf16_channels_last": {"precision": "bf16", "channels_last": True},
+    }
+    if args.compile:
+        variants["trainer_compile"] = {"compile": True}
+
+    print(f"{args.samples} samples, batch {args.batch_size}, model {architecture}, {args.rounds} rounds")
+    print(f"{'variant':<30}{'threads':>8}{'round (s)':>11}{'samples/s':>11}{'speedup':>9}")
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        baseline = None
+        for name, options in variants.items():
+            model = build_model(architecture)
+            if options is None:
+                elapsed = round_time(lambda: legacy_round(model, loader), args.rounds)
+            else:
+                trainer = LocalTrainer(model, **options)
+                elapsed = round_time(lambda: trainer.train(loader), args.rounds)
+            baseline = baseline or elapsed
+            print(f"{name:<30}{threads:>8}{elapsed:>11.3f}{args.samples / elapsed:>11.0f}{baseline / elapsed:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
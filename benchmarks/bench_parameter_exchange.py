@@ -0,0 +1,101 @@
+"""Cost of moving the weights in and out of the client model, per fit and per evaluate.
+
+Compares the state-dict based helpers of client/fl_utils/utils.py with ParameterExchange
+(client/fl_utils/exchange.py). A fit loads the global model and exports the trained one,
+an evaluate only loads the global model. For each we report the mean time and the number
+and size of the allocations: tensors (torch profiler) and ndarrays (tracemalloc).
+
+Usage (from the repository root):
+    python benchmarks/bench_parameter_exchange.py --hidden-units 64 --iterations 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import torch
+from torch.profiler import profile, ProfilerActivity
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "client"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from common.models import build_model  # noqa: E402
+from fl_utils.utils import set_model_params, get_model_ndarrays  # noqa: E402
+from fl_utils.exchange import ParameterExchange  # noqa: E402
+
+
+def tensor_allocations(step):
+    """Number and bytes of the tensor allocations made by one call of `step`."""
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        step()
+    sizes = [e.self_cpu_memory_usage for e in prof.events() if e.self_cpu_memory_usage > 0]
+    return len(sizes), sum(sizes)
+
+
+def array_allocations(step):
+    """Python/numpy memory blocks left allocated by one call of `step`, and the traced peak."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    step()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "lineno")
+    return sum(max(s.count_diff, 0) for s in stats), peak
+
+
+def mean_time(step, iterations):
+    step()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        step()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hidden-units", type=int, default=64)
+    parser.add_argument("--architecture", type=json.loads, default=None,
+                        help='common/models architecture as JSON, e.g. \'{"name": "cnn", "channels": [32, 64, 128]}\' '
+                             '(default: ModelV2 with --hidden-units)')
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+    architecture = args.architecture or {"name": "model_v2", "hidden_units": args.hidden_units}
+    torch.set_num_threads(args.threads)
+
+    model = build_model(architecture)
+    incoming = [np.random.rand(*a.shape).astype(a.dtype) for a in get_model_ndarrays(model)]
+    size = sum(a.nbytes for a in incoming)
+    exchange = ParameterExchange(model)
+    flat = ParameterExchange(build_model(architecture), flatten=True)
+
+    variants = {
+        "state_dict": {
+            "fit": lambda: (set_model_params(model, incoming), get_model_ndarrays(model)),
+            "evaluate": lambda: set_model_params(model, incoming),
+        },
+        "exchange": {
+            "fit": lambda: (exchange.set_ndarrays(incoming), exchange.get_ndarrays()),
+            "evaluate": lambda: exchange.set_ndarrays(incoming),
+        },
+        "exchange_flat": {
+            "fit": lambda: (flat.set_ndarrays(incoming), flat.flat_view()),
+            "evaluate": lambda: flat.set_ndarrays(incoming),
+        },
+    }
+
+    print(f"model: {len(incoming)} tensors, {size / 1024:.1f} KiB, {args.iterations} iterations")
+    print(f"{'variant':<15}{'call':<10}{'time (us)':>11}{'tensor allocs':>15}{'tensor KiB':>12}{'py allocs':>11}{'py peak KiB':>13}")
+    for name, calls in variants.items():
+        for call, step in calls.items():
+            elapsed = mean_time(step, args.iterations)
+            t_count, t_bytes = tensor_allocations(step)
+            a_count, a_peak = array_allocations(step)
+            print(f"{name:<15}{call:<10}{elapsed * 1e6:>11.1f}{t_count:>15}{t_bytes / 1024:>12.1f}{a_count:>11}{a_peak / 1024:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
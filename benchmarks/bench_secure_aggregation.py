@@ -0,0 +1,117 @@
+"""Cost of secure aggregation at the edge tier: pairwise-masked updates vs plain FedAvg.
+
+For 10, 100 and 1000 clients per edge server, measures the time a client takes to mask
+its update, the time the edge server takes to unmask the sum (SecAggServer.aggregate) vs
+folding plain updates into a StreamingAggregator, and the bytes of one update. A second
+secure round drops `--dropouts` clients and includes the mask recovery exchange.
+Clients run in process, the model has the shapes of ModelV2 (common/models/cnn.py).
+
+Usage (from the repository root):
+    python benchmarks/bench_secure_aggregation.py --clients 10 100 1000 --neighbors 16 --dropouts 2
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from flwr.common import Code, FitIns, FitRes, GetPropertiesRes, Status, ndarrays_to_parameters
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from common.aggregation import StreamingAggregator  # noqa: E402
+from common.secagg import PUBLIC_KEY, SecAggClient, SecAggServer, decode_peers  # noqa: E402
+
+OK = Status(code=Code.OK, message="")
+SHAPES = [(10, 1, 3, 3), (10,), (10, 10, 3, 3), (10,), (10, 10, 3, 3), (10,), (10, 10, 3, 3), (10,), (10, 490), (10,)]
+
+
+class LocalProxy:
+    """In-process client: answers the key and mask recovery requests of the edge server."""
+
+    def __init__(self, cid, update, num_examples):
+        self.cid = cid
+        self.update = update
+        self.num_examples = num_examples
+        self.secagg = SecAggClient.from_seed(cid)
+
+    def get_properties(self, ins, timeout, group_id):
+        return GetPropertiesRes(status=OK, properties={PUBLIC_KEY: self.secagg.public_key})
+
+    def masked_fit(self, config):
+        masked = self.secagg.mask(self.update, self.num_examples, config["secagg_cid"],
+                                  config["secagg_round"], decode_peers(config["secagg_peers"]))
+        return FitRes(status=OK, parameters=ndarrays_to_parameters([masked]), num_examples=self.num_examples, metrics={})
+
+    def fit(self, ins, timeout, group_id):
+        config = ins.config
+        masks = self.secagg.recover(config["secagg_cid"], config["secagg_round"], decode_peers(config["secagg_peers"]),
+                                    json.loads(config["secagg_dropped"]), config["secagg_size"])
+        return FitRes(status=OK, parameters=ndarrays_to_parameters([masks]), num_examples=0, metrics={})
+
+
+def plain_round(proxies):
+    aggregator = StreamingAggregator()
+    results = [ndarrays_to_parameters(p.update) for p in proxies]
+    start = time.perf_counter()
+    for proxy, parameters in zip(proxies, results):
+        aggregator.add(parameters, proxy.num_examples)
+    weights = aggregator.result()
+    return weights, time.perf_counter() - start, sum(len(t) for t in results[0].tensors)
+
+
+def secure_round(server, rnd, proxies, reference, dropouts=0):
+    instructions = server.configure(rnd, [(p, FitIns(parameters=None, config={})) for p in proxies])
+    start = time.perf_counter()
+    results = [(proxy, proxy.masked_fit(ins.config)) for proxy, ins in instructions]
+    mask_time = (time.perf_counter() - start) / len(results)
+    # the first clients of every `len // dropouts` block never answer
+    if dropouts:
+        step = len(results) // dropouts
+        results = [r for i, r in enumerate(results) if i % step or i // step >= dropouts]
+    start = time.perf_counter()
+    weights = server.aggregate(rnd, results, reference)
+    return weights, mask_time, time.perf_counter() - start, len(results[0][1].parameters.tensors[0])
+
+
+def expected(proxies):
+    total = sum(p.num_examples for p in proxies)
+    return [sum(p.update[i] * p.num_examples for p in proxies) / total for i in range(len(SHAPES))]
+
+
+def max_error(weights, reference):
+    return max(float(np.max(np.abs(w - r))) for w, r in zip(weights, reference))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--neighbors", type=int, default=16)
+    parser.add_argument("--dropouts", type=int, default=2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{sum(int(np.prod(s)) for s in SHAPES)} parameters, {args.neighbors} neighbors, {args.dropouts} dropouts")
+    print(f"{'clients':>8}{'mask (ms)':>11}{'plain agg (ms)':>16}{'secure agg (ms)':>17}"
+          f"{'w/ dropouts (ms)':>18}{'plain B':>10}{'secure B':>10}{'max error':>11}")
+    for n in args.clients:
+        proxies = [LocalProxy(f"client_{i}", [rng.standard_normal(s).astype(np.float32) * 0.1 for s in SHAPES],
+                              int(rng.integers(100, 1000))) for i in range(n)]
+        reference = [np.zeros(s, dtype=np.float32) for s in SHAPES]
+        _, plain_time, plain_bytes = plain_round(proxies)
+        server = SecAggServer(neighbors=args.neighbors, max_dropouts=args.dropouts, timeout=None)
+        weights, mask_time, secure_time, secure_bytes = secure_round(server, 1, proxies, reference)
+        error = max_error(weights, expected(proxies))
+        dropout_time = float("nan")
+        if args.dropouts and n > 2 * args.dropouts:
+            step = n // args.dropouts
+            survivors = [p for i, p in enumerate(proxies) if i % step or i // step >= args.dropouts]
+            weights, _, dropout_time, _ = secure_round(server, 2, proxies, reference, args.dropouts)
+            error = max(error, max_error(weights, expected(survivors)))
+        print(f"{n:>8}{mask_time * 1e3:>11.2f}{plain_time * 1e3:>16.1f}{secure_time * 1e3:>17.1f}"
+              f"{dropout_time * 1e3:>18.1f}{plain_bytes:>10}{secure_bytes:>10}{error:>11.1e}")
+        server.executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
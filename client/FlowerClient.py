@@ -1,11 +1,17 @@
+import json
 import torch
 import flwr as fl
-from torch import optim
 from tqdm import tqdm
 from torchmetrics import Accuracy
 from torch.utils.data import DataLoader
-from fl_utils.utils import set_model_params, get_model_ndarrays
-from model import ModelV2
+from fl_utils.exchange import ParameterExchange
+from fl_utils.trainer import LocalTrainer
+from fl_data import Throughput
+from common.compression import UpdateCodec
+from common.hashing import ModelCache
+from common.models import ParameterSchema
+from common.secagg import PUBLIC_KEY, SecAggClient, decode_peers
+from common.telemetry import telemetry
 
 
 class FlowerClient(fl.client.NumPyClient):
@@ -20,44 +26,114 @@ class FlowerClient(fl.client.NumPyClient):
                  testloader: DataLoader, 
                  criterion=torch.nn.CrossEntropyLoss(), 
                  metric=Accuracy(task="multiclass", num_classes=10),
+                 codec: UpdateCodec | None = None,
+                 trainer: LocalTrainer | None = None,
+                 secagg: SecAggClient | None = None,
+                 client_id: str | None = None,
                 ):
         self.model = model
+        # built before the exchange: it may change the memory layout of the weights
+        self.trainer = trainer or LocalTrainer(model, criterion)
+        # in-place copies between the model and the ndarrays exchanged with Flower
+        self.exchange = ParameterExchange(model)
         self.trainloader = trainloader
         self.testloader = testloader
         self.criterion = criterion
         self.metric = metric
+        # compression of the updates sent to the edge server
+        self.codec = codec or UpdateCodec()
+        # global models received, the edge server sends only the hash of one already received
+        self.models = ModelCache(capacity=2)
+        # key pair of secure aggregation, used when the edge server sends the peers of a round
+        self.secagg = secagg or SecAggClient()
+        # orchestrator id, echoed in the fit metrics: the edge server reports the fit durations under it
+        self.client_id = client_id
+        # sent with every update: the edge server checks it against its own in O(1)
+        self.schema = ParameterSchema.from_module(model)
+
+    def _global_model(self, parameters, config):
+        """Resolve the model sent by the edge server, from the cache when only its hash was sent."""
+        model_hash = config.get("model_hash")
+        if model_hash is None:
+            return parameters
+        if len(parameters):
+            self.models.put(model_hash, parameters)
+            return parameters
+        cached = self.models.get(model_hash)
+        if cached is None:
+            raise ValueError(f"Model {model_hash} was sent by hash only but it is not in the cache")
+        print(f"[CLIENT] Model {model_hash[:8]} preso dalla cache")
+        return cached
+
+    def get_properties(self, config):
+        return {PUBLIC_KEY: self.secagg.public_key}
+
+    def _recover_masks(self, config):
+        """Masks shared with the peers that dropped out of a secure aggregation round."""
+        print(f"[CLIENT] Recupero maschere per i client {config['secagg_dropped']}")
+        masks = self.secagg.recover(config["secagg_cid"], int(config["secagg_round"]), decode_peers(config["secagg_peers"]),
+                                    json.loads(config["secagg_dropped"]), int(config["secagg_size"]))
+        return [masks], 0, {"secagg": "recovery"}
 
     def get_parameters(self, config):
         print("[CLIENT] get_parameters chiamato")
-        return get_model_ndarrays(self.model)
+        return self.exchange.get_ndarrays()
 
+    @telemetry.timed("client_fit")
     def fit(self, parameters, config):
         print("[CLIENT] fit chiamato")
+        if "secagg_dropped" in config:
+            return self._recover_masks(config)
         try:
-            set_model_params(self.model, parameters)
-            opt = optim.SGD(self.model.parameters(), lr=0.01, momentum=0.9)
+            parameters = self._global_model(parameters, config)
+            self.exchange.set_ndarrays(parameters)
             print("[CLIENT] Parametri caricati correttamente")
         except Exception as e:
             print(f"[CLIENT] Errore caricamento parametri: {e}")
             raise e
-        self.model.train()
-        for X, y in tqdm(self.trainloader, desc="Training..."):
-            opt.zero_grad()
-            loss = self.criterion(self.model(X),y)
-            loss.backward()
-            opt.step()
-        print("[CLIENT] Fit completato")
-        return get_model_ndarrays(self.model), len(self.trainloader.dataset), {}
+        throughput = Throughput()
+        with telemetry.span("client_train"):
+            stats = self.trainer.train(self.trainloader, config)
+        throughput.update(stats["samples"])
+        telemetry.count("client_train_samples", stats["samples"])
+        print(f"[CLIENT] Fit completato: {stats['steps']} steps, loss {stats['loss']:.4f}, {throughput.rate():.1f} samples/s")
+        num_examples = len(self.trainloader.dataset)
+        if "secagg_peers" in config:
+            # masked updates are only meaningful summed: sent dense, without the codec
+            with telemetry.span("client_mask"):
+                masked = self.secagg.mask(self.exchange.get_ndarrays(), num_examples, config["secagg_cid"],
+                                          int(config["secagg_round"]), decode_peers(config["secagg_peers"]))
+            update = [masked]
+            metrics = {"secagg": 1, "wire_bytes": masked.nbytes, "dense_bytes": masked.nbytes}
+        else:
+            # `parameters` is the global model of the round: the reference of delta encoding
+            with telemetry.span("client_encode"):
+                update, metrics = self.codec.encode(self.exchange.get_ndarrays(), reference=parameters)
+        telemetry.count("client_wire_bytes_sent", metrics["wire_bytes"])
+        if "server_round" in config:
+            metrics["server_round"] = config["server_round"]
+        if "model_hash" in config:
+            metrics["model_hash"] = config["model_hash"]
+        if self.client_id is not None:
+            metrics["client_id"] = self.client_id
+        metrics["schema"] = self.schema.hash
+        metrics["train_samples_per_sec"] = throughput.rate()
+        metrics["train_loss"] = stats["loss"]
+        metrics["local_steps"] = stats["steps"]
+        print(f"[CLIENT] Update size: {metrics['wire_bytes']} bytes (dense {metrics['dense_bytes']})")
+        return update, num_examples, metrics
 
+    @telemetry.timed("client_evaluate")
     def evaluate(self, parameters, config):
         print("[CLIENT] evaluate chiamato")
-        set_model_params(self.model, parameters)
+        self.exchange.set_ndarrays(self._global_model(parameters, config))
         self.model.eval()
         print("[CLIENT] Model parameters loaded in evaluation mode")
         try:
             
             total_loss   = 0.0
             total_samples = 0
+            throughput = Throughput()
 
             with torch.inference_mode():
                 for X_test, y_test in tqdm(self.testloader, desc="Testing..."):
@@ -68,11 +144,15 @@ class FlowerClient(fl.client.NumPyClient):
                     # ---- accuracy ----
                     self.metric.update(logits, y_test) 
                     total_samples += y_test.size(0)
+                    throughput.update(y_test.size(0))
 
             avg_loss = total_loss / total_samples
             avg_acc  = self.metric.compute().item()
-            print(f"[CLIENT] Test Loss: {avg_loss:.4f}, Test Accuracy: {avg_acc:.4f}")
-            return avg_loss, total_samples, {"accuracy": avg_acc}
+            print(f"[CLIENT] Test Loss: {avg_loss:.4f}, Test Accuracy: {avg_acc:.4f}, {throughput.rate():.1f} samples/s")
+            metrics = {"accuracy": avg_acc, "eval_samples_per_sec": throughput.rate()}
+            if "model_hash" in config:
+                metrics["model_hash"] = config["model_hash"]
+            return avg_loss, total_samples, metrics
         except Exception as e:
             print(f"[CLIENT] Errore durante l'evaluazione: {e}")
             return 0.0, 0, {"accuracy": 0.0}
@@ -1,10 +1,13 @@
 import flwr as fl
 
-from model import ModelV2
 from torchvision import datasets
-from torchvision.transforms import ToTensor
-from torch.utils.data import DataLoader, random_split
 from FlowerClient import FlowerClient
+from fl_utils.bootstrap import OrchestratorBootstrap
+from fl_utils.trainer import LocalTrainer
+from fl_data import build_cache, CachedDataset, make_loader, Partition
+from common.compression import UpdateCodec
+from common.models import build_model
+from common.telemetry import telemetry
 
 import argparse
 from configs.utils import load_config
@@ -13,25 +16,6 @@ import requests
 import torch
 
 
-# Dataset 
-train_data = datasets.FashionMNIST(
-    root="data", #where to download data
-    train=True, #we want the training dataset
-    download=True, #do we want to download?
-    transform=ToTensor(), #which transformation to apply to the data
-    target_transform=None #which transformation to apply to the target/label
-)
-
-test_data = datasets.FashionMNIST(
-    root="data", #where to download data
-    train=False, #we want the test dataset
-    download=True, #do we want to download?
-    transform=ToTensor(), #which transformation to apply to the data
-    target_transform=None #which transformation to apply to the target/label
-)
-
-n_classes = len(train_data.classes)
-
 # Load config
 parser = argparse.ArgumentParser(description="Federated Learning Client")
 parser.add_argument(
@@ -42,40 +26,75 @@ parser.add_argument(
 )
 args = parser.parse_args()
 cfg = load_config(args.config)
-
-generator = torch.Generator()
-train_data, _ = random_split(
-    train_data,
-    [int(cfg["federated_split"]["train"] * len(train_data)), len(train_data) - int(cfg["federated_split"]["train"] * len(train_data))],
-    generator=generator
-)
-
-validation_data, _ = random_split(
-    test_data,
-    [int(cfg["federated_split"]["validation"] * len(test_data)), len(test_data) - int(cfg["federated_split"]["validation"] * len(test_data))],
-    generator=generator
+telemetry.configure(cfg.get("telemetry"), service=args.client_id)
+
+# Dataset: decoded once into a uint8 cache, then memory mapped by every run
+data_cfg = cfg.get("data", {})
+cache_dir = data_cfg.get("cache_dir", "data/cache")
+train_cache = build_cache(cache_dir, "fashion_mnist_train", lambda: datasets.FashionMNIST(root="data", train=True, download=True))
+test_cache = build_cache(cache_dir, "fashion_mnist_test", lambda: datasets.FashionMNIST(root="data", train=False, download=True))
+
+def split_indices(size: int, fraction: float, generator: torch.Generator):
+    """Indices of the first `fraction` of a random permutation, as random_split does."""
+    return torch.randperm(size, generator=generator)[:int(fraction * size)].numpy()
+
+# Training shard: deterministic, from the precomputed partition of the training set
+seed = cfg["training"].get("seed", 0)
+partition_cfg = cfg.get("partition", {})
+partition = Partition.load_or_build(
+    index_dir=partition_cfg.get("index_dir", "data/partitions"),
+    labels_path=train_cache[1],
+    scheme=partition_cfg.get("scheme", "iid"),
+    num_clients=partition_cfg.get("num_clients", 10),
+    alpha=partition_cfg.get("alpha", 0.5),
+    seed=seed,
+    min_size=partition_cfg.get("min_size", 1),
 )
+train_data = CachedDataset(*train_cache, indices=partition.shard(args.client_id))
+print(f"Client {args.client_id}: shard {partition.client_index(args.client_id)} of {partition.num_clients} "
+      f"({partition_cfg.get('scheme', 'iid')}), {len(train_data)} training samples")
 
+generator = torch.Generator()
+generator.manual_seed(seed)
+test_size = len(CachedDataset(*test_cache))
+validation_data = CachedDataset(*test_cache, indices=split_indices(test_size, cfg["federated_split"]["validation"], generator))
+n_classes = CachedDataset(*train_cache).num_classes()
 
 BATCH_SIZE = cfg["training"]["batch_size"]
-trainloader = DataLoader(dataset=train_data, batch_size=cfg["training"]["batch_size"], shuffle=True)
-testloader = DataLoader(dataset=validation_data, batch_size=cfg["training"]["batch_size"], shuffle=False)
-model = ModelV2(input_shape=1, hidden_units = 10, output_shape=n_classes)
+loader_kwargs = dict(
+    num_workers=data_cfg.get("num_workers", 0),
+    pin_memory=data_cfg.get("pin_memory", False),
+    persistent_workers=data_cfg.get("persistent_workers", True),
+    prefetch_factor=data_cfg.get("prefetch_factor", 2),
+)
+trainloader = make_loader(train_data, BATCH_SIZE, shuffle=True, seed=seed, **loader_kwargs)
+testloader = make_loader(validation_data, BATCH_SIZE, shuffle=False, **loader_kwargs)
+# architecture of the federation (common/models), the classes are those of the dataset
+model = build_model(cfg.get("model", {}).get("architecture"), output_shape=n_classes)
 
 # Initialize Flower client
-fl_client = FlowerClient(model=model, trainloader=trainloader, testloader=testloader)
+fl_client = FlowerClient(
+    model=model,
+    trainloader=trainloader,
+    testloader=testloader,
+    codec=UpdateCodec.from_config(cfg.get("compression")),
+    trainer=LocalTrainer.from_config(model, cfg["training"]),
+    client_id=args.client_id,
+)
 
 # Get edge server IP from orchestrator
 orchestrator_ip = f"{cfg['orchestrator']['ip']}:{cfg['orchestrator']['port']}"
-url = f"http://{orchestrator_ip}/allocate/{args.client_id}"
-response = requests.post(url)
+bootstrap_cfg = cfg.get("bootstrap", {})
+
 try:
-    response.raise_for_status()  # Raise an error for bad responses
-    edge_server = response.json().get("edge_server")
-    edge_server = f"{edge_server}:{cfg['server']['port']}"
-    message = response.json().get("message")
+    with OrchestratorBootstrap.from_config(f"http://{orchestrator_ip}", bootstrap_cfg) as bootstrap:
+        if bootstrap_cfg.get("wait_for_ready", True):
+            bootstrap.wait_until_ready()
+        allocation = bootstrap.allocate(args.client_id, len(train_data))
+    edge_server = allocation.get("address") or f"{allocation.get('edge_server')}:{cfg['server']['port']}"
+    message = allocation.get("message")
     print(f"{message}: {edge_server}")
-except requests.exceptions.RequestException as e:
+except (requests.exceptions.RequestException, RuntimeError) as e:
     print(f"Error allocating edge server: {e}")
     exit(1)
 
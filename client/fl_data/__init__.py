@@ -0,0 +1,6 @@
+from fl_data.cache import build_cache, CachedDataset
+from fl_data.loader import make_loader, Throughput
+from fl_data.partition import build_partition, Partition
+from fl_data.synthetic import SyntheticImages
+
+__all__ = ["build_cache", "CachedDataset", "make_loader", "Throughput", "build_partition", "Partition", "SyntheticImages"]
@@ -0,0 +1,102 @@
+import os
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+
+def _to_numpy(values) -> np.ndarray:
+    return values.numpy() if isinstance(values, torch.Tensor) else np.asarray(values)
+
+
+def _decode(dataset) -> tuple[np.ndarray, np.ndarray]:
+    """Decode a whole dataset into (images NCHW, labels).
+    torchvision datasets that keep their raw samples in `data`/`targets` (MNIST, FashionMNIST,
+    CIFAR) are converted without going through their per-item transform; any other dataset
+    is decoded once item by item."""
+    if hasattr(dataset, "data") and hasattr(dataset, "targets"):
+        images = _to_numpy(dataset.data)
+        if images.ndim == 3:
+            images = images[:, None]
+        elif images.ndim == 4 and images.shape[-1] in (1, 3):
+            images = images.transpose(0, 3, 1, 2)
+        return np.ascontiguousarray(images), _to_numpy(dataset.targets).astype(np.int64)
+
+    first, _ = dataset[0]
+    images = np.empty((len(dataset), *np.shape(first)), dtype=np.float32)
+    labels = np.empty(len(dataset), dtype=np.int64)
+    for i in range(len(dataset)):
+        x, y = dataset[i]
+        images[i] = _to_numpy(x)
+        labels[i] = int(y)
+    return images, labels
+
+
+def build_cache(cache_dir: str, name: str, load_dataset) -> tuple[str, str]:
+    """Decode a dataset once into `{name}.images.npy` and `{name}.labels.npy` in `cache_dir`.
+    `load_dataset` is only called when the cache does not exist yet. Returns the two paths."""
+    images_path = os.path.join(cache_dir, f"{name}.images.npy")
+    labels_path = os.path.join(cache_dir, f"{name}.labels.npy")
+    if os.path.exists(images_path) and os.path.exists(labels_path):
+        return images_path, labels_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    images, labels = _decode(load_dataset())
+    for path, values in ((images_path, images), (labels_path, labels)):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, values)
+        os.replace(tmp_path, path)
+    return images_path, labels_path
+
+
+class CachedDataset(Dataset):
+    """A shard of a cached dataset, served by batches.
+    Images and labels are memory mapped from the cache; indexing with a list of indices
+    returns a whole batch `(images, labels)` with a single slice of the memory map.
+    uint8 images are scaled to [0, 1] floats, as ToTensor does. The memory maps are opened
+    lazily, so the dataset can be sent to DataLoader workers without copying the data.
+    """
+
+    def __init__(self, images_path: str, labels_path: str, indices=None):
+        self.images_path = images_path
+        self.labels_path = labels_path
+        self.images = None
+        self.labels = None
+        if indices is None:
+            indices = np.arange(len(np.load(labels_path, mmap_mode="r")))
+        self.indices = np.asarray(indices, dtype=np.int64)
+
+    def __open(self):
+        if self.images is None:
+            self.images = np.load(self.images_path, mmap_mode="r")
+            self.labels = np.load(self.labels_path, mmap_mode="r")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["images"] = state["labels"] = None
+        return state
+
+    def __len__(self):
+        return len(self.indices)
+
+    def num_classes(self) -> int:
+        self.__open()
+        return int(self.labels.max()) + 1
+
+    def __getitem__(self, index):
+        self.__open()
+        if isinstance(index, (int, np.integer)):
+            rows = self.indices[index]
+            return self.__images(self.images[rows]), int(self.labels[rows])
+        # sorted rows read the memory map sequentially
+        rows = np.sort(self.indices[np.asarray(index, dtype=np.int64)])
+        return self.__images(self.images[rows]), torch.from_numpy(self.labels[rows].astype(np.int64))
+
+    @staticmethod
+    def __images(values: np.ndarray) -> torch.Tensor:
+        if not values.flags.writeable:
+            values = np.array(values)
+        images = torch.from_numpy(np.ascontiguousarray(values))
+        if images.dtype == torch.uint8:
+            return images.float().div_(255.0)
+        return images.float()
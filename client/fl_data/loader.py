@@ -0,0 +1,48 @@
+import time
+import torch
+from torch.utils.data import DataLoader, BatchSampler, RandomSampler, SequentialSampler
+from fl_data.cache import CachedDataset
+
+
+def make_loader(
+    dataset: CachedDataset,
+    batch_size: int,
+    shuffle: bool = False,
+    num_workers: int = 0,
+    pin_memory: bool = False,
+    persistent_workers: bool = True,
+    prefetch_factor: int = 2,
+    seed: int | None = None,
+) -> DataLoader:
+    """DataLoader that fetches whole batches from a CachedDataset.
+    The sampler yields lists of indices and the dataset returns the batch already stacked,
+    so there is no per-sample fetch nor collate."""
+    generator = None
+    if seed is not None:
+        generator = torch.Generator()
+        generator.manual_seed(seed)
+    sampler = RandomSampler(dataset, generator=generator) if shuffle else SequentialSampler(dataset)
+    workers = dict(persistent_workers=persistent_workers, prefetch_factor=prefetch_factor) if num_workers > 0 else {}
+    return DataLoader(
+        dataset,
+        sampler=BatchSampler(sampler, batch_size=batch_size, drop_last=False),
+        batch_size=None,
+        num_workers=num_workers,
+        pin_memory=pin_memory,
+        **workers,
+    )
+
+
+class Throughput:
+    """Samples per second of a training or evaluation loop."""
+
+    def __init__(self):
+        self.samples = 0
+        self.start = time.perf_counter()
+
+    def update(self, samples: int):
+        self.samples += samples
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.start
+        return self.samples / elapsed if elapsed > 0 else 0.0
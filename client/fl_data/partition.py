@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+SCHEMES = {"iid", "dirichlet", "quantity"}
+
+
+def _split_iid(labels, num_clients, rng, alpha, min_size):
+    return np.array_split(rng.permutation(len(labels)), num_clients)
+
+
+def _split_dirichlet(labels, num_clients, rng, alpha, min_size, max_attempts=100):
+    """Label skew: the samples of every class are spread over the clients with Dir(alpha)
+    proportions. Draws again until every client has at least `min_size` samples."""
+    classes = np.unique(labels)
+    by_class = [rng.permutation(np.flatnonzero(labels == c)) for c in classes]
+    for _ in range(max_attempts):
+        shards = [[] for _ in range(num_clients)]
+        for indices in by_class:
+            proportions = rng.dirichlet(np.full(num_clients, alpha))
+            cuts = (np.cumsum(proportions)[:-1] * len(indices)).astype(np.int64)
+            for shard, part in zip(shards, np.split(indices, cuts)):
+                shard.append(part)
+        shards = [np.concatenate(parts) for parts in shards]
+        if min(len(s) for s in shards) >= min_size:
+            return shards
+    raise ValueError(f"No Dirichlet partition with {min_size} samples per client after {max_attempts} attempts, "
+                     f"increase alpha or lower min_size")
+
+
+def _split_quantity(labels, num_clients, rng, alpha, min_size):
+    """Quantity skew: IID labels, client sizes drawn with Dir(alpha) proportions
+    on top of `min_size` samples each."""
+    spare = len(labels) - num_clients * min_size
+    if spare < 0:
+        raise ValueError(f"{len(labels)} samples are not enough for {num_clients} clients of {min_size}")
+    sizes = min_size + np.floor(rng.dirichlet(np.full(num_clients, alpha)) * spare).astype(np.int64)
+    return np.split(rng.permutation(len(labels)), np.cumsum(sizes)[:-1])
+
+
+SPLITS = {"iid": _split_iid, "dirichlet": _split_dirichlet, "quantity": _split_quantity}
+
+
+def build_partition(labels: np.ndarray, num_clients: int, scheme: str = "iid", alpha: float = 0.5,
+                    seed: int = 0, min_size: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """Split the samples of a dataset among `num_clients` clients.
+    Returns the partition in CSR form: the indices of client k are
+    `indices[offsets[k]:offsets[k + 1]]`, sorted."""
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown partition scheme {scheme}, choose one of {sorted(SCHEMES)}")
+    rng = np.random.default_rng(seed)
+    shards = [np.sort(s) for s in SPLITS[scheme](np.asarray(labels), num_clients, rng, alpha, min_size)]
+    offsets = np.zeros(num_clients + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(s) for s in shards])
+    return offsets, np.concatenate(shards).astype(np.int64)
+
+
+class Partition:
+    """Precomputed partition of a dataset among the clients.
+    The index file is built once per (dataset, scheme, num_clients, alpha, seed, min_size)
+    and memory mapped afterwards, so a client gets its shard in O(1) whatever the size of
+    the dataset and the number of clients.
+    """
+
+    def __init__(self, offsets_path: str, indices_path: str):
+        self.offsets_path = offsets_path
+        self.indices_path = indices_path
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        self.indices = np.load(indices_path, mmap_mode="r")
+        self.num_clients = len(self.offsets) - 1
+
+    @classmethod
+    def load_or_build(cls, index_dir: str, labels_path: str, scheme: str = "iid", num_clients: int = 10,
+                      alpha: float = 0.5, seed: int = 0, min_size: int = 1) -> "Partition":
+        settings = dict(labels=os.path.basename(labels_path), scheme=scheme, num_clients=num_clients,
+                        alpha=alpha, seed=seed, min_size=min_size)
+        key = hashlib.blake2b(json.dumps(settings, sort_keys=True).encode(), digest_size=8).hexdigest()
+        offsets_path = os.path.join(index_dir, f"{scheme}_{num_clients}_{key}.offsets.npy")
+        indices_path = os.path.join(index_dir, f"{scheme}_{num_clients}_{key}.indices.npy")
+        if not (os.path.exists(offsets_path) and os.path.exists(indices_path)):
+            os.makedirs(index_dir, exist_ok=True)
+            labels = np.load(labels_path, mmap_mode="r")
+            offsets, indices = build_partition(labels, num_clients, scheme, alpha, seed, min_size)
+            # indices first: a partition is complete once its offsets exist
+            for path, values in ((indices_path, indices), (offsets_path, offsets)):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, values)
+                os.replace(tmp_path, path)
+        return cls(offsets_path, indices_path)
+
+    def client_index(self, client_id: str) -> int:
+        """Shard of a client: the trailing number of its id (client_7 -> 7) modulo the number
+        of clients, or a stable hash of the id when it has no number."""
+        digits = client_id[len(client_id.rstrip("0123456789")):]
+        if digits:
+            return int(digits) % self.num_clients
+        return int(hashlib.blake2b(client_id.encode(), digest_size=8).hexdigest(), 16) % self.num_clients
+
+    def shard(self, client: int | str) -> np.ndarray:
+        """Dataset indices of a client, given its shard number or its id."""
+        k = self.client_index(client) if isinstance(client, str) else client
+        return np.asarray(self.indices[self.offsets[k]:self.offsets[k + 1]])
+
+    def sizes(self) -> np.ndarray:
+        return np.diff(self.offsets)
@@ -0,0 +1,25 @@
+import numpy as np
+import torch
+
+
+class SyntheticImages:
+    """FashionMNIST-shaped dataset generated in memory, for load tests and simulations
+    without downloads. Every class has its own random template and samples are noisy
+    copies of it, so the task is learnable. Exposes `data`/`targets` like the torchvision
+    datasets, which is all `build_cache` needs."""
+
+    def __init__(self, samples: int = 60000, num_classes: int = 10, shape=(28, 28), noise: float = 64.0, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        templates = rng.integers(0, 256, size=(num_classes, *shape)).astype(np.float32)
+        targets = rng.integers(0, num_classes, size=samples)
+        data = np.empty((samples, *shape), dtype=np.uint8)
+        for start in range(0, samples, 4096):
+            end = min(start + 4096, samples)
+            noisy = templates[targets[start:end]] + rng.normal(scale=noise, size=(end - start, *shape))
+            data[start:end] = np.clip(noisy, 0, 255)
+        self.data = torch.from_numpy(data)
+        self.targets = torch.from_numpy(targets)
+        self.classes = [str(c) for c in range(num_classes)]
+
+    def __len__(self):
+        return len(self.targets)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from fl_data.partition import build_partition
+
+LABELS = np.random.default_rng(1).integers(0, 10, size=5000)
+
+
+def shards(offsets, indices):
+    return [indices[offsets[k]:offsets[k + 1]] for k in range(len(offsets) - 1)]
+
+
+@pytest.mark.parametrize("scheme", ["iid", "dirichlet", "quantity"])
+def test_shards_cover_every_sample_once(scheme):
+    offsets, indices = build_partition(LABELS, 20, scheme, alpha=0.5, seed=3, min_size=5)
+    parts = shards(offsets, indices)
+    assert len(parts) == 20
+    for part in parts:
+        assert len(part) >= 5
+        assert np.all(np.diff(part) > 0)
+    assert np.array_equal(np.sort(indices), np.arange(len(LABELS)))
+
+
+@pytest.mark.parametrize("scheme", ["iid", "dirichlet", "quantity"])
+def test_same_seed_same_split(scheme):
+    first = build_partition(LABELS, 20, scheme, alpha=0.5, seed=7)
+    again = build_partition(LABELS, 20, scheme, alpha=0.5, seed=7)
+    other = build_partition(LABELS, 20, scheme, alpha=0.5, seed=8)
+    assert all(np.array_equal(a, b) for a, b in zip(first, again))
+    assert not np.array_equal(first[1], other[1])
+
+
+def test_dirichlet_skews_labels():
+    offsets, indices = build_partition(LABELS, 10, "dirichlet", alpha=0.1, seed=0)
+    classes = [len(np.unique(LABELS[part])) for part in shards(offsets, indices)]
+    assert min(classes) < 10
+
+
+def test_impossible_partitions_raise():
+    with pytest.raises(ValueError):
+        build_partition(LABELS, 10, "unknown")
+    with pytest.raises(ValueError):
+        build_partition(LABELS[:50], 10, "quantity", min_size=10)
+    with pytest.raises(ValueError):
+        build_partition(LABELS[:50], 10, "dirichlet", alpha=0.01, min_size=10)
@@ -0,0 +1,151 @@
+import random
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# answers of a busy or restarting orchestrator, worth retrying
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class OrchestratorBootstrap:
+    """Registers clients with the orchestrator over one pooled HTTP session.
+    Connection errors and busy answers (429, 5xx) are retried with exponential backoff
+    and full jitter, so a fleet started at once does not come back in lockstep.
+    `wait_until_ready` polls `/health` until the orchestrator answers, and
+    `allocate_batch` registers many clients with one request per `batch_size` clients.
+    Pending allocations are long-polled until their edge server is ready.
+    """
+
+    def __init__(self,
+                 url: str,
+                 max_attempts: int = 8,
+                 backoff: float = 0.5,
+                 max_backoff: float = 30.0,
+                 ready_timeout: float = 120.0,
+                 poll_wait: float = 10.0,
+                 batch_size: int = 500,
+                 pool_size: int = 10,
+                 timeout: float = 30.0,
+                ):
+        self.url = url.rstrip("/")
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.ready_timeout = ready_timeout
+        self.poll_wait = poll_wait
+        self.batch_size = batch_size
+        # a long-poll lasts up to `poll_wait` on the orchestrator side
+        self.timeout = timeout + poll_wait
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    @classmethod
+    def from_config(cls, url: str, config: dict | None = None) -> "OrchestratorBootstrap":
+        """Build the bootstrap from the `bootstrap` section of a config file."""
+        config = config or {}
+        return cls(
+            url,
+            max_attempts=config.get("max_attempts", 8),
+            backoff=config.get("backoff", 0.5),
+            max_backoff=config.get("max_backoff", 30.0),
+            ready_timeout=config.get("ready_timeout", 120.0),
+            poll_wait=config.get("poll_wait", 10.0),
+            batch_size=config.get("batch_size", 500),
+            pool_size=config.get("pool_size", 10),
+            timeout=config.get("timeout", 30.0),
+        )
+
+    def delay(self, attempt: int) -> float:
+        """Full jitter backoff: uniform between 0 and the exponential bound of the attempt."""
+        return random.uniform(0.0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, method: str, path: str, **kwargs):
+        """JSON answer of a request, retried on connection errors and busy answers."""
+        error = None
+        for attempt in range(self.max_attempts):
+            try:
+                response = self.session.request(method, f"{self.url}{path}", timeout=self.timeout, **kwargs)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response.json()
+                error = requests.exceptions.HTTPError(f"{response.status_code} {response.reason}", response=response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            if attempt + 1 < self.max_attempts:
+                time.sleep(self.delay(attempt))
+        raise RuntimeError(f"{method} {path} failed after {self.max_attempts} attempts: {error}")
+
+    def wait_until_ready(self, timeout: float | None = None):
+        """Block until the orchestrator answers `/health`, or raise after `timeout` seconds."""
+        timeout = self.ready_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(f"{self.url}/health", timeout=self.timeout)
+                if response.status_code == 200:
+                    return response.json()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"Orchestrator {self.url} not ready after {timeout:.0f}s")
+            time.sleep(min(self.delay(attempt), remaining))
+            attempt += 1
+
+    def allocate(self, client_id: str, num_examples: int | None = None) -> dict:
+        """Allocate one client, long-polling while its edge server is being provisioned."""
+        allocation = {}
+        for _ in range(self.max_attempts):
+            allocation = self.request("POST", f"/allocate/{client_id}", params={"num_examples": num_examples})
+            allocation = self.__wait_pending(client_id, allocation)
+            if allocation.get("status") == "allocated":
+                return allocation
+            # the edge server failed to start: ask for a new allocation
+            print(f"Allocation failed: {allocation.get('message')}")
+        raise RuntimeError(f"No edge server allocated to {client_id} after {self.max_attempts} attempts")
+
+    def allocate_batch(self, clients: dict[str, int | None]) -> dict[str, dict]:
+        """Allocate many clients (client id -> number of examples), `batch_size` per request.
+        Returns the allocation of every client once all of them are ready."""
+        allocations = {}
+        missing = dict(clients)
+        for _ in range(self.max_attempts):
+            ids = list(missing)
+            for start in range(0, len(ids), self.batch_size):
+                batch = [{"client_id": client_id, "num_examples": missing[client_id]}
+                         for client_id in ids[start:start + self.batch_size]]
+                allocations.update(self.request("POST", "/allocate", json=batch))
+            self.__wait_pending_batch(ids, allocations)
+            missing = {client_id: num_examples for client_id, num_examples in missing.items()
+                       if allocations[client_id].get("status") != "allocated"}
+            if not missing:
+                return allocations
+            print(f"Allocation failed for {len(missing)} clients, asking again")
+        raise RuntimeError(f"No edge server allocated to {len(missing)} clients after {self.max_attempts} attempts")
+
+    def __wait_pending(self, client_id: str, allocation: dict) -> dict:
+        while allocation.get("status") == "pending":
+            print(f"{allocation.get('message')}: {allocation.get('edge_server')}")
+            allocation = self.request("GET", f"/allocation/{client_id}", params={"wait": self.poll_wait})
+        return allocation
+
+    def __wait_pending_batch(self, client_ids: list[str], allocations: dict[str, dict]):
+        pending = [client_id for client_id in client_ids if allocations[client_id].get("status") == "pending"]
+        while pending:
+            print(f"{len(pending)} allocations pending on {len({allocations[c].get('edge_server') for c in pending})} edge servers")
+            for start in range(0, len(pending), self.batch_size):
+                allocations.update(self.request("POST", "/allocation", params={"wait": self.poll_wait},
+                                                json=pending[start:start + self.batch_size]))
+            pending = [client_id for client_id in pending if allocations[client_id].get("status") == "pending"]
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
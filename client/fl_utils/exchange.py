@@ -0,0 +1,78 @@
+import numpy as np
+import torch
+
+
+class ParameterExchange:
+    """Moves the weights of a model in and out of Flower without rebuilding its state dict.
+    The ordered keys of the state dict and the tensors behind them are resolved once:
+    `set_ndarrays` copies the received ndarrays in place into the existing tensors and
+    `get_ndarrays` returns numpy views of them, so a round trip allocates no tensor.
+
+    With `flatten=True` the floating point tensors of the model are moved into a single
+    contiguous buffer (the parameters become views of it), exported by `flat_view`.
+    Call `refresh` if the tensors of the model are replaced (e.g. after `model.to(device)`).
+    """
+
+    def __init__(self, model: torch.nn.Module, flatten: bool = False):
+        self.model = model
+        self.flatten = flatten
+        self.flat = None
+        self.refresh()
+
+    def refresh(self):
+        """Resolve again the keys and the tensors of the model."""
+        state = self.model.state_dict(keep_vars=True)
+        self.keys = list(state.keys())
+        self.tensors = list(state.values())
+        if self.flatten:
+            self.__flatten()
+        # numpy views of the CPU tensors, the targets of in-place copies
+        self.arrays = [t.detach().numpy() if t.device.type == "cpu" else None for t in self.tensors]
+
+    def __flatten(self):
+        floating = [t for t in self.tensors if t.is_floating_point()]
+        if not floating:
+            return
+        dtype, device = floating[0].dtype, floating[0].device
+        if any(t.dtype != dtype or t.device != device for t in floating):
+            raise ValueError("A flat buffer needs all the floating point tensors on the same dtype and device")
+        flat = torch.empty(sum(t.numel() for t in floating), dtype=dtype, device=device)
+        offset = 0
+        with torch.no_grad():
+            for t in floating:
+                n = t.numel()
+                view = flat[offset:offset + n].view_as(t)
+                view.copy_(t)
+                t.data = view
+                offset += n
+        self.flat = flat
+
+    def get_ndarrays(self) -> list[np.ndarray]:
+        """Weights of the model as a list of ndarrays, in state dict order.
+        CPU tensors are returned as views: serialize them before training again."""
+        return [a if a is not None else t.detach().cpu().numpy() for a, t in zip(self.arrays, self.tensors)]
+
+    def set_ndarrays(self, ndarrays):
+        """Copy a list of ndarrays (in state dict order) into the model, in place."""
+        if len(ndarrays) != len(self.tensors):
+            raise ValueError(f"Expected {len(self.tensors)} arrays, got {len(ndarrays)}")
+        with torch.no_grad():
+            for key, target, tensor, value in zip(self.keys, self.arrays, self.tensors, ndarrays):
+                value = np.asarray(value)
+                if value.shape != tuple(tensor.shape):
+                    raise ValueError(f"Shape mismatch for {key}: got {value.shape}, expected {tuple(tensor.shape)}")
+                if target is not None:
+                    np.copyto(target, value, casting="unsafe")
+                else:
+                    if not value.flags.writeable:
+                        value = value.copy()
+                    tensor.copy_(torch.from_numpy(np.ascontiguousarray(value)), non_blocking=True)
+
+    def flat_view(self) -> np.ndarray:
+        """The floating point weights of the model as one contiguous 1-D array (no copy on CPU).
+        Only available with `flatten=True`."""
+        if self.flat is None:
+            raise ValueError("The model was not flattened, build the exchange with flatten=True")
+        if self.flat.device.type == "cpu":
+            return self.flat.detach().numpy()
+        return self.flat.detach().cpu().numpy()
@@ -0,0 +1,133 @@
+import contextlib
+import torch
+from torch import optim
+from tqdm import tqdm
+
+
+class LocalTrainer:
+    """Local training of a client, driven by the `fit` config of each round.
+    The round config may override the defaults with `local_epochs`, `local_steps`
+    (a bound on the optimizer steps, 0 for none) and `lr`.
+
+    The optimizer is built once: the weights of the model are updated in place by
+    ParameterExchange, so with `optimizer_state="keep"` the momentum buffers carry over
+    from a round to the next ("reset" starts every round from a fresh state).
+    On CPU `precision="bf16"` runs the forward pass under bfloat16 autocast,
+    `channels_last` stores the convolution weights and inputs in NHWC layout, `compile`
+    wraps the model with torch.compile (falling back to eager where it cannot compile)
+    and `num_threads` sets the intra-op threads of torch (0 keeps the default).
+    """
+
+    def __init__(self,
+                 model: torch.nn.Module,
+                 criterion=torch.nn.CrossEntropyLoss(),
+                 lr: float = 0.01,
+                 momentum: float = 0.9,
+                 weight_decay: float = 0.0,
+                 local_epochs: int = 1,
+                 local_steps: int = 0,
+                 optimizer_state: str = "keep",
+                 precision: str = "fp32",
+                 channels_last: bool = False,
+                 compile: bool = False,
+                 num_threads: int = 0,
+                 progress: bool = False,
+                ):
+        if optimizer_state not in ("keep", "reset"):
+            raise ValueError(f"Unknown optimizer state policy {optimizer_state}, choose keep or reset")
+        if precision not in ("fp32", "bf16"):
+            raise ValueError(f"Unknown precision {precision}, choose fp32 or bf16")
+        self.model = model
+        self.criterion = criterion
+        self.lr = lr
+        self.momentum = momentum
+        self.weight_decay = weight_decay
+        self.local_epochs = local_epochs
+        self.local_steps = local_steps
+        self.optimizer_state = optimizer_state
+        self.precision = precision
+        self.channels_last = channels_last
+        self.progress = progress
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        if channels_last:
+            # replaces the weight tensors: build the ParameterExchange of the model afterwards
+            self.model.to(memory_format=torch.channels_last)
+        self.forward = self.model
+        if compile:
+            from torch import _dynamo
+            # graphs that cannot be compiled run eagerly instead of failing the round
+            _dynamo.config.suppress_errors = True
+            self.forward = torch.compile(self.model)
+        self.optimizer = None
+
+    @classmethod
+    def from_config(cls, model: torch.nn.Module, config: dict | None = None, **kwargs) -> "LocalTrainer":
+        """Build a trainer from the `training` section of a config file."""
+        config = config or {}
+        return cls(
+            model,
+            lr=config.get("lr", 0.01),
+            momentum=config.get("momentum", 0.9),
+            weight_decay=config.get("weight_decay", 0.0),
+            local_epochs=config.get("local_epochs", 1),
+            local_steps=config.get("local_steps", 0),
+            optimizer_state=config.get("optimizer_state", "keep"),
+            precision=config.get("precision", "fp32"),
+            channels_last=config.get("channels_last", False),
+            compile=config.get("compile", False),
+            num_threads=config.get("num_threads", 0),
+            progress=config.get("progress", False),
+            **kwargs,
+        )
+
+    def reset(self):
+        """Forget the optimizer state, e.g. when the trainer moves to another client."""
+        self.optimizer = None
+
+    def __optimizer(self, lr: float) -> optim.Optimizer:
+        if self.optimizer is None or self.optimizer_state == "reset":
+            self.optimizer = optim.SGD(self.model.parameters(), lr=lr, momentum=self.momentum, weight_decay=self.weight_decay)
+        for group in self.optimizer.param_groups:
+            group["lr"] = lr
+        return self.optimizer
+
+    def __autocast(self):
+        if self.precision == "bf16":
+            return torch.autocast("cpu", dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def train(self, loader, config: dict | None = None) -> dict:
+        """Train on `loader` for the epochs and steps of the round, returns the number of
+        samples and steps and the mean training loss."""
+        config = config or {}
+        epochs = int(config.get("local_epochs", self.local_epochs))
+        max_steps = int(config.get("local_steps", self.local_steps))
+        opt = self.__optimizer(float(config.get("lr", self.lr)))
+        self.model.train()
+        samples = 0
+        steps = 0
+        total_loss = torch.zeros(())
+        for _ in range(epochs):
+            batches = tqdm(loader, desc="Training...") if self.progress else loader
+            for X, y in batches:
+                if self.channels_last and X.dim() == 4:
+                    X = X.contiguous(memory_format=torch.channels_last)
+                opt.zero_grad(set_to_none=True)
+                with self.__autocast():
+                    loss = self.criterion(self.forward(X), y)
+                loss.backward()
+                opt.step()
+                # summed without .item(): a single synchronization at the end of training
+                total_loss += loss.detach().float() * y.size(0)
+                samples += y.size(0)
+                steps += 1
+                if max_steps and steps >= max_steps:
+                    break
+            if max_steps and steps >= max_steps:
+                break
+        return {
+            "samples": samples,
+            "steps": steps,
+            "loss": total_loss.item() / samples if samples else 0.0,
+        }
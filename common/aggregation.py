@@ -0,0 +1,117 @@
+from typing import List
+import numpy as np
+from flwr.common import Parameters, bytes_to_ndarray
+
+class StreamingAggregator:
+    """Weighted average of model updates, folded one update at a time.
+    Every update is deserialized layer by layer and added, scaled by its weight, to
+    float64 accumulators allocated once from the first update. Memory stays
+    O(model size) whatever the number of updates folded in.
+    With a `schema` (common.models.ParameterSchema) the accumulators are allocated upfront
+    from it, and every update must have as many layers as the schema.
+    """
+
+    def __init__(self, schema=None):
+        self.accumulators = None
+        self.dtypes = None
+        self.scratch = None
+        self.total_weight = 0.0
+        self.count = 0
+        self.schema = schema
+        if schema is not None:
+            self.accumulators = schema.zeros(np.float64)
+            self.dtypes = list(schema.dtypes)
+            self.scratch = np.empty(max((a.size for a in self.accumulators), default=0), dtype=np.float64)
+
+    def reset(self):
+        """Forget the folded updates, keeping the buffers for the next round."""
+        if self.accumulators is not None:
+            for acc in self.accumulators:
+                acc.fill(0.0)
+        self.total_weight = 0.0
+        self.count = 0
+
+    def add(self, parameters: Parameters, weight: float):
+        """Fold a serialized update (as received in a FitRes) with the given weight."""
+        self.add_ndarrays((bytes_to_ndarray(tensor) for tensor in parameters.tensors), weight)
+
+    def add_ndarrays(self, ndarrays, weight: float):
+        """Fold an update given as an iterable of ndarrays with the given weight.
+        An update that does not fit the aggregate (layer count or shape) raises ValueError
+        and is rolled back: the aggregate stays that of the updates folded before it."""
+        first = self.accumulators is None
+        if first:
+            self.accumulators, self.dtypes = [], []
+        # layers folded so far, to roll the update back
+        folded = []
+        try:
+            for i, layer in enumerate(ndarrays):
+                if first:
+                    self.accumulators.append(np.zeros(layer.shape, dtype=np.float64))
+                    self.dtypes.append(layer.dtype)
+                    if self.scratch is None or self.scratch.size < layer.size:
+                        self.scratch = np.empty(layer.size, dtype=np.float64)
+                elif i >= len(self.accumulators):
+                    raise ValueError(f"Update has more than {len(self.accumulators)} layers")
+                acc = self.accumulators[i]
+                if acc.shape != layer.shape:
+                    raise ValueError(f"Layer {i} has shape {layer.shape}, expected {acc.shape}")
+                tmp = self.scratch[:layer.size].reshape(layer.shape)
+                np.multiply(layer, weight, out=tmp, dtype=np.float64)
+                acc += tmp
+                folded.append(layer)
+            if len(folded) != len(self.accumulators):
+                raise ValueError(f"Update has {len(folded)} layers, expected {len(self.accumulators)}")
+        except Exception:
+            if first:
+                self.accumulators = self.dtypes = None
+            else:
+                for acc, layer in zip(self.accumulators, folded):
+                    tmp = self.scratch[:layer.size].reshape(layer.shape)
+                    np.multiply(layer, weight, out=tmp, dtype=np.float64)
+                    acc -= tmp
+            raise
+        self.total_weight += weight
+        self.count += 1
+
+    def result(self) -> List[np.ndarray]:
+        """Weighted average of the folded updates, in the dtype of the received layers."""
+        if not self.count or self.total_weight <= 0:
+            raise ValueError("No update has been aggregated")
+        averaged = []
+        for acc, dtype in zip(self.accumulators, self.dtypes):
+            out = np.empty(acc.shape, dtype=dtype)
+            np.divide(acc, self.total_weight, out=out, casting="unsafe")
+            averaged.append(out)
+        return averaged
+
+
+def staleness_weight(staleness: int, exponent: float = 0.5) -> float:
+    """Polynomial staleness discount (1 + s)^-a used by buffered aggregation (FedBuff)."""
+    return (1.0 + max(staleness, 0)) ** -exponent
+
+
+def mix(current: List[np.ndarray], update: List[np.ndarray], server_lr: float) -> List[np.ndarray]:
+    """Move the current model towards the buffered update: x + lr * (update - x)."""
+    if current is None or server_lr >= 1.0:
+        return update
+    mixed = []
+    for x, u in zip(current, update):
+        out = x.astype(np.float64)
+        out += server_lr * (u - out)
+        mixed.append(out.astype(x.dtype, copy=False))
+    return mixed
+
+
+def weighted_metrics(pairs) -> dict | None:
+    """Average of the `loss` and `accuracy` of (num_examples, metrics) pairs, weighted by their
+    number of examples, with the total number of samples. None if no pair has examples."""
+    pairs = [(n, m) for n, m in pairs if n > 0 and m.get("loss") is not None]
+    samples = sum(n for n, _ in pairs)
+    if not samples:
+        return None
+    summary = {"loss": sum(n * float(m["loss"]) for n, m in pairs) / samples, "samples": samples}
+    with_accuracy = [(n, m) for n, m in pairs if m.get("accuracy") is not None]
+    if with_accuracy:
+        summary["accuracy"] = sum(n * float(m["accuracy"]) for n, m in with_accuracy) / sum(n for n, _ in with_accuracy)
+    return summary
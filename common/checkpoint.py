@@ -0,0 +1,208 @@
+"""Raw model checkpoints, loaded lazily through np.memmap and written in background.
+
+File layout (little endian):
+
+    b"HFLCKPT1" | header length (uint32) | JSON header | padding | array 0 | padding | array 1 ...
+
+The JSON header indexes every array by name, dtype, shape and byte offset; arrays start
+on ALIGNMENT byte boundaries. Loading a checkpoint only reads the header: the arrays are
+views of a read-only memory map, paged in when they are first touched. `iter_checkpoint`
+produces the same bytes in chunks, to stream a model without assembling it in memory.
+"""
+import atexit
+import json
+import os
+import queue
+import re
+import struct
+import threading
+
+import numpy as np
+
+from common.telemetry import telemetry
+
+MAGIC = b"HFLCKPT1"
+SUFFIX = ".ckpt"
+ALIGNMENT = 64
+_LENGTH = struct.Struct("<I")
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def is_checkpoint(path: str) -> bool:
+    """True if `path` is a raw checkpoint file."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def iter_checkpoint(ndarrays, names=None, meta: dict | None = None, chunk_size: int = 1 << 20):
+    """Bytes of the checkpoint of a list of ndarrays, in chunks of at most `chunk_size` bytes.
+    The chunks are views of the arrays: the checkpoint is never assembled in memory."""
+    ndarrays = [np.asarray(a, order="C") for a in ndarrays]
+    names = list(names) if names is not None else [f"arr_{i}" for i in range(len(ndarrays))]
+    index, offset = [], 0
+    for name, a in zip(names, ndarrays):
+        index.append({"name": name, "dtype": a.dtype.str, "shape": list(a.shape), "offset": offset, "nbytes": a.nbytes})
+        offset = _aligned(offset + a.nbytes)
+
+    header = json.dumps({"arrays": index, "meta": meta or {}}).encode()
+    data_start = _aligned(len(MAGIC) + _LENGTH.size + len(header))
+    yield MAGIC + _LENGTH.pack(len(header)) + header
+    position = len(MAGIC) + _LENGTH.size + len(header)
+    for entry, a in zip(index, ndarrays):
+        if data_start + entry["offset"] > position:
+            yield bytes(data_start + entry["offset"] - position)
+        data = memoryview(a.reshape(-1)).cast("B")
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+        position = data_start + entry["offset"] + a.nbytes
+
+
+def write_checkpoint(path: str, ndarrays, names=None, meta: dict | None = None):
+    """Write a list of ndarrays atomically: to a temporary file first, then renamed."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        for chunk in iter_checkpoint(ndarrays, names, meta):
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_header(path: str) -> tuple[dict, int]:
+    """Header of a checkpoint and the offset at which its data starts."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a checkpoint")
+        (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+        header = json.loads(f.read(length))
+    return header, _aligned(len(MAGIC) + _LENGTH.size + length)
+
+
+def verify_checkpoint(path: str) -> dict:
+    """Header of a checkpoint holding all of its arrays; raises ValueError otherwise (e.g. truncated)."""
+    try:
+        header, data_start = read_header(path)
+    except struct.error:
+        raise ValueError(f"{path} is truncated: no complete header")
+    end = max((data_start + entry["offset"] + entry["nbytes"] for entry in header["arrays"]), default=data_start)
+    size = os.path.getsize(path)
+    if size < end:
+        raise ValueError(f"{path} is truncated: {size} bytes, expected {end}")
+    return header
+
+
+@telemetry.timed("checkpoint_load")
+def load_checkpoint(path: str, names=None) -> list[np.ndarray]:
+    """Arrays of a checkpoint as read-only views of a memory map (nothing is read yet).
+    `names` selects and orders the arrays, all of them are returned by default."""
+    header, data_start = read_header(path)
+    index = {entry["name"]: entry for entry in header["arrays"]}
+    selected = [index[name] for name in names] if names is not None else header["arrays"]
+    if not selected:
+        return []
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = []
+    for entry in selected:
+        arrays.append(np.ndarray(tuple(entry["shape"]), dtype=np.dtype(entry["dtype"]), buffer=mapped,
+                                 offset=data_start + entry["offset"]))
+    return arrays
+
+
+class CheckpointStore:
+    """Checkpoints of the rounds of a server, named `round_{N}_model.ckpt` in `directory`.
+    `save` only queues the arrays: a background thread writes them atomically and then
+    removes the oldest checkpoints, keeping the last `keep_last` (0 keeps all of them).
+    The arrays given to `save` must not be modified afterwards.
+    """
+
+    PATTERN = re.compile(r"^round_(\d+)_model" + re.escape(SUFFIX) + "$")
+
+    def __init__(self, directory: str, keep_last: int = 3, on_saved=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.keep_last = keep_last
+        # called by the writer thread with (round, path, error)
+        self.on_saved = on_saved
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.__run, name="CheckpointWriter", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def path(self, rnd: int) -> str:
+        return os.path.join(self.directory, f"round_{rnd}_model{SUFFIX}")
+
+    def save(self, rnd: int, ndarrays, meta: dict | None = None, names=None) -> str:
+        """Queue the checkpoint of a round and return the path it will be written to.
+        `names` names the arrays (e.g. ParameterSchema.names), arr_0, arr_1... by default."""
+        self.queue.put((rnd, list(ndarrays), meta, names))
+        return self.path(rnd)
+
+    def rounds(self) -> list[int]:
+        """Rounds with a checkpoint on disk, oldest first."""
+        found = []
+        for name in os.listdir(self.directory):
+            match = self.PATTERN.match(name)
+            if match:
+                found.append(int(match.group(1)))
+        return sorted(found)
+
+    def clear(self):
+        """Remove every checkpoint of the directory, once the queued ones are written."""
+        self.flush()
+        for rnd in self.rounds():
+            os.remove(self.path(rnd))
+
+    def latest(self) -> str | None:
+        """Path of the most recent checkpoint, or None."""
+        return latest_checkpoint(self.directory)
+
+    def flush(self):
+        """Wait until every queued checkpoint is on disk."""
+        self.queue.join()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def __run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                rnd, ndarrays, meta, names = item
+                error = None
+                try:
+                    with telemetry.span("checkpoint_write"):
+                        write_checkpoint(self.path(rnd), ndarrays, names, meta=dict(meta or {}, round=rnd))
+                    self.__rotate()
+                except Exception as e:
+                    error = e
+                if self.on_saved is not None:
+                    self.on_saved(rnd, self.path(rnd), error)
+            finally:
+                self.queue.task_done()
+
+    def __rotate(self):
+        if self.keep_last <= 0:
+            return
+        for rnd in self.rounds()[:-self.keep_last]:
+            try:
+                os.remove(self.path(rnd))
+            except FileNotFoundError:
+                pass
+
+
+def latest_checkpoint(directory: str) -> str | None:
+    """Most recent `round_{N}_model.ckpt` in a directory, or None."""
+    if not os.path.isdir(directory):
+        return None
+    rounds = [int(m.group(1)) for m in map(CheckpointStore.PATTERN.match, os.listdir(directory)) if m]
+    return os.path.join(directory, f"round_{max(rounds)}_model{SUFFIX}") if rounds else None
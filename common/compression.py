@@ -0,0 +1,211 @@
+"""Compression of the model updates exchanged between the tiers (client -> edge -> orchestrator).
+
+Every layer is encoded independently into a self-describing uint8 buffer, so the
+encoded update is still a list of ndarrays and travels through Flower unchanged:
+
+    header | shape | [indices] | values
+
+- delta: the update is sent as the difference with the global model of the round,
+  which the receiver already has.
+- quantization: values are sent as float16, or as int8 with one scale per layer.
+- top-k: only the `topk_ratio` largest entries (in magnitude) of each layer are sent.
+- error feedback: what quantization and sparsification drop from a delta is kept by the
+  sender and added to its next delta, so that nothing is lost over the rounds.
+
+Non floating point layers (e.g. BatchNorm counters) are always sent as they are.
+The receiver does not need to know the settings of the sender: `decode` reads them
+from the headers, `is_encoded` tells from the fit metrics whether an update is encoded.
+"""
+import struct
+
+import numpy as np
+from flwr.common import bytes_to_ndarray
+
+CODEC = "hflc1"
+QUANTIZATIONS = {"none": 0, "fp16": 1, "int8": 2}
+
+_MAGIC = b"HFLC"
+_VERSION = 1
+# magic, version, flags, quantization, ndim, original dtype, number of values, int8 scale
+_HEADER = struct.Struct("<4sBBBB8sIf")
+_DELTA = 1
+_SPARSE = 2
+
+
+def is_encoded(metrics: dict | None) -> bool:
+    """True if the fit metrics of an update say that its parameters are encoded."""
+    return bool(metrics) and metrics.get("codec") == CODEC
+
+
+def nbytes(ndarrays) -> int:
+    """Size in bytes of a list of ndarrays."""
+    return int(sum(a.nbytes for a in ndarrays))
+
+
+class UpdateCodec:
+    """Encoder of model updates.
+    The codec is stateful only because of error feedback: keep one codec per sender
+    and reuse it for all the rounds.
+    """
+
+    def __init__(self, delta: bool = False, quantization: str = "none", topk_ratio: float = 0.0, error_feedback: bool = True):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization}, choose one of {sorted(QUANTIZATIONS)}")
+        if not 0.0 <= topk_ratio <= 1.0:
+            raise ValueError(f"topk_ratio must be in [0, 1], got {topk_ratio}")
+        if 0.0 < topk_ratio < 1.0 and not delta:
+            # the entries not sent are decoded as 0: only meaningful for a difference with the model
+            raise ValueError("topk_ratio needs delta encoding, sparsified weights would zero the model")
+        self.delta = delta
+        self.quantization = quantization
+        self.topk_ratio = topk_ratio
+        self.error_feedback = error_feedback
+        self.residuals = None
+
+    @classmethod
+    def from_config(cls, config: dict | None = None) -> "UpdateCodec":
+        """Build a codec from the `compression` section of a config file."""
+        config = config or {}
+        return cls(
+            delta=config.get("delta", False),
+            quantization=config.get("quantization", "none"),
+            topk_ratio=config.get("topk_ratio", 0.0),
+            error_feedback=config.get("error_feedback", True),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.delta or self.lossy
+
+    @property
+    def lossy(self) -> bool:
+        return self.quantization != "none" or 0.0 < self.topk_ratio < 1.0
+
+    def encode(self, ndarrays, reference=None) -> tuple[list[np.ndarray], dict]:
+        """Encode an update. `reference` is the global model the update was trained from,
+        used for delta encoding (layers are sent in full, not sparsified and without the
+        error feedback of the previous rounds, when it is missing). Returns the
+        encoded ndarrays and the metrics to send along with them (codec marker and bytes
+        before/after encoding)."""
+        ndarrays = list(ndarrays)
+        dense = nbytes(ndarrays)
+        if not self.enabled:
+            return ndarrays, {"wire_bytes": dense, "dense_bytes": dense}
+        delta = self.delta and reference is not None and len(reference) == len(ndarrays)
+        if not delta or self.residuals is None or len(self.residuals) != len(ndarrays):
+            # residuals are errors on deltas, which the receiver adds up: none for a model sent in full
+            self.residuals = [None] * len(ndarrays)
+
+        encoded = []
+        for i, layer in enumerate(ndarrays):
+            ref = reference[i] if delta else None
+            buffer, self.residuals[i] = self.__encode_layer(np.asarray(layer), ref, self.residuals[i], sparse=delta)
+            encoded.append(buffer)
+        return encoded, {"codec": CODEC, "wire_bytes": nbytes(encoded), "dense_bytes": dense}
+
+    def __encode_layer(self, layer: np.ndarray, ref, residual, sparse: bool = True):
+        if not np.issubdtype(layer.dtype, np.floating):
+            return _pack(layer.dtype, layer.shape, 0, 0, 1.0, None, np.ascontiguousarray(layer)), None
+
+        flags = 0
+        values = layer.astype(np.float32).ravel()
+        if ref is not None:
+            flags |= _DELTA
+            values -= np.asarray(ref, dtype=np.float32).ravel()
+        if residual is not None:
+            values += residual
+        n = values.size
+
+        indices = None
+        if sparse and 0.0 < self.topk_ratio < 1.0 and n > 1:
+            k = max(1, int(n * self.topk_ratio))
+            indices = np.argpartition(np.abs(values), n - k)[n - k:].astype(np.uint32)
+            indices.sort()
+            flags |= _SPARSE
+        selected = values if indices is None else values[indices]
+
+        quantization = QUANTIZATIONS[self.quantization]
+        scale = 1.0
+        if self.quantization == "fp16":
+            payload = selected.astype(np.float16)
+            sent = payload.astype(np.float32)
+        elif self.quantization == "int8":
+            peak = float(np.max(np.abs(selected))) if selected.size else 0.0
+            scale = peak / 127.0 if peak > 0 else 1.0
+            payload = np.clip(np.rint(selected / scale), -127, 127).astype(np.int8)
+            sent = payload.astype(np.float32) * np.float32(scale)
+        else:
+            payload = selected
+            sent = payload
+
+        new_residual = None
+        if self.error_feedback and self.lossy:
+            if indices is None:
+                new_residual = values - sent
+            else:
+                new_residual = values.copy()
+                new_residual[indices] -= sent
+        return _pack(layer.dtype, layer.shape, flags, quantization, scale, indices, payload), new_residual
+
+
+def _pack(dtype, shape, flags, quantization, scale, indices, payload) -> np.ndarray:
+    count = payload.size
+    header = _HEADER.pack(_MAGIC, _VERSION, flags, quantization, len(shape), np.dtype(dtype).str.encode(), count, scale)
+    parts = [header, struct.pack(f"<{len(shape)}I", *shape)]
+    if indices is not None:
+        parts.append(indices.tobytes())
+    parts.append(np.ascontiguousarray(payload).tobytes())
+    return np.frombuffer(b"".join(parts), dtype=np.uint8)
+
+
+def decode_layer(buffer: np.ndarray, ref=None) -> np.ndarray:
+    """Decode a single encoded layer; `ref` is the matching layer of the reference model."""
+    data = memoryview(np.ascontiguousarray(buffer, dtype=np.uint8)).cast("B")
+    magic, version, flags, quantization, ndim, dtype, count, scale = _HEADER.unpack_from(data, 0)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("Not an encoded layer")
+    dtype = np.dtype(dtype.rstrip(b"\x00").decode())
+    offset = _HEADER.size
+    shape = struct.unpack_from(f"<{ndim}I", data, offset)
+    offset += 4 * ndim
+    size = int(np.prod(shape, dtype=np.int64))
+
+    if not np.issubdtype(dtype, np.floating):
+        return np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape).copy()
+
+    indices = None
+    if flags & _SPARSE:
+        indices = np.frombuffer(data, dtype=np.uint32, count=count, offset=offset)
+        offset += indices.nbytes
+    if quantization == QUANTIZATIONS["int8"]:
+        values = np.frombuffer(data, dtype=np.int8, count=count, offset=offset).astype(np.float32) * np.float32(scale)
+    elif quantization == QUANTIZATIONS["fp16"]:
+        values = np.frombuffer(data, dtype=np.float16, count=count, offset=offset).astype(np.float32)
+    else:
+        values = np.frombuffer(data, dtype=np.float32, count=count, offset=offset)
+
+    if indices is None:
+        layer = values.reshape(shape)
+    else:
+        layer = np.zeros(size, dtype=np.float32)
+        layer[indices] = values
+        layer = layer.reshape(shape)
+    if flags & _DELTA:
+        if ref is None:
+            raise ValueError("Delta encoded layer received without the reference model")
+        layer = np.asarray(ref, dtype=np.float32) + layer
+    return layer.astype(dtype, copy=True)
+
+
+def decode(encoded, reference=None) -> list[np.ndarray]:
+    """Decode a list of encoded layers."""
+    return list(decode_tensors(encoded, reference, raw=False))
+
+
+def decode_tensors(tensors, reference=None, raw: bool = True):
+    """Yield the decoded layers one at a time, so that a streaming aggregator never holds
+    more than one decoded layer. `tensors` are serialized ndarrays (Parameters.tensors)
+    when `raw` is True, ndarrays otherwise."""
+    for i, tensor in enumerate(tensors):
+        buffer = bytes_to_ndarray(tensor) if raw else tensor
+        yield decode_layer(buffer, reference[i] if reference is not None else None)
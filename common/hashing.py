@@ -0,0 +1,41 @@
+"""Content hashes of models, so that a receiver already holding a model is sent its hash only."""
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+DIGEST_SIZE = 16
+
+
+def content_hash(ndarrays) -> str:
+    """Hex digest of a list of ndarrays: dtype, shape and bytes of every array, in order."""
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for a in ndarrays:
+        a = np.asarray(a, order="C")
+        h.update(f"{a.dtype.str}{a.shape}".encode())
+        h.update(a.reshape(-1).view(np.uint8))
+    return h.hexdigest()
+
+
+class ModelCache:
+    """The last `capacity` models received, by content hash."""
+
+    def __init__(self, capacity: int = 2):
+        self.capacity = capacity
+        self.models = OrderedDict()
+
+    def put(self, model_hash: str, ndarrays):
+        self.models[model_hash] = ndarrays
+        self.models.move_to_end(model_hash)
+        while len(self.models) > self.capacity:
+            self.models.popitem(last=False)
+
+    def get(self, model_hash: str):
+        """The model with this hash, or None if it is not cached."""
+        ndarrays = self.models.get(model_hash)
+        if ndarrays is not None:
+            self.models.move_to_end(model_hash)
+        return ndarrays
+
+    def __contains__(self, model_hash: str) -> bool:
+        return model_hash in self.models
@@ -0,0 +1,126 @@
+"""Structured file logs written by a background thread.
+
+    from common.log import get_logger
+
+    log = get_logger(log_dir, "fit.log")
+    log.info("Round %d aggregated", rnd, extra={"fields": {"round": rnd}})
+
+Loggers are stdlib loggers whose QueueHandler only puts the record on the queue of the
+process: a single writer thread drains it by batches, writes one JSON line per record
+(`{"ts", "level", "logger", "pid", "message", **fields}`) and flushes each file once per
+batch. Files are rotated by size (`max_bytes`, keeping `backup_count` old files).
+"""
+import json
+import logging
+import logging.handlers
+import os
+import threading
+
+from common.writer import BackgroundWriter
+
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 3
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; `extra={"fields": {...}}` adds keys to it."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        return json.dumps(entry, default=str)
+
+
+class _BatchedFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotating file handler flushed by the writer once per batch instead of once per record."""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class _LogFiles:
+    """Log files of one process, opened by the writer on their first record."""
+
+    def __init__(self):
+        self.handlers = {}
+
+    def __handler(self, path: str) -> _BatchedFileHandler:
+        handler = self.handlers.get(path)
+        if handler is None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            handler = _BatchedFileHandler(path, maxBytes=_settings["max_bytes"], backupCount=_settings["backup_count"])
+            handler.setFormatter(JsonFormatter())
+            self.handlers[path] = handler
+        return handler
+
+    def write(self, batch: list[logging.LogRecord]):
+        touched = set()
+        for record in batch:
+            try:
+                handler = self.__handler(record.log_file)
+                handler.handle(record)
+                touched.add(handler)
+            except Exception as e:
+                print(f"[ERROR] Could not write a log record to {getattr(record, 'log_file', None)}: {e}")
+        for handler in touched:
+            handler.flush_batch()
+
+
+_settings = {"max_bytes": MAX_BYTES, "backup_count": BACKUP_COUNT}
+_loggers = {}
+_loggers_lock = threading.Lock()
+_writer = BackgroundWriter(lambda: _LogFiles().write, name="LogWriter")
+
+
+class _FileQueueHandler(logging.handlers.QueueHandler):
+    """Puts the records of a logger on the queue of the process writer, tagged with their file."""
+
+    def __init__(self, path: str):
+        super().__init__(None)
+        self.path = path
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        record.log_file = self.path
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        _writer.put(record)
+
+
+def configure(config: dict | None):
+    """Rotation settings (`max_bytes`, `backup_count`) from a `logging` config section.
+    Applies to the files opened after the call."""
+    config = config or {}
+    _settings["max_bytes"] = config.get("max_bytes", MAX_BYTES)
+    _settings["backup_count"] = config.get("backup_count", BACKUP_COUNT)
+
+
+def get_logger(log_dir: str, filename: str) -> logging.Logger:
+    """Logger writing to `{log_dir}/{filename}` through the background writer.
+    It is named `{last directory of log_dir}.{file name without extension}`, e.g. `edge1.fit`."""
+    path = os.path.abspath(os.path.join(log_dir, filename))
+    with _loggers_lock:
+        logger = _loggers.get(path)
+        if logger is None:
+            name = f"{os.path.basename(os.path.dirname(path))}.{os.path.splitext(filename)[0]}"
+            # not registered in the logging hierarchy: two directories may give the same name
+            logger = logging.Logger(name, logging.INFO)
+            logger.addHandler(_FileQueueHandler(path))
+            logger.propagate = False
+            _loggers[path] = logger
+    return logger
+
+
+def flush():
+    """Wait until every queued record of this process is written."""
+    _writer.flush()
@@ -0,0 +1,9 @@
+"""Model architectures shared by the clients, the edge servers and the orchestrator.
+Every tier builds its model (or only its parameter schema) from the `model.architecture`
+section of its config file, so that adding an architecture needs no change to the tiers."""
+from common.models.schema import ParameterSchema
+from common.models.registry import DEFAULT_MODEL, MODELS, register, build_model, model_schema
+# registers the architectures
+from common.models.cnn import ModelV2, CNN
+
+__all__ = ["ParameterSchema", "DEFAULT_MODEL", "MODELS", "register", "build_model", "model_schema", "ModelV2", "CNN"]
@@ -0,0 +1,85 @@
+from torch import nn
+
+from common.models.registry import register
+
+
+@register("model_v2")
+class ModelV2(nn.Module):
+    def __init__(self, input_shape: int = 1, hidden_units: int = 10, output_shape: int = 10) -> None:
+        super().__init__()
+
+        # input shape: [batch_size, 1, 28, 28]
+        # output shape: [batch_size, hidden_units, 14, 14]
+        # No padding, so the size is reduced by 1
+        # MaxPool2d reduces the size by half
+        self.conv1_block = nn.Sequential(
+            nn.Conv2d(in_channels=input_shape, out_channels=hidden_units, kernel_size=3, padding=1, stride=1),
+            nn.ReLU(),
+            nn.Conv2d(in_channels=hidden_units, out_channels=hidden_units, kernel_size=3, padding=1, stride=1),
+            nn.ReLU(),
+            nn.MaxPool2d(kernel_size=2)
+        )
+
+        # input shape: [batch_size, hidden_units, 14, 14]
+        # output shape: [batch_size, hidden_units, 7, 7]
+        # No padding, so the size is reduced by 1
+        # MaxPool2d reduces the size by half
+        self.conv2_block = nn.Sequential(
+            nn.Conv2d(in_channels=hidden_units, out_channels=hidden_units, kernel_size=3, padding=1, stride=1),
+            nn.ReLU(),
+            nn.Conv2d(in_channels=hidden_units, out_channels=hidden_units, kernel_size=3, padding=1, stride=1),
+            nn.ReLU(),
+            nn.MaxPool2d(kernel_size=2)
+        )
+
+        # input shape: [batch_size, hidden_units, 7, 7]
+        # output shape: [batch_size, output_shape]
+        self.linear_block = nn.Sequential(
+            nn.Flatten(),
+            nn.Linear(in_features=hidden_units*7*7, out_features=output_shape)
+        )
+
+    def forward(self, x):
+        return self.linear_block(self.conv2_block(self.conv1_block(x)))
+
+
+@register("cnn")
+class CNN(nn.Module):
+    """VGG-style CNN of configurable size: one block per entry of `channels`, each made of
+    `convs_per_block` 3x3 convolutions and a 2x2 max pooling, then `hidden_features` wide
+    fully connected layers. ModelV2 is channels=[hidden_units] * 2 without hidden layers."""
+
+    def __init__(self,
+                 input_shape: int = 1,
+                 output_shape: int = 10,
+                 channels=(32, 64),
+                 convs_per_block: int = 2,
+                 hidden_features=(),
+                 image_size: int = 28,
+                 dropout: float = 0.0,
+                ) -> None:
+        super().__init__()
+        blocks, in_channels, size = [], input_shape, image_size
+        for out_channels in channels:
+            layers = []
+            for _ in range(convs_per_block):
+                layers += [nn.Conv2d(in_channels, out_channels, kernel_size=3, padding=1), nn.ReLU()]
+                in_channels = out_channels
+            layers.append(nn.MaxPool2d(kernel_size=2))
+            blocks.append(nn.Sequential(*layers))
+            size //= 2
+        if size < 1:
+            raise ValueError(f"{len(channels)} pooling blocks do not fit {image_size}x{image_size} inputs")
+        self.features = nn.Sequential(*blocks)
+
+        head, in_features = [nn.Flatten()], in_channels * size * size
+        for out_features in hidden_features:
+            head += [nn.Linear(in_features, out_features), nn.ReLU()]
+            if dropout:
+                head.append(nn.Dropout(dropout))
+            in_features = out_features
+        head.append(nn.Linear(in_features, output_shape))
+        self.classifier = nn.Sequential(*head)
+
+    def forward(self, x):
+        return self.classifier(self.features(x))
@@ -0,0 +1,34 @@
+import torch
+
+from common.models.schema import ParameterSchema
+
+DEFAULT_MODEL = "model_v2"
+# name -> nn.Module class, filled by @register
+MODELS = {}
+
+
+def register(name: str):
+    """Class decorator adding a model to the registry under `name`."""
+    def wrap(cls):
+        if name in MODELS:
+            raise ValueError(f"Model {name} is already registered")
+        MODELS[name] = cls
+        return cls
+    return wrap
+
+
+def build_model(architecture: dict | None = None, **overrides) -> torch.nn.Module:
+    """Model described by the `model.architecture` section of a config file: `name` selects the
+    registered class, the other keys (and `overrides`, e.g. the number of classes of the
+    dataset as `output_shape`) are its constructor arguments."""
+    spec = dict(architecture or {}, **overrides)
+    name = spec.pop("name", DEFAULT_MODEL)
+    if name not in MODELS:
+        raise ValueError(f"Unknown model {name}, expected one of {sorted(MODELS)}")
+    return MODELS[name](**spec)
+
+
+def model_schema(architecture: dict | None = None, **overrides) -> ParameterSchema:
+    """Parameter schema of a model, built on the meta device: no weight is allocated."""
+    with torch.device("meta"):
+        return ParameterSchema.from_module(build_model(architecture, **overrides))
@@ -0,0 +1,76 @@
+"""Parameter schemas: names, shapes and dtypes of the arrays a model is exchanged as."""
+import hashlib
+import json
+
+import numpy as np
+
+from common.hashing import DIGEST_SIZE
+
+
+def _numpy_dtype(dtype) -> np.dtype:
+    """numpy dtype of a torch dtype (torch.float32 -> float32) or of anything np.dtype accepts."""
+    return np.dtype(str(dtype).removeprefix("torch."))
+
+
+class ParameterSchema:
+    """The arrays of a model in the order they are exchanged (state dict order).
+    `hash` identifies names, shapes and dtypes: two tiers agree on the model when their hashes
+    match, which the fit metrics carry (`schema`) so that an update is checked in O(1).
+    Updates without it are checked array by array with `validate`.
+    """
+
+    def __init__(self, names, shapes, dtypes):
+        self.names = list(names)
+        self.shapes = [tuple(int(d) for d in shape) for shape in shapes]
+        self.dtypes = [_numpy_dtype(dtype) for dtype in dtypes]
+        if not len(self.names) == len(self.shapes) == len(self.dtypes):
+            raise ValueError("A schema needs as many names, shapes and dtypes")
+        digest = hashlib.blake2b(json.dumps(self.to_dict(), sort_keys=True).encode(), digest_size=DIGEST_SIZE)
+        self.hash = digest.hexdigest()
+
+    @classmethod
+    def from_module(cls, model) -> "ParameterSchema":
+        """Schema of a torch module; works on the meta device, nothing is allocated."""
+        state = model.state_dict(keep_vars=True)
+        return cls(state.keys(), (t.shape for t in state.values()), (t.dtype for t in state.values()))
+
+    @classmethod
+    def from_ndarrays(cls, ndarrays, names=None) -> "ParameterSchema":
+        ndarrays = list(ndarrays)
+        names = list(names) if names is not None else [f"arr_{i}" for i in range(len(ndarrays))]
+        return cls(names, (a.shape for a in ndarrays), (a.dtype for a in ndarrays))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ParameterSchema":
+        return cls(data["names"], data["shapes"], data["dtypes"])
+
+    def to_dict(self) -> dict:
+        return {"names": self.names, "shapes": [list(s) for s in self.shapes], "dtypes": [d.str for d in self.dtypes]}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ParameterSchema) and self.hash == other.hash
+
+    def __hash__(self) -> int:
+        return hash(self.hash)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(np.prod(s, dtype=np.int64)) * d.itemsize for s, d in zip(self.shapes, self.dtypes))
+
+    def validate(self, ndarrays) -> list:
+        """The ndarrays as a list, if there are as many as arrays in the schema with the same
+        shapes; raises ValueError otherwise. Dtypes are not checked: aggregation casts them."""
+        ndarrays = list(ndarrays)
+        if len(ndarrays) != len(self.shapes):
+            raise ValueError(f"Expected {len(self.shapes)} arrays, got {len(ndarrays)}")
+        for name, shape, a in zip(self.names, self.shapes, ndarrays):
+            if tuple(a.shape) != shape:
+                raise ValueError(f"Shape mismatch for {name}: got {tuple(a.shape)}, expected {shape}")
+        return ndarrays
+
+    def zeros(self, dtype=None) -> list[np.ndarray]:
+        """One zeroed array per entry, in the dtype of the schema or `dtype`."""
+        return [np.zeros(shape, dtype=dtype or d) for shape, d in zip(self.shapes, self.dtypes)]
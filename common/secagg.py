@@ -0,0 +1,256 @@
+"""Pairwise-masked secure aggregation of the client -> edge server hop.
+
+Each client of a round turns its weighted update into fixed-point integers modulo 2^64
+and adds one mask per peer: a keystream of AES-CTR keyed by the secret it shares with the
+peer (X25519 key agreement, the edge server only relays the public keys), added towards
+peers with a larger id and subtracted towards the others. The masks cancel in the sum:
+the edge server learns the weighted sum of the updates and nothing about a single one.
+
+Masks are whole-buffer keystreams added with numpy, never per element in Python. Peers
+form a circulant graph over the sorted participants, every client masking with its
+`neighbors` closest ids, so masking costs O(neighbors * model size) whatever the
+number of clients of the edge server (Bell et al., 2020).
+
+Dropouts: the masks a dropped client shared with its neighbors do not cancel. The edge
+server asks the surviving neighbors for them once and removes them; a round that loses
+more than `max_dropouts` clients, or whose recovery fails, is discarded. A client never
+reveals its masks when none of its peers would be left, which would expose its update.
+
+Threat model: an honest-but-curious edge server that follows the protocol (there is no
+self mask: an update arriving after its masks were recovered must not be folded in).
+
+    server = SecAggServer(neighbors=16, max_dropouts=2)
+    instructions = server.configure(rnd, instructions)       # configure_fit
+    weights = server.aggregate(rnd, results, reference)      # aggregate_fit
+"""
+import hashlib
+import json
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from flwr.common import FitIns, GetPropertiesIns, Parameters, bytes_to_ndarray
+
+from common.telemetry import telemetry
+
+SCALE_BITS = 24
+PUBLIC_KEY = "secagg_public_key"
+_NONCE = bytes(16)
+
+
+def fixed_point(ndarrays, weight: float, scale_bits: int = SCALE_BITS) -> np.ndarray:
+    """`weight * ndarrays` as one flat buffer of fixed-point integers modulo 2^64."""
+    size = sum(a.size for a in ndarrays)
+    out = np.empty(size, dtype=np.float64)
+    offset = 0
+    for a in ndarrays:
+        np.multiply(np.asarray(a).reshape(-1), weight * 2.0 ** scale_bits, out=out[offset:offset + a.size])
+        offset += a.size
+    np.rint(out, out=out)
+    return out.astype(np.int64).view(np.uint64)
+
+
+def from_fixed_point(total: np.ndarray, divisor: float, reference, scale_bits: int = SCALE_BITS) -> list[np.ndarray]:
+    """Split a sum of fixed-point buffers into layers shaped like `reference`, divided by `divisor`."""
+    values = total.view(np.int64).astype(np.float64)
+    values /= 2.0 ** scale_bits * divisor
+    layers, offset = [], 0
+    for a in reference:
+        layers.append(values[offset:offset + a.size].reshape(a.shape).astype(a.dtype))
+        offset += a.size
+    return layers
+
+
+def mask(secret: bytes, rnd: int, size: int) -> np.ndarray:
+    """Keystream of `size` uint64 shared by the two owners of `secret`, fresh for each round."""
+    key = hashlib.blake2b(secret + rnd.to_bytes(8, "little"), digest_size=32, person=b"hfl-secagg").digest()
+    encryptor = Cipher(algorithms.AES(key), modes.CTR(_NONCE)).encryptor()
+    return np.frombuffer(encryptor.update(bytes(8 * size)), dtype=np.uint64)
+
+
+def neighbor_graph(participants, neighbors: int) -> dict[str, list[str]]:
+    """Peers of every participant: its `neighbors` closest ids (half on each side) in sorted order."""
+    ordered = sorted(participants)
+    n = len(ordered)
+    if n - 1 <= neighbors:
+        return {cid: [peer for peer in ordered if peer != cid] for cid in ordered}
+    half = (neighbors + 1) // 2
+    return {
+        cid: [ordered[(i + offset) % n] for offset in range(-half, half + 1) if offset]
+        for i, cid in enumerate(ordered)
+    }
+
+
+def encode_peers(peers: dict[str, bytes]) -> str:
+    return json.dumps({cid: key.hex() for cid, key in peers.items()})
+
+
+def decode_peers(encoded: str) -> dict[str, bytes]:
+    return {cid: bytes.fromhex(key) for cid, key in json.loads(encoded).items()}
+
+
+class SecAggClient:
+    """Client side: key pair, masking of the update and recovery of the masks shared with dropped peers.
+    Shared secrets are cached by peer public key, so key agreement is paid once per peer."""
+
+    def __init__(self, private_key: X25519PrivateKey | None = None, scale_bits: int = SCALE_BITS):
+        self.private_key = private_key or X25519PrivateKey.generate()
+        self.public_key = self.private_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+        self.scale_bits = scale_bits
+        self.secrets = {}
+
+    @classmethod
+    def from_seed(cls, seed: str, scale_bits: int = SCALE_BITS) -> "SecAggClient":
+        """Deterministic key pair, for simulated clients only: anyone knowing the seed has the key."""
+        private_bytes = hashlib.blake2b(seed.encode(), digest_size=32, person=b"hfl-secagg-sim").digest()
+        return cls(X25519PrivateKey.from_private_bytes(private_bytes), scale_bits)
+
+    def secret(self, peer_key: bytes) -> bytes:
+        secret = self.secrets.get(peer_key)
+        if secret is None:
+            secret = self.secrets[peer_key] = self.private_key.exchange(X25519PublicKey.from_public_bytes(peer_key))
+        return secret
+
+    def mask(self, ndarrays, weight: float, cid: str, rnd: int, peers: dict[str, bytes]) -> np.ndarray:
+        """Masked fixed-point buffer of `weight * ndarrays`, as client `cid` of round `rnd`."""
+        peers = {peer: key for peer, key in peers.items() if peer != cid}
+        if not peers:
+            raise ValueError("Secure aggregation needs at least one peer")
+        masked = fixed_point(ndarrays, weight, self.scale_bits)
+        self.__add_masks(masked, cid, rnd, peers)
+        return masked
+
+    def recover(self, cid: str, rnd: int, peers: dict[str, bytes], dropped: list[str], size: int) -> np.ndarray:
+        """Sum of the masks that client `cid` added towards its `dropped` peers in round `rnd`,
+        for the server to subtract. The request is stateless: the peers of the round are resent."""
+        peers = {peer: key for peer, key in peers.items() if peer != cid}
+        dropped = {peer: peers[peer] for peer in dropped if peer in peers}
+        if len(dropped) >= len(peers):
+            raise ValueError("Refusing to reveal the masks shared with every peer")
+        masks = np.zeros(size, dtype=np.uint64)
+        self.__add_masks(masks, cid, rnd, dropped)
+        return masks
+
+    def __add_masks(self, buffer: np.ndarray, cid: str, rnd: int, peers: dict[str, bytes]):
+        for peer, key in peers.items():
+            if cid < peer:
+                buffer += mask(self.secret(key), rnd, buffer.size)
+            else:
+                buffer -= mask(self.secret(key), rnd, buffer.size)
+
+
+class SecAggServer:
+    """Edge server side: relays the public keys, sends every client its peers and unmasks the sum.
+    Public keys are collected once per client with `get_properties` and kept while it is connected."""
+
+    def __init__(self, neighbors: int = 16, max_dropouts: int = 2, scale_bits: int = SCALE_BITS,
+                 timeout: float | None = 30.0, max_workers: int = 32):
+        self.neighbors = neighbors
+        self.max_dropouts = max_dropouts
+        self.scale_bits = scale_bits
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="SecAgg")
+        self.public_keys = {}
+        # round -> (mask id, cid -> peers of the round)
+        self.rounds = {}
+
+    @classmethod
+    def from_config(cls, config: dict | None = None) -> "SecAggServer | None":
+        """Build the server side from the `secagg` section of a config file, None when disabled."""
+        config = config or {}
+        if not config.get("enabled", False):
+            return None
+        return cls(
+            neighbors=config.get("neighbors", 16),
+            max_dropouts=config.get("max_dropouts", 2),
+            scale_bits=config.get("scale_bits", SCALE_BITS),
+            timeout=config.get("timeout", 30.0),
+        )
+
+    def __collect_keys(self, clients):
+        """Ask the clients whose public key is unknown for it, in parallel."""
+        def ask(client):
+            res = client.get_properties(GetPropertiesIns(config={PUBLIC_KEY: True}), self.timeout, None)
+            return client.cid, res.properties.get(PUBLIC_KEY)
+        unknown = [client for client in clients if client.cid not in self.public_keys]
+        futures = [self.executor.submit(ask, client) for client in unknown]
+        for future in futures:
+            try:
+                cid, key = future.result()
+            except Exception:
+                continue
+            if key:
+                self.public_keys[cid] = key
+
+    def configure(self, rnd: int, instructions, connected=None):
+        """Per-client fit instructions of round `rnd`: its id, the round and its peers with their keys.
+        Clients without a public key are left out of the round."""
+        if connected is not None:
+            self.public_keys = {cid: key for cid, key in self.public_keys.items() if cid in connected}
+        self.__collect_keys([client for client, _ in instructions])
+        instructions = [(client, ins) for client, ins in instructions if client.cid in self.public_keys]
+        graph = neighbor_graph([client.cid for client, _ in instructions], self.neighbors)
+        # edge round numbers restart with every global round: masks are keyed by a fresh id instead
+        mask_id = secrets.randbits(62)
+        self.rounds = {rnd: (mask_id, graph)}
+        configured = []
+        for client, ins in instructions:
+            peers = {peer: self.public_keys[peer] for peer in graph[client.cid]}
+            config = dict(ins.config, secagg_cid=client.cid, secagg_round=mask_id, secagg_peers=encode_peers(peers))
+            configured.append((client, FitIns(parameters=ins.parameters, config=config)))
+        return configured
+
+    def aggregate(self, rnd: int, results, reference) -> list[np.ndarray]:
+        """Unmasked weighted average of the masked updates of round `rnd`, shaped like `reference`.
+        Raises RuntimeError when the round cannot be unmasked."""
+        if rnd not in self.rounds:
+            raise RuntimeError(f"Round {rnd} was not configured for secure aggregation")
+        mask_id, graph = self.rounds[rnd]
+        results = [(client, res) for client, res in results if client.cid in graph]
+        if not results:
+            raise RuntimeError("No masked update received")
+        size = sum(a.size for a in reference)
+        total = np.zeros(size, dtype=np.uint64)
+        for _, res in results:
+            masked = bytes_to_ndarray(res.parameters.tensors[0])
+            if masked.dtype != np.uint64 or masked.size != size:
+                raise RuntimeError(f"Masked update of {masked.dtype} x {masked.size}, expected uint64 x {size}")
+            total += masked
+        dropped = set(graph) - {client.cid for client, _ in results}
+        if dropped:
+            telemetry.count("secagg_dropouts", len(dropped))
+            with telemetry.span("secagg_recover"):
+                total -= self.__recover(mask_id, graph, results, dropped, size)
+        weight = sum(res.num_examples for _, res in results)
+        return from_fixed_point(total, weight, reference, self.scale_bits)
+
+    def __recover(self, mask_id, graph, results, dropped, size) -> np.ndarray:
+        """Masks shared between the survivors and the dropped clients, asked once to the survivors."""
+        if len(dropped) > self.max_dropouts:
+            raise RuntimeError(f"{len(dropped)} clients dropped, at most {self.max_dropouts} can be recovered")
+
+        def ask(client):
+            peers = {peer: self.public_keys[peer] for peer in graph[client.cid]}
+            config = {
+                "secagg_cid": client.cid,
+                "secagg_round": mask_id,
+                "secagg_peers": encode_peers(peers),
+                "secagg_dropped": json.dumps(sorted(dropped & set(peers))),
+                "secagg_size": size,
+            }
+            ins = FitIns(parameters=Parameters(tensors=[], tensor_type="numpy.ndarray"), config=config)
+            res = client.fit(ins, self.timeout, None)
+            return bytes_to_ndarray(res.parameters.tensors[0])
+
+        survivors = [client for client, _ in results if dropped & set(graph[client.cid])]
+        masks = np.zeros(size, dtype=np.uint64)
+        try:
+            for recovered in self.executor.map(ask, survivors):
+                masks += recovered
+        except Exception as e:
+            raise RuntimeError(f"Mask recovery of {sorted(dropped)} failed: {e}") from e
+        return masks
+
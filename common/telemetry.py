@@ -0,0 +1,187 @@
+"""Round-level instrumentation: span timers and counters, exported as Prometheus text and JSONL traces.
+
+    from common.telemetry import telemetry
+
+    with telemetry.span("edge_aggregate", server=name):
+        ...
+    telemetry.count("wire_bytes_received", n, tier="edge")
+
+Every span feeds a latency histogram and, when a trace directory is configured, one JSON
+line `{"ts", "service", "span", "duration", "labels", "error"}` written by a background
+thread. Telemetry is off until `configure` enables it: `span` then returns a shared no-op
+context manager and `count` returns at once.
+"""
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+from common.writer import BackgroundWriter
+
+PREFIX = "hfl_"
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, math.inf)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class Span:
+    __slots__ = ("telemetry", "name", "labels", "wall", "start")
+
+    def __init__(self, telemetry: "Telemetry", name: str, labels: dict):
+        self.telemetry = telemetry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.telemetry.observe(self.name, time.perf_counter() - self.start, self.labels,
+                               start=self.wall, error=exc_type is not None)
+        return False
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, **extra) -> str:
+    pairs = list(labels) + [(k, str(v)) for k, v in extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Telemetry:
+    """Span timers and counters of one process."""
+
+    def __init__(self):
+        self.enabled = False
+        self.service = ""
+        self.trace_path = None
+        self.lock = threading.Lock()
+        self.counters = {}
+        # (name, labels) -> [count per bucket, sum, count]
+        self.histograms = {}
+        # trace lines, written to `trace_path` by a background thread
+        self.writer = BackgroundWriter(self.__open_trace, name="TraceWriter")
+
+    def configure(self, config: dict | None, service: str):
+        """Enable telemetry from a `telemetry` config section (`enabled`, `trace_dir`).
+        `service` names the process in the traces and their file, `{trace_dir}/{service}.jsonl`."""
+        config = config or {}
+        self.service = service
+        trace_dir = config.get("trace_dir")
+        self.trace_path = os.path.join(trace_dir, f"{service}.jsonl") if trace_dir else None
+        self.enabled = bool(config.get("enabled", False))
+
+    def span(self, name: str, **labels):
+        """Context manager timing a block as the span `name`."""
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name, labels)
+
+    def timed(self, name: str, **labels):
+        """Decorator timing every call of a function as the span `name`."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with Span(self, name, labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, labels: dict | None = None, start: float | None = None, error: bool = False):
+        """Record a span of `seconds` (also used for durations measured elsewhere)."""
+        if not self.enabled:
+            return
+        labels = labels or {}
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += seconds
+            histogram[2] += 1
+        if self.trace_path is not None:
+            self.__emit({"ts": start if start is not None else time.time() - seconds, "service": self.service,
+                         "span": name, "duration": seconds, "labels": labels, "error": error})
+
+    def prometheus(self) -> str:
+        """Counters and span histograms in the Prometheus text exposition format."""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, ([*buckets], total, n)) for key, (buckets, total, n) in self.histograms.items())
+        lines = []
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f"# TYPE {PREFIX}{name}_total counter")
+            for (counter, labels), value in counters:
+                if counter == name:
+                    lines.append(f"{PREFIX}{name}_total{_format_labels(labels)} {value}")
+        for name in sorted({name for (name, _), _ in histograms}):
+            metric = f"{PREFIX}{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for (span, labels), (buckets, total, n) in histograms:
+                if span != name:
+                    continue
+                cumulative = 0
+                for bound, hits in zip(BUCKETS, buckets):
+                    cumulative += hits
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f"{metric}_bucket{_format_labels(labels, le=le)} {cumulative}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {n}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Wait until every queued trace line is written."""
+        self.writer.flush()
+
+    def __emit(self, record: dict):
+        self.writer.put(record)
+
+    def __open_trace(self):
+        path = self.trace_path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        f = open(path, "a")
+
+        def write(records: list[dict]):
+            f.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+            f.flush()
+        return write
+
+
+# the telemetry of this process
+telemetry = Telemetry()
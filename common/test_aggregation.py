@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from flwr.common import ndarrays_to_parameters
+
+from common.aggregation import StreamingAggregator
+from common.models import model_schema
+
+SCHEMA = model_schema({"hidden_units": 4})
+RNG = np.random.default_rng(0)
+
+
+def update():
+    return [RNG.normal(size=shape).astype(np.float32) for shape in SCHEMA.shapes]
+
+
+def weighted_average(updates, weights):
+    return [sum(w * u[i].astype(np.float64) for u, w in zip(updates, weights)) / sum(weights)
+            for i in range(len(updates[0]))]
+
+
+def misshapen(layers, at):
+    layers = list(layers)
+    layers[at] = np.ones(layers[at].size + 1, dtype=np.float32)
+    return layers
+
+
+@pytest.mark.parametrize("schema", [None, SCHEMA])
+def test_mean_equals_weighted_average(schema):
+    updates, weights = [update() for _ in range(5)], [10, 3, 7, 1, 25]
+    aggregator = StreamingAggregator(schema)
+    for i, (layers, weight) in enumerate(zip(updates, weights)):
+        if i % 2:
+            aggregator.add(ndarrays_to_parameters(layers), weight)
+        else:
+            aggregator.add_ndarrays(iter(layers), weight)
+    result = aggregator.result()
+    assert aggregator.count == 5
+    for got, expected in zip(result, weighted_average(updates, weights)):
+        assert got.dtype == np.float32
+        np.testing.assert_allclose(got, expected, rtol=1e-6, atol=1e-6)
+
+
+@pytest.mark.parametrize("schema", [None, SCHEMA])
+def test_rejected_updates_are_rolled_back(schema):
+    updates, weights = [update() for _ in range(3)], [2, 5, 4]
+    aggregator = StreamingAggregator(schema)
+    aggregator.add_ndarrays(updates[0], weights[0])
+    # fails after folding most layers, then after all of them (one layer too many)
+    with pytest.raises(ValueError):
+        aggregator.add_ndarrays(misshapen(update(), len(SCHEMA.shapes) - 1), 100)
+    with pytest.raises(ValueError):
+        aggregator.add_ndarrays(update() + [np.ones(3, dtype=np.float32)], 100)
+    with pytest.raises(ValueError):
+        aggregator.add_ndarrays(update()[:-1], 100)
+    for layers, weight in zip(updates[1:], weights[1:]):
+        aggregator.add_ndarrays(layers, weight)
+    assert aggregator.count == 3
+    for got, expected in zip(aggregator.result(), weighted_average(updates, weights)):
+        np.testing.assert_allclose(got, expected, rtol=1e-6, atol=1e-6)
+
+
+def test_rejected_first_update_leaves_no_buffers():
+    def corrupted():
+        # e.g. a layer that fails to decode
+        yield from update()[:2]
+        raise ValueError("Not an encoded layer")
+
+    aggregator = StreamingAggregator()
+    with pytest.raises(ValueError):
+        aggregator.add_ndarrays(corrupted(), 1)
+    assert aggregator.accumulators is None
+    layers = update()
+    aggregator.add_ndarrays(layers, 3)
+    for got, expected in zip(aggregator.result(), layers):
+        np.testing.assert_allclose(got, expected)
+
+
+def test_reset_and_empty_result():
+    aggregator = StreamingAggregator(SCHEMA)
+    with pytest.raises(ValueError):
+        aggregator.result()
+    aggregator.add_ndarrays(update(), 1)
+    aggregator.reset()
+    layers = update()
+    aggregator.add_ndarrays(layers, 2)
+    for got, expected in zip(aggregator.result(), layers):
+        np.testing.assert_allclose(got, expected)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from common.compression import UpdateCodec, decode, is_encoded
+
+RNG = np.random.default_rng(0)
+REFERENCE = [RNG.normal(size=(32, 16)).astype(np.float32), RNG.normal(size=16).astype(np.float32),
+             np.arange(4, dtype=np.int64)]
+
+
+def update(scale=0.01):
+    return [REFERENCE[0] + scale * RNG.normal(size=(32, 16)).astype(np.float32),
+            REFERENCE[1] + scale * RNG.normal(size=16).astype(np.float32),
+            REFERENCE[2] + 1]
+
+
+def test_disabled_codec_sends_the_update_as_is():
+    layers = update()
+    encoded, metrics = UpdateCodec().encode(layers, REFERENCE)
+    assert encoded == layers
+    assert not is_encoded(metrics)
+
+
+def test_delta_round_trip():
+    layers = update()
+    encoded, metrics = UpdateCodec(delta=True).encode(layers, REFERENCE)
+    assert is_encoded(metrics)
+    for got, expected in zip(decode(encoded, REFERENCE), layers):
+        assert got.dtype == expected.dtype
+        np.testing.assert_allclose(got, expected, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("quantization, atol", [("fp16", 1e-4), ("int8", 1e-3)])
+@pytest.mark.parametrize("delta", [False, True])
+def test_quantized_round_trip(quantization, atol, delta):
+    layers = update()
+    encoded, metrics = UpdateCodec(delta=delta, quantization=quantization).encode(layers, REFERENCE)
+    assert metrics["wire_bytes"] < metrics["dense_bytes"]
+    decoded = decode(encoded, REFERENCE)
+    # int8 errors are relative to the largest value sent: deltas are sent far more precisely
+    tolerance = atol if delta else atol * 100
+    for got, expected in zip(decoded[:2], layers[:2]):
+        np.testing.assert_allclose(got, expected, rtol=0, atol=tolerance)
+    np.testing.assert_array_equal(decoded[2], layers[2])
+
+
+def test_topk_keeps_the_largest_entries():
+    layers = update()
+    encoded, _ = UpdateCodec(delta=True, topk_ratio=0.1, error_feedback=False).encode(layers, REFERENCE)
+    decoded = decode(encoded, REFERENCE)
+    sent = decoded[0] - REFERENCE[0]
+    expected = layers[0] - REFERENCE[0]
+    kept = sent != 0
+    assert kept.sum() == int(expected.size * 0.1)
+    assert np.abs(expected[kept]).min() >= np.abs(expected[~kept]).max()
+    np.testing.assert_allclose(sent[kept], expected[kept], atol=1e-6)
+
+
+def test_topk_needs_delta():
+    with pytest.raises(ValueError):
+        UpdateCodec(topk_ratio=0.1)
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_error_feedback_adds_up_to_the_dense_updates(quantization):
+    codec = UpdateCodec(delta=True, quantization=quantization, topk_ratio=0.05)
+    dense = [np.zeros_like(layer, dtype=np.float64) for layer in REFERENCE[:2]]
+    received = [np.zeros_like(layer, dtype=np.float64) for layer in REFERENCE[:2]]
+    for _ in range(30):
+        layers = update()
+        decoded = decode(codec.encode(layers, REFERENCE)[0], REFERENCE)
+        for i in range(2):
+            dense[i] += layers[i] - REFERENCE[i]
+            received[i] += decoded[i] - REFERENCE[i]
+    # what was not sent yet is exactly what the codec holds back
+    for i in range(2):
+        np.testing.assert_allclose(received[i] + codec.residuals[i].reshape(dense[i].shape), dense[i], atol=1e-4)
+
+
+def test_missing_reference_sends_full_layers_without_residuals():
+    codec = UpdateCodec(delta=True, topk_ratio=0.05)
+    codec.encode(update(scale=1.0), REFERENCE)
+    layers = update()
+    decoded = decode(codec.encode(layers, None)[0])
+    for got, expected in zip(decoded, layers):
+        np.testing.assert_allclose(got, expected, atol=1e-6)
@@ -0,0 +1,68 @@
+"""Background writer of one process, shared by the file logs and the telemetry traces.
+
+    writer = BackgroundWriter(open_sink, name="LogWriter")
+    writer.put(record)
+
+`open_sink()` is called by the writer thread of each process and returns the function
+writing a batch of items: the thread drains the queue, hands everything queued so far to
+it in one call, and marks the items done once it returned.
+"""
+import atexit
+import multiprocessing.util
+import os
+import queue
+import threading
+from typing import Callable
+
+
+class BackgroundWriter:
+    """Queue drained by a daemon thread, by batches.
+    The thread is started by the first `put` of each process (forked processes included,
+    they never reuse the queue or the sink of their parent) and the queue is flushed when
+    the process exits."""
+
+    def __init__(self, open_sink: Callable[[], Callable[[list], None]], name: str):
+        self.open_sink = open_sink
+        self.name = name
+        self.lock = threading.Lock()
+        self.queue = None
+        self.pid = None
+
+    def put(self, item):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.__start()
+        self.queue.put(item)
+
+    def flush(self):
+        """Wait until every item queued by this process is written."""
+        if self.queue is not None and self.pid == os.getpid():
+            self.queue.join()
+
+    def __start(self):
+        self.queue = queue.Queue()
+        threading.Thread(target=self.__run, args=(self.queue,), name=self.name, daemon=True).start()
+        self.pid = os.getpid()
+        atexit.register(self.flush)
+        # multiprocessing children leave through os._exit, without atexit
+        multiprocessing.util.Finalize(self, self.flush, exitpriority=10)
+
+    def __run(self, items: queue.Queue):
+        write = None
+        while True:
+            batch = [items.get()]
+            while True:
+                try:
+                    batch.append(items.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if write is None:
+                    write = self.open_sink()
+                write(batch)
+            except Exception as e:
+                print(f"[ERROR] {self.name} could not write {len(batch)} records: {e}")
+            finally:
+                for _ in batch:
+                    items.task_done()
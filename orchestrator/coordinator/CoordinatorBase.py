@@ -1,109 +1,344 @@
 import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 import time
 import socket
+from coordinator.EdgeServer import EdgeServer
+from coordinator.EdgePool import EdgePool
+from coordinator.HealthMonitor import HealthMonitor
+from coordinator.placement import build_placement
+from coordinator.state import build_state_store
+from common.telemetry import telemetry
 
 class CoordinatorBase(ABC):
+    """Allocates clients to edge servers.
+    `allocate` never blocks on the network: new edge servers are started by a pool of
+    provisioning threads, and clients placed on an edge server that is still starting
+    receive a "pending" allocation that they can poll (or long-poll) until it is ready.
+    New edge servers are taken from a pool of warm edge servers when one is available.
+    Liveness comes from a background HealthMonitor: when an edge server dies its clients
+    are placed on other edge servers right away, without waiting for them to ask.
+    The edge server of a new client is chosen by a pluggable PlacementStrategy.
+    Edge servers and allocations are written behind to a StateStore by a single writer
+    thread, in the order of the placement decisions: an orchestrator restarted on a
+    persistent store recovers them instead of re-allocating every client.
+    """
+
+    ALLOCATED = "allocated"
+    PENDING = "pending"
+    UNALLOCATED = "unallocated"
+
     def __init__(self, config):
         self.edge_servers = {}
         self.max_clients_per_edge_server = config["orchestrator"]["max_clients_per_edge_server"]
-        self.current_edge_server = None
+        self.edge_boot_timeout = config["orchestrator"].get("edge_boot_timeout", 10)
         self.config = config
-        self.requests_lock = threading.Lock()
+        # only guards the choice of the edge server: state writes are queued under it and run by
+        # the state writer, the only store access it covers is next_edge_id for a new edge server
+        self.placement_lock = threading.Lock()
         self.clients = {}
+        self.state = build_state_store(config["orchestrator"].get("state"))
+        self.state_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="StateWriter")
+        self.placement = build_placement(self.max_clients_per_edge_server, config["orchestrator"].get("placement"))
+        self.provisioner = ThreadPoolExecutor(
+            max_workers=config["orchestrator"].get("provisioning_workers", 8),
+            thread_name_prefix="EdgeProvisioner",
+        )
+        self.pool = EdgePool(self, config["orchestrator"].get("pool"))
+        self.health = HealthMonitor(self, config["orchestrator"].get("health"))
+
+    def start(self):
+        """Recover the stored state, then start the background services of the coordinator
+        (warm pool and health monitor)."""
+        self.__recover()
+        self.pool.start()
+        self.health.start()
+
+    @telemetry.timed("allocate")
+    def allocate(self, client_id: str, num_examples: int | None = None) -> dict:
+        """Allocate a client to an edge server.
+        `num_examples` is the size of the client dataset, used by load-aware placement."""
+        edge, placed = self.__place(client_id, num_examples)
+        if not placed:
+            print(f"Client {client_id} is already allocated to edge server {edge.name}")
+            return self._allocation_response(edge, "Client already allocated to an edge server")
+
+        self.pool.record_arrival()
+        return self._allocation_response(edge, "Client allocated to edge server")
 
-    def allocate(self, client_id: str) -> dict:
-        """Allocate a client to an edge server."""
-        if client_id in self.clients:
-            if not self.__dead_edge_server(self.clients[client_id]):
-                print(f"Client {client_id} is already allocated to edge server {self.clients[client_id]}")
-                #raise RuntimeError(f"Edge server {self.clients[client_id]} did not start in time")
-                return {"edge_server": self.clients[client_id], "message": "Client already allocated to an edge server"}
+    @telemetry.timed("allocate_batch")
+    def allocate_batch(self, clients: dict[str, int | None]) -> dict[str, dict]:
+        """Allocate many clients (client id -> number of examples) in one pass: the placement
+        lock is taken once and the allocations are stored in a single write."""
+        responses = {}
+        placed = []
+        with self.placement_lock:
+            for client_id, num_examples in clients.items():
+                edge = self.__edge_of(client_id)
+                if edge is not None:
+                    responses[client_id] = self._allocation_response(edge, "Client already allocated to an edge server")
+                    continue
+                edge, weight = self.__assign(client_id, num_examples)
+                placed.append((client_id, edge.name, weight, num_examples))
+                responses[client_id] = self._allocation_response(edge, "Client allocated to edge server")
+            self._persist(self.state.save_allocations, placed)
+        self.pool.record_arrival(len(placed))
+        print(f"[LOG] Batch of {len(clients)} clients: {len(placed)} allocated")
+        return responses
+
+    def __place(self, client_id: str, num_examples: int | None = None) -> tuple[EdgeServer, bool]:
+        """Assign a client to an edge server, opening a new one if needed.
+        Returns its edge server and False if it was already allocated (checked under the lock,
+        so concurrent requests for the same client place it once)."""
+        with self.placement_lock:
+            edge = self.__edge_of(client_id)
+            if edge is not None:
+                return edge, False
+            edge, weight = self.__assign(client_id, num_examples)
+            self._persist(self.state.save_allocation, client_id, edge.name, weight, num_examples)
+        print(f"[LOG] Allocated client {client_id} to edge server {edge.name}")
+        return edge, True
+
+    def __assign(self, client_id: str, num_examples: int | None) -> tuple[EdgeServer, float]:
+        """Choose the edge server of a client and record it in memory. Must hold `placement_lock`."""
+        weight = self.placement.weight(num_examples, client_id)
+        edge = self.placement.place(client_id)
+        if edge is None:
+            print("[LOG] Allocating a new edge server for client:", client_id)
+            edge = self.pool.acquire()
+            if edge is not None and self.edge_servers.get(edge.name) is edge:
+                edge.placeable = True
+                self._persist(self.state.save_edge, edge.name, edge.id, True, self._edge_meta(edge.name))
+                self.placement.add_edge(edge)
             else:
-                print(f"The requested edge server is dead, allocating a new one for client {client_id}")
-        
-        edge_server_ip = None
-        with self.requests_lock:
-            if not self.edge_servers or len(self.edge_servers[self.current_edge_server]) >= self.max_clients_per_edge_server:
-                print("[LOG] Allocating a new edge server for client:", client_id)
-                # Allocate a new edge server
-                edge_server_ip = f"edge{len(self.edge_servers) + 1}"
-                try:
-                    self._add_edge(edge_server_ip)
-                except Exception as e:
-                    raise RuntimeError(f"Failed to add edge server {edge_server_ip}: {e}")
-                self.current_edge_server = edge_server_ip
-                self.edge_servers[edge_server_ip] = []
+                edge = self._new_edge_server()
+        edge.add_client(client_id, weight, num_examples)
+        self.placement.record(client_id, num_examples)
+        self.placement.update(edge)
+        self.clients[client_id] = edge.name
+        return edge, weight
+
+    def record_client_stats(self, edge_server_ip: str, durations: dict[str, float]) -> bool:
+        """Fit durations (client id -> seconds) measured by an edge server, fed to the placement.
+        Returns False if the edge server is unknown."""
+        with self.placement_lock:
+            edge = self.edge_servers.get(edge_server_ip)
+            if edge is None:
+                return False
+            self.placement.observe(edge, durations)
+        telemetry.count("client_stats_reported", len(durations))
+        return True
+
+    def __recover(self):
+        """Rebuild the edge servers and allocations of a previous run from the state store.
+        Clients keep their edge server: each recovered edge server is probed and, if it did
+        not survive the restart, provisioned again under the same name."""
+        start_time = time.monotonic()
+        records, allocations = self.state.load()
+        if not records:
+            return
+        recovered = {}
+        with self.placement_lock:
+            for record in records:
+                edge = EdgeServer(record["name"], record["id"], record["placeable"])
+                self._restore_edge(edge.name, record["meta"])
+                self.edge_servers[edge.name] = edge
+                recovered[edge.name] = edge
+            for allocation in allocations:
+                edge = recovered.get(allocation["edge"])
+                if edge is not None:
+                    edge.add_client(allocation["client_id"], allocation["weight"], allocation["num_examples"])
+                    self.placement.record(allocation["client_id"], allocation["num_examples"])
+                    self.clients[allocation["client_id"]] = edge.name
+            for edge in recovered.values():
+                if edge.placeable:
+                    self.placement.add_edge(edge)
+                    self.placement.update(edge)
+                else:
+                    self.pool.adopt(edge)
+        for edge in recovered.values():
+            self.provisioner.submit(self.__provision_edge_server, edge, True)
+        print(f"[LOG] Recovered {len(recovered)} edge servers and {len(self.clients)} allocations "
+              f"in {time.monotonic() - start_time:.2f}s")
+
+    def allocation_status(self, client_id: str) -> dict:
+        """Return the current allocation of a client without blocking."""
+        edge = self.__edge_of(client_id)
+        if edge is None:
+            return {"status": self.UNALLOCATED, "message": "Client is not allocated, request a new allocation"}
+        return self._allocation_response(edge, "Client allocated to edge server")
+
+    def _persist(self, write, *args):
+        """Queue a write to the state store. Queued under `placement_lock`, the writes reach the
+        store in the order of the decisions they record."""
+        try:
+            future = self.state_writer.submit(write, *args)
+        except RuntimeError:
+            # shutting down: the records are those written so far
+            return
+        future.add_done_callback(self.__write_done)
+
+    @staticmethod
+    def __write_done(future):
+        if future.exception() is not None:
+            print(f"[ERROR] State write failed: {future.exception()}")
+            telemetry.count("state_write_failures")
+
+    def __edge_of(self, client_id: str) -> EdgeServer | None:
+        edge_server_ip = self.clients.get(client_id)
+        if edge_server_ip is None:
+            return None
+        edge = self.edge_servers.get(edge_server_ip)
+        if edge is None or edge.state == EdgeServer.FAILED or (edge.state == EdgeServer.READY and not edge.alive):
+            return None
+        return edge
+
+    def _new_edge_server(self, placeable: bool = True) -> EdgeServer:
+        """Register a new edge server and queue its provisioning. Must hold `placement_lock`.
+        Edge servers that are not placeable (e.g. warm pool ones) receive no clients."""
+        edge_id = self.state.next_edge_id()
+        edge = EdgeServer(f"edge{edge_id}", edge_id, placeable)
+        self.edge_servers[edge.name] = edge
+        self._persist(self.state.save_edge, edge.name, edge.id, placeable)
+        if placeable:
+            self.placement.add_edge(edge)
+        self.provisioner.submit(self.__provision_edge_server, edge)
+        return edge
+
+    def _retire_edge_server(self, edge: EdgeServer):
+        """Stop an edge server that has no clients."""
+        self.__drop_edge_server(edge)
+        self.provisioner.submit(self._remove_edge, edge.name)
+
+    @telemetry.timed("edge_provision")
+    def __provision_edge_server(self, edge: EdgeServer, recovered: bool = False):
+        """Start an edge server and wait until it accepts connections.
+        A `recovered` edge server that is still running is reattached without restarting it."""
+        start_time = time.monotonic()
+        try:
+            reattached = recovered and self._reattachable(edge.name) and self._probe_edge(edge.name, self.health.probe_timeout)
+            if not reattached:
+                self._add_edge(edge.name)
+                if not self.__wait_for_edge_server(edge.name, self.edge_boot_timeout):
+                    raise RuntimeError(f"Edge server {edge.name} did not start in time")
+            self._persist(self.state.save_edge, edge.name, edge.id, edge.placeable, self._edge_meta(edge.name))
+            edge.ready_at = time.monotonic()
+            edge.alive = True
+            edge.last_seen = edge.ready_at
+            edge.next_probe = edge.ready_at + self.health.interval
+            edge.state = EdgeServer.READY
+            if reattached:
+                print(f"[LOG] Edge server {edge.name} survived the restart, reattached")
             else:
-                # Allocate to the current edge server
-                print("[LOG] Allocating to the current edge server for client:", client_id)
-                edge_server_ip = self.current_edge_server
-        
-
-        if self.__dead_edge_server(edge_server_ip):
-            raise RuntimeError(f"Edge server {edge_server_ip} is dead, cannot allocate client")
-        
-        self.edge_servers[edge_server_ip].append(client_id)
-        self.clients[client_id] = edge_server_ip
-        return {"edge_server": edge_server_ip, "message": "Client allocated to edge server"}
-    
-    def __dead_edge_server(self, edge_server_ip: str) -> bool:
-        """Check if an edge server is dead by trying to connect to it.
-        If the connection fails, it is considered dead.
-        In case of a dead edge server, it will be removed from the list of edge servers. Other clients will be removed from it.
-        Returns True if the edge server is dead, False otherwise.
-        """
+                self.pool.record_cold_start(edge.ready_at - start_time)
+                print(f"[LOG] Edge server {edge.name} ready in {edge.ready_at - start_time:.2f}s")
+        except Exception as e:
+            print(f"[CRITICAL] Failed to add edge server {edge.name}: {e}")
+            telemetry.count("edge_provision_failures")
+            edge.error = str(e)
+            self.__drop_edge_server(edge)
+            try:
+                self._remove_edge(edge.name)
+            except Exception as e:
+                print(f"[ERROR] Failed to clean up edge server {edge.name}: {e}")
+        finally:
+            edge.provisioned.set()
+
+    def _on_edge_dead(self, edge: EdgeServer):
+        """Called by the HealthMonitor: drop the edge server and place its clients elsewhere."""
+        print(f"[CRITICAL] Edge server {edge.name} is dead, removing it and reallocating its clients")
+        orphans = self.__drop_edge_server(edge)
+        self.provisioner.submit(self._remove_edge, edge.name)
+        for client_id, num_examples in orphans.items():
+            # skipped by __place if the client asked for a new allocation meanwhile
+            self.__place(client_id, num_examples)
+
+    def __drop_edge_server(self, edge: EdgeServer) -> dict[str, int | None]:
+        """Forget an edge server and return its clients with their number of examples."""
+        edge.state = EdgeServer.FAILED
+        orphans = {}
+        with self.placement_lock:
+            if self.edge_servers.get(edge.name) is edge:
+                self.edge_servers.pop(edge.name)
+                self._persist(self.state.remove_edge, edge.name)
+            self.placement.remove_edge(edge)
+            with edge.lock:
+                for client_id in edge.clients:
+                    if self.clients.get(client_id) == edge.name:
+                        self.clients.pop(client_id)
+                        orphans[client_id] = edge.examples.get(client_id)
+        return orphans
+
+    def _allocation_response(self, edge: EdgeServer, message: str) -> dict:
+        """Build the payload returned to a client for the given edge server."""
+        if edge.state != EdgeServer.READY:
+            return {"status": self.PENDING, "edge_server": edge.name, "message": "Edge server is being provisioned"}
+        host, port = self._edge_address(edge.name)
+        return {"status": self.ALLOCATED, "edge_server": edge.name, "address": f"{host}:{port}", "message": message}
+
+    def _edge_address(self, edge_server_ip: str) -> tuple[str, int]:
+        """Return the (host, port) pair on which the edge server accepts Flower clients.
+        By default the edge server name is resolved as a hostname (e.g. a Docker container name)."""
+        return edge_server_ip, self.config["network"]["port"]
+
+    def _edge_meta(self, edge_server_ip: str) -> dict:
+        """Backend data stored with an edge server to reach it again after a restart."""
+        return {}
+
+    def _restore_edge(self, edge_server_ip: str, meta: dict):
+        """Restore the backend data of a recovered edge server (see `_edge_meta`)."""
+        pass
+
+    def _reattachable(self, edge_server_ip: str) -> bool:
+        """True if what answers at the address of a recovered edge server can be the edge server
+        of the previous run. By default the address is the name of the edge server."""
+        return True
+
+    def _probe_edge(self, edge_server_ip: str, timeout: float = 1.0) -> bool:
+        """Single liveness probe: True if the edge server accepts a TCP connection."""
         try:
-            # if the connection is successful, the edge server is alive
-            if self.__wait_for_edge_server(edge_server_ip):
-                print(f"[LOG] Edge server {edge_server_ip} is alive")
-                return False
-            else: 
-                raise ConnectionRefusedError(f"[CRITICAL] Issue with edge server {edge_server_ip}")
+            with socket.create_connection(self._edge_address(edge_server_ip), timeout=timeout):
+                return True
         except (socket.timeout, ConnectionRefusedError, OSError):
-            # If the connection fails, the edge server is considered dead
-            print(f"[CRITICAL] Edge server {edge_server_ip} is dead, removing it and its clients")
-            with self.requests_lock:
-                if edge_server_ip in self.edge_servers:
-                    clients = self.edge_servers[edge_server_ip]
-                    for client_id in clients:
-                        self.clients.pop(client_id, None)
-                    self.edge_servers.pop(edge_server_ip, None)
-            return True
-        
+            return False
+
     def __wait_for_edge_server(self, edge_server_ip: str, timeout: int = 10) -> bool:
         """Wait for an edge server to start by trying to connect to it.
         Returns True if the edge server is alive, False if it times out.
         """
         start_time = time.time()
         while time.time() - start_time < timeout:
-            try:
-                # Attempt to connect to the edge server
-                socket.create_connection((edge_server_ip, self.config["network"]["port"]), timeout=1)
+            # Attempt to connect to the edge server
+            if self._probe_edge(edge_server_ip):
                 return True
-            except (socket.timeout, ConnectionRefusedError, OSError):
-                time.sleep(1)
+            time.sleep(1)
         return False
-    
+
     def cleanup_edge_servers(self,):
         """Clean up edge servers by terminating their processes."""
-        for edge_server in self.edge_servers.keys():
+        self.pool.stop()
+        self.health.stop()
+        self.provisioner.shutdown(wait=False, cancel_futures=True)
+        for edge_server in list(self.edge_servers.keys()):
             self._remove_edge(edge_server)
-    
+        # the records are kept: the next start provisions the same edge servers again
+        self.state_writer.shutdown(wait=True)
+        self.state.close()
+
     def print_status(self):
         """Print the current status of edge servers and their clients."""
         print("Current Edge Servers and Clients:")
-        for edge_server, clients in self.edge_servers.items():
-            print(f"Edge Server: {edge_server}, Clients: {clients}")
+        for edge_server, edge in list(self.edge_servers.items()):
+            print(f"Edge Server: {edge_server} ({edge.state}, load {edge.load:g}), Clients: {edge.clients}")
         print("")
-    
+
     @abstractmethod
     def _remove_edge(self, edge_server_ip: str):
         """Remove an edge server."""
         raise NotImplementedError("This method should be implemented by subclasses.")
-    
+
     @abstractmethod
     def _add_edge(self, edge_server_ip: str):
         """Add a new edge server."""
         raise NotImplementedError("This method should be implemented by subclasses.")
-    
\ No newline at end of file
+
@@ -0,0 +1,133 @@
+import os
+import sys
+import signal
+import atexit
+import subprocess
+from coordinator import CoordinatorBase
+from coordinator.utils import find_free_port
+
+class CoordinatorLocal(CoordinatorBase):
+    """Coordinator that runs every edge aggregator as a local subprocess.
+    Each edge server executes `edge_server/server.py` on a free port of the local host,
+    so the whole hierarchy can run on a single machine without Docker.
+    Checkpoints are kept under the edge `save_path`, hence an edge server started again
+    with the same name warm starts from its last saved model.
+    The port and process group of every edge server are kept in the state store, so a
+    restarted orchestrator reattaches the edge servers that outlived it. A recovered process
+    is reattached or signalled only if its command line is still that of the edge server
+    (`/proc`, Linux): a stored pid or port may have been reused by another process since.
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        local_cfg = config["orchestrator"]["local"]
+        self.host = local_cfg.get("host", "127.0.0.1")
+        self.server_script = os.path.abspath(local_cfg["edge_server_script"])
+        self.edge_config = os.path.abspath(local_cfg["edge_config"])
+        self.stdout_path = os.path.abspath(local_cfg.get("stdout_path", "./logs/stdout"))
+        self.stop_timeout = local_cfg.get("stop_timeout", 10)
+        self.processes = {}
+        self.ports = {}
+        # process groups of edge servers recovered from the state store, started by a previous run
+        self.recovered_pids = {}
+
+    def start(self):
+        super().start()
+        # registered by the process running the coordinator: the edge servers live in their own
+        # sessions and would outlive it if it exits without its shutdown hook
+        atexit.register(self.cleanup_edge_servers)
+
+    def _edge_address(self, edge_server_ip: str) -> tuple[str, int]:
+        return self.host, self.ports.get(edge_server_ip, 0)
+
+    def _edge_meta(self, edge_server_ip: str) -> dict:
+        process = self.processes.get(edge_server_ip)
+        pid = process.pid if process is not None else self.recovered_pids.get(edge_server_ip)
+        return {"port": self.ports.get(edge_server_ip), "pid": pid}
+
+    def _restore_edge(self, edge_server_ip: str, meta: dict):
+        if meta.get("port"):
+            self.ports[edge_server_ip] = meta["port"]
+        if meta.get("pid"):
+            self.recovered_pids[edge_server_ip] = meta["pid"]
+
+    def _owns_process(self, edge_server_ip: str, pid: int) -> bool:
+        """True if `pid` leads the process group of the edge server started under this name."""
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                argv = f.read().decode(errors="replace").split("\0")
+            if os.getpgid(pid) != pid:
+                return False
+        except OSError:
+            return False
+        expected = [["--name", edge_server_ip]]
+        if self.ports.get(edge_server_ip):
+            expected.append(["--port", str(self.ports[edge_server_ip])])
+        pairs = [argv[i:i + 2] for i in range(len(argv) - 1)]
+        return self.server_script in argv and all(pair in pairs for pair in expected)
+
+    def _reattachable(self, edge_server_ip: str) -> bool:
+        pid = self.recovered_pids.get(edge_server_ip)
+        return pid is not None and self._owns_process(edge_server_ip, pid)
+
+    def _add_edge(self, edge_server_ip: str):
+        """Start a new edge server process listening on a free port."""
+        # a name can be reused after its edge server died: never leak the old process
+        self._stop_process(edge_server_ip)
+        port = find_free_port(self.host)
+        os.makedirs(self.stdout_path, exist_ok=True)
+        stdout = open(os.path.join(self.stdout_path, f"{edge_server_ip}.log"), "ab")
+        try:
+            process = subprocess.Popen(
+                [sys.executable, self.server_script,
+                 "--config", self.edge_config,
+                 "--name", edge_server_ip,
+                 "--port", str(port)],
+                cwd=os.path.dirname(self.server_script),
+                stdout=stdout,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        finally:
+            # the child keeps its own handle on the file
+            stdout.close()
+        self.ports[edge_server_ip] = port
+        self.processes[edge_server_ip] = process
+        print(f"[LOG] Edge server {edge_server_ip} started (pid={process.pid}) on {self.host}:{port}")
+
+    def _remove_edge(self, edge_server_ip: str):
+        """Remove an edge server, stopping its process."""
+        self.edge_servers.pop(edge_server_ip, None)
+        self._stop_process(edge_server_ip)
+
+    def _stop_process(self, edge_server_ip: str):
+        """Stop the edge server process and all of its children."""
+        recovered_pid = self.recovered_pids.pop(edge_server_ip, None)
+        if recovered_pid is not None and not self._owns_process(edge_server_ip, recovered_pid):
+            recovered_pid = None
+        self.ports.pop(edge_server_ip, None)
+        process = self.processes.pop(edge_server_ip, None)
+        if process is None and recovered_pid is not None:
+            # not a child of this process: its session is signalled without waiting for it
+            try:
+                os.killpg(recovered_pid, signal.SIGTERM)
+                print(f"[LOG] Edge server {edge_server_ip} (pid={recovered_pid}) has been stopped")
+            except (ProcessLookupError, PermissionError):
+                pass
+            return
+        if process is None or process.poll() is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=self.stop_timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+        except ProcessLookupError:
+            pass
+        print(f"[LOG] Edge server {edge_server_ip} (pid={process.pid}) has been stopped")
+
+    def allocate(self, client_id, num_examples=None):
+        message = super().allocate(client_id, num_examples)
+        super().print_status()
+        return message
@@ -9,14 +9,14 @@ class CoordinatorSimulator(CoordinatorBase):
 
     def _remove_edge(self, edge_server_ip: str):
             """Simulate removing an edge server."""
-            self.edge_servers.pop(edge_server_ip)
+            self.edge_servers.pop(edge_server_ip, None)
             run_shell_script(self.kill_script_path, edge_server_ip)
 
     def _add_edge(self, edge_server_ip: str):
             """Simulate adding a new edge server."""
             run_shell_script(self.run_script_path, edge_server_ip)
     
-    def allocate(self, client_id):
-        message = super().allocate(client_id)
+    def allocate(self, client_id, num_examples=None):
+        message = super().allocate(client_id, num_examples)
         super().print_status()
         return message
@@ -0,0 +1,156 @@
+import math
+import threading
+import time
+from collections import deque
+from coordinator.EdgeServer import EdgeServer
+
+class EdgePool:
+    """Pool of pre-provisioned, idle edge servers.
+    A background thread keeps a number of warm edge servers ready to be handed to the
+    coordinator, so that opening a new edge server does not pay a cold start.
+    The number of idle edge servers follows the client arrival rate, like a VMSS
+    autoscaling rule: enough edge servers to absorb the arrivals expected during one
+    cold start, bounded by `min_idle` and `max_idle`. Idle edge servers above the
+    target are released after `idle_ttl` seconds.
+    """
+
+    def __init__(self, coordinator, config: dict | None = None):
+        config = config or {}
+        self.coordinator = coordinator
+        self.enabled = config.get("enabled", False)
+        self.min_idle = config.get("min_idle", 1)
+        self.max_idle = config.get("max_idle", 4)
+        self.idle_ttl = config.get("idle_ttl", 300)
+        self.refill_interval = config.get("refill_interval", 1.0)
+        self.rate_window = config.get("rate_window", 60)
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.arrivals = deque()
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.cold_starts = deque(maxlen=config.get("latency_samples", 1000))
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start the background refill/scale-down loop."""
+        if self.enabled and self.thread is None:
+            self.thread = threading.Thread(target=self.__run, name="EdgePool", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.refill_interval * 2)
+
+    def acquire(self) -> EdgeServer | None:
+        """Take a warm edge server out of the pool, or None if the pool is empty."""
+        with self.lock:
+            booting = None
+            for edge in self.idle:
+                if edge.state == EdgeServer.READY:
+                    self.idle.remove(edge)
+                    self.hits += 1
+                    return edge
+                if booting is None and edge.state == EdgeServer.PROVISIONING:
+                    booting = edge
+            if booting is not None:
+                # still starting, but closer to ready than a new edge server
+                self.idle.remove(booting)
+                self.partial_hits += 1
+                return booting
+            self.misses += 1
+            return None
+
+    def adopt(self, edge: EdgeServer):
+        """Put back an idle edge server recovered from the state store."""
+        with self.lock:
+            self.idle.append(edge)
+
+    def record_arrival(self, count: int = 1):
+        """Record `count` client allocation requests, used to estimate the arrival rate."""
+        now = time.monotonic()
+        with self.lock:
+            self.arrivals.extend([now] * count)
+            self.__trim_arrivals(now)
+
+    def record_cold_start(self, seconds: float):
+        self.cold_starts.append(seconds)
+
+    def arrival_rate(self) -> float:
+        """Client arrivals per second over the last `rate_window` seconds."""
+        with self.lock:
+            self.__trim_arrivals(time.monotonic())
+            return len(self.arrivals) / self.rate_window
+
+    def target_idle(self) -> int:
+        """Number of idle edge servers the pool should keep."""
+        cold_start = self.__mean_cold_start() or self.coordinator.edge_boot_timeout
+        edges_per_second = self.arrival_rate() / self.coordinator.max_clients_per_edge_server
+        target = math.ceil(edges_per_second * cold_start)
+        return max(self.min_idle, min(self.max_idle, target))
+
+    def stats(self) -> dict:
+        """Pool hit/miss counters and cold start latency metrics."""
+        latencies = sorted(self.cold_starts)
+        requests = self.hits + self.partial_hits + self.misses
+        with self.lock:
+            idle = [edge.name for edge in self.idle]
+        return {
+            "enabled": self.enabled,
+            "idle": idle,
+            "target_idle": self.target_idle(),
+            "arrival_rate": self.arrival_rate(),
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.partial_hits) / requests if requests else 0.0,
+            "cold_start": {
+                "count": len(latencies),
+                "mean": self.__mean_cold_start(),
+                "p50": latencies[len(latencies) // 2] if latencies else None,
+                "p95": latencies[int(len(latencies) * 0.95)] if latencies else None,
+                "max": latencies[-1] if latencies else None,
+            },
+        }
+
+    def __mean_cold_start(self) -> float | None:
+        samples = list(self.cold_starts)
+        return sum(samples) / len(samples) if samples else None
+
+    def __trim_arrivals(self, now: float):
+        while self.arrivals and now - self.arrivals[0] > self.rate_window:
+            self.arrivals.popleft()
+
+    def __run(self):
+        while not self.stop_event.wait(self.refill_interval):
+            try:
+                self.__rebalance()
+            except Exception as e:
+                print(f"[ERROR] Edge pool rebalance failed: {e}")
+
+    def __rebalance(self):
+        """Refill the pool up to the target and release edge servers idle for too long."""
+        target = self.target_idle()
+        now = time.monotonic()
+        expired = []
+        with self.lock:
+            # edge servers that failed to start are already dropped by the coordinator
+            self.idle = deque(edge for edge in self.idle if edge.state != EdgeServer.FAILED)
+            missing = target - len(self.idle)
+            while len(self.idle) > target:
+                edge = self.idle[0]
+                if edge.ready_at is None or now - edge.ready_at < self.idle_ttl:
+                    break
+                expired.append(self.idle.popleft())
+
+        for edge in expired:
+            print(f"[LOG] Releasing idle edge server {edge.name}")
+            self.coordinator._retire_edge_server(edge)
+        for _ in range(missing):
+            with self.coordinator.placement_lock:
+                edge = self.coordinator._new_edge_server(placeable=False)
+            print(f"[LOG] Warming up edge server {edge.name}")
+            with self.lock:
+                self.idle.append(edge)
@@ -0,0 +1,61 @@
+import threading
+import time
+
+class EdgeServer:
+    """State of an edge server as seen by the coordinator.
+    Every edge server has its own lock guarding its list of clients, so allocations
+    on different edge servers never contend with each other.
+    """
+    PROVISIONING = "provisioning"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, name: str, edge_id: int = 0, placeable: bool = True):
+        self.name = name
+        self.id = edge_id
+        # warm pool edge servers receive no clients until the pool hands them out
+        self.placeable = placeable
+        self.clients = []
+        # placement load: client -> weight, and their sum
+        self.weights = {}
+        self.load = 0.0
+        # number of examples reported by each client at allocation time
+        self.examples = {}
+        self.state = EdgeServer.PROVISIONING
+        self.error = None
+        self.created_at = time.monotonic()
+        self.ready_at = None
+        # liveness, maintained by the HealthMonitor
+        self.alive = False
+        self.failures = 0
+        self.last_seen = None
+        self.next_probe = 0.0
+        self.lock = threading.Lock()
+        # set once provisioning is over, either successfully or not
+        self.provisioned = threading.Event()
+
+    def add_client(self, client_id: str, weight: float = 1.0, num_examples: int | None = None):
+        with self.lock:
+            self.clients.append(client_id)
+            self.weights[client_id] = weight
+            self.examples[client_id] = num_examples
+            self.load += weight
+
+    def remove_client(self, client_id: str):
+        with self.lock:
+            if client_id in self.clients:
+                self.clients.remove(client_id)
+                self.load -= self.weights.pop(client_id, 0.0)
+                self.examples.pop(client_id, None)
+
+    def set_weight(self, client_id: str, weight: float):
+        with self.lock:
+            if client_id in self.weights:
+                self.load += weight - self.weights[client_id]
+                self.weights[client_id] = weight
+
+    def num_clients(self) -> int:
+        return len(self.clients)
+
+    def __repr__(self):
+        return f"EdgeServer(name={self.name}, state={self.state}, clients={self.clients})"
@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from coordinator.EdgeServer import EdgeServer
+
+class HealthMonitor:
+    """Background heartbeat of the edge servers.
+    Every ready edge server is probed each `interval` seconds and its liveness is cached
+    on the EdgeServer record, so the allocation path reads it without touching the network.
+    A failed probe is retried with exponential backoff (`retry_interval`, doubled by
+    `backoff_factor` up to `max_backoff`); after `failure_threshold` consecutive failures
+    the edge server is declared dead and the coordinator is notified.
+    """
+
+    def __init__(self, coordinator, config: dict | None = None):
+        config = config or {}
+        self.coordinator = coordinator
+        self.interval = config.get("interval", 5.0)
+        self.probe_timeout = config.get("probe_timeout", 1.0)
+        self.failure_threshold = config.get("failure_threshold", 3)
+        self.retry_interval = config.get("retry_interval", 1.0)
+        self.backoff_factor = config.get("backoff_factor", 2.0)
+        self.max_backoff = config.get("max_backoff", 30.0)
+        self.tick = config.get("tick", 0.5)
+        self.probes = ThreadPoolExecutor(
+            max_workers=config.get("probe_workers", 16),
+            thread_name_prefix="EdgeProbe",
+        )
+        self.in_flight = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.__run, name="HealthMonitor", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.tick * 2)
+        self.probes.shutdown(wait=False, cancel_futures=True)
+
+    def table(self) -> dict:
+        """Cached liveness of every known edge server."""
+        now = time.monotonic()
+        return {
+            edge.name: {
+                "state": edge.state,
+                "alive": edge.alive,
+                "failures": edge.failures,
+                "last_seen": now - edge.last_seen if edge.last_seen is not None else None,
+            }
+            for edge in list(self.coordinator.edge_servers.values())
+        }
+
+    def __run(self):
+        while not self.stop_event.wait(self.tick):
+            now = time.monotonic()
+            for edge in list(self.coordinator.edge_servers.values()):
+                if edge.state != EdgeServer.READY or edge.next_probe > now:
+                    continue
+                with self.lock:
+                    if edge.name in self.in_flight:
+                        continue
+                    self.in_flight.add(edge.name)
+                self.probes.submit(self.__probe, edge)
+
+    def __probe(self, edge: EdgeServer):
+        try:
+            alive = self.coordinator._probe_edge(edge.name, self.probe_timeout)
+        except Exception:
+            alive = False
+        finally:
+            with self.lock:
+                self.in_flight.discard(edge.name)
+
+        now = time.monotonic()
+        if alive:
+            edge.alive = True
+            edge.failures = 0
+            edge.last_seen = now
+            edge.next_probe = now + self.interval
+            return
+
+        edge.failures += 1
+        if edge.failures >= self.failure_threshold:
+            edge.alive = False
+            print(f"[CRITICAL] Edge server {edge.name} missed {edge.failures} heartbeats")
+            self.coordinator._on_edge_dead(edge)
+        else:
+            backoff = self.retry_interval * self.backoff_factor ** (edge.failures - 1)
+            edge.next_probe = now + min(backoff, self.max_backoff)
+            print(f"[LOG] Edge server {edge.name} missed a heartbeat, next probe in {min(backoff, self.max_backoff):.1f}s")
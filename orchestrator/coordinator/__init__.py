@@ -1,4 +1,6 @@
+from .EdgeServer import EdgeServer
 from .CoordinatorBase import CoordinatorBase
 from .CoordinatorSimulator import CoordinatorSimulator
+from .CoordinatorLocal import CoordinatorLocal
 from .utils import *
-__all__ = ["CoordinatorBase", "CoordinatorSimulator", "utils"]
\ No newline at end of file
+__all__ = ["EdgeServer", "CoordinatorBase", "CoordinatorSimulator", "CoordinatorLocal", "utils"]
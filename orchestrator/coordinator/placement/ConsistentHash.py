@@ -0,0 +1,64 @@
+import bisect
+import hashlib
+from coordinator.EdgeServer import EdgeServer
+from coordinator.placement.PlacementStrategy import PlacementStrategy
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+class ConsistentHash(PlacementStrategy):
+    """Place clients on a hash ring of edge servers (`replicas` virtual nodes each).
+    A client is mapped to the first edge server with spare capacity clockwise from its
+    hash, so a reallocated client lands on the same edge server as long as it exists,
+    and the death of an edge server only moves the clients that were on it.
+    Only the virtual nodes of edge servers with spare capacity are kept on the ring: a
+    lookup costs O(log(E * replicas)), adding, removing or filling an edge server moves
+    its `replicas` nodes only.
+    """
+
+    def __init__(self, max_clients_per_edge_server: int, config: dict | None = None):
+        super().__init__(max_clients_per_edge_server, config)
+        self.replicas = self.config.get("replicas", 64)
+        self.ring = []
+        self.edges = {}
+        # names of the edge servers whose nodes are on the ring
+        self.open = set()
+
+    def __nodes(self, name: str) -> list[tuple[int, str]]:
+        return [(_hash(f"{name}#{replica}"), name) for replica in range(self.replicas)]
+
+    def __open(self, name: str):
+        if name not in self.open:
+            self.open.add(name)
+            for node in self.__nodes(name):
+                bisect.insort(self.ring, node)
+
+    def __close(self, name: str):
+        if name in self.open:
+            self.open.discard(name)
+            for node in self.__nodes(name):
+                i = bisect.bisect_left(self.ring, node)
+                if i < len(self.ring) and self.ring[i] == node:
+                    del self.ring[i]
+
+    def add_edge(self, edge: EdgeServer):
+        self.edges[edge.name] = edge
+        self.update(edge)
+
+    def remove_edge(self, edge: EdgeServer):
+        if self.edges.pop(edge.name, None) is not None:
+            self.__close(edge.name)
+
+    def place(self, client_id: str) -> EdgeServer | None:
+        if not self.ring:
+            return None
+        start = bisect.bisect(self.ring, (_hash(client_id), ""))
+        return self.edges[self.ring[start % len(self.ring)][1]]
+
+    def update(self, edge: EdgeServer):
+        if edge.name not in self.edges:
+            return
+        if edge.state == EdgeServer.FAILED or self.is_full(edge):
+            self.__close(edge.name)
+        else:
+            self.__open(edge.name)
@@ -0,0 +1,21 @@
+from coordinator.EdgeServer import EdgeServer
+from coordinator.placement.PlacementStrategy import PlacementStrategy
+
+class FillFirst(PlacementStrategy):
+    """Fill the most recent edge server until it is full, then open a new one. O(1)."""
+
+    def __init__(self, max_clients_per_edge_server: int, config: dict | None = None):
+        super().__init__(max_clients_per_edge_server, config)
+        self.current = None
+
+    def add_edge(self, edge: EdgeServer):
+        self.current = edge
+
+    def remove_edge(self, edge: EdgeServer):
+        if self.current is edge:
+            self.current = None
+
+    def place(self, client_id: str) -> EdgeServer | None:
+        if self.current is None or self.is_full(self.current):
+            return None
+        return self.current
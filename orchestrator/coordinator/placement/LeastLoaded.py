@@ -0,0 +1,88 @@
+from coordinator.EdgeServer import EdgeServer
+from coordinator.placement.PlacementStrategy import PlacementStrategy
+from coordinator.placement.LoadIndex import LoadIndex
+
+class LeastLoaded(PlacementStrategy):
+    """Place each client on the edge server with the fewest clients.
+    Only edge servers with spare capacity are indexed, so the least loaded one is
+    found in O(log E). Edge servers that lost clients are refilled first.
+    """
+
+    def __init__(self, max_clients_per_edge_server: int, config: dict | None = None):
+        super().__init__(max_clients_per_edge_server, config)
+        self.index = LoadIndex(self.load)
+
+    def load(self, edge: EdgeServer) -> float:
+        return edge.num_clients()
+
+    def add_edge(self, edge: EdgeServer):
+        self.update(edge)
+
+    def remove_edge(self, edge: EdgeServer):
+        self.index.discard(edge)
+
+    def place(self, client_id: str) -> EdgeServer | None:
+        return self.index.peek()
+
+    def update(self, edge: EdgeServer):
+        if edge.state == EdgeServer.FAILED or self.is_full(edge):
+            self.index.discard(edge)
+        else:
+            self.index.update(edge)
+
+
+class WeightedLeastLoaded(LeastLoaded):
+    """Least loaded placement where the load of an edge server is the number of
+    examples of its clients, as reported at allocation time. Clients that do not
+    report it weigh as the average reported client, every client counted once.
+    """
+
+    def __init__(self, max_clients_per_edge_server: int, config: dict | None = None):
+        super().__init__(max_clients_per_edge_server, config)
+        self.examples = {}
+        self.total_examples = 0
+
+    def load(self, edge: EdgeServer) -> float:
+        return edge.load
+
+    def weight(self, num_examples: int | None, client_id: str | None = None) -> float:
+        if num_examples is None or num_examples <= 0:
+            return self.total_examples / len(self.examples) if self.examples else 1.0
+        return float(num_examples)
+
+    def record(self, client_id: str, num_examples: int | None):
+        if num_examples is None or num_examples <= 0:
+            return
+        self.total_examples += num_examples - self.examples.get(client_id, 0)
+        self.examples[client_id] = num_examples
+
+
+class LatencyAware(LeastLoaded):
+    """Least loaded placement where the load of an edge server is the expected fit time of
+    its clients, relative to the average client: a client twice as slow as the average
+    weighs 2, a client never measured weighs 1. Edge servers report the fit durations they
+    measure (ClientSelector), so slow clients are spread over the edge servers instead of
+    holding up the same rounds, and a client placed again keeps its weight.
+    """
+
+    def __init__(self, max_clients_per_edge_server: int, config: dict | None = None):
+        super().__init__(max_clients_per_edge_server, config)
+        self.durations = {}
+        self.total_duration = 0.0
+
+    def load(self, edge: EdgeServer) -> float:
+        return edge.load
+
+    def weight(self, num_examples: int | None, client_id: str | None = None) -> float:
+        duration = self.durations.get(client_id)
+        if duration is None or self.total_duration <= 0:
+            return 1.0
+        return duration * len(self.durations) / self.total_duration
+
+    def observe(self, edge: EdgeServer, durations: dict[str, float]):
+        for client_id, duration in durations.items():
+            self.total_duration += duration - self.durations.get(client_id, 0.0)
+            self.durations[client_id] = duration
+        for client_id in list(edge.clients):
+            edge.set_weight(client_id, self.weight(None, client_id))
+        self.update(edge)
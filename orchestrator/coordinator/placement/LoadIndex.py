@@ -0,0 +1,43 @@
+import heapq
+from typing import Callable
+from coordinator.EdgeServer import EdgeServer
+
+class LoadIndex:
+    """Min-heap of edge servers ordered by a load key.
+    Updates push a new entry and invalidate the previous one, stale entries are skipped
+    when they reach the top: updates and lookups cost O(log E).
+    """
+
+    def __init__(self, key: Callable[[EdgeServer], float]):
+        self.key = key
+        self.heap = []
+        self.versions = {}
+        self.edges = {}
+
+    def __len__(self):
+        return len(self.versions)
+
+    def update(self, edge: EdgeServer):
+        version = self.versions.get(edge.name, 0) + 1
+        self.versions[edge.name] = version
+        self.edges[edge.name] = edge
+        heapq.heappush(self.heap, (self.key(edge), edge.name, version))
+        if len(self.heap) > 4 * len(self.versions) + 64:
+            self.__compact()
+
+    def discard(self, edge: EdgeServer):
+        self.versions.pop(edge.name, None)
+        self.edges.pop(edge.name, None)
+
+    def peek(self) -> EdgeServer | None:
+        """Edge server with the lowest load, or None if the index is empty."""
+        while self.heap:
+            _, name, version = self.heap[0]
+            if self.versions.get(name) == version:
+                return self.edges[name]
+            heapq.heappop(self.heap)
+        return None
+
+    def __compact(self):
+        self.heap = [entry for entry in self.heap if self.versions.get(entry[1]) == entry[2]]
+        heapq.heapify(self.heap)
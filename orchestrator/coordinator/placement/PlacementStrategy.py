@@ -0,0 +1,46 @@
+from abc import ABC, abstractmethod
+from coordinator.EdgeServer import EdgeServer
+
+class PlacementStrategy(ABC):
+    """Chooses the edge server of a new client among the placeable edge servers.
+    All methods are called by the coordinator while holding its `placement_lock`.
+    """
+
+    def __init__(self, max_clients_per_edge_server: int, config: dict | None = None):
+        self.max_clients_per_edge_server = max_clients_per_edge_server
+        self.config = config or {}
+
+    def is_full(self, edge: EdgeServer) -> bool:
+        return edge.num_clients() >= self.max_clients_per_edge_server
+
+    def weight(self, num_examples: int | None, client_id: str | None = None) -> float:
+        """Load added to an edge server by a client with the given number of examples.
+        Has no side effect: a client placed again (e.g. its edge server died) is weighed again."""
+        return 1.0
+
+    def record(self, client_id: str, num_examples: int | None):
+        """Called with the number of examples of every placed client, also when it is placed again."""
+        pass
+
+    def observe(self, edge: EdgeServer, durations: dict[str, float]):
+        """Called with the fit durations (client id -> seconds) measured by an edge server."""
+        pass
+
+    @abstractmethod
+    def add_edge(self, edge: EdgeServer):
+        """Make an edge server available for placement."""
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    @abstractmethod
+    def remove_edge(self, edge: EdgeServer):
+        """Stop placing clients on an edge server."""
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    @abstractmethod
+    def place(self, client_id: str) -> EdgeServer | None:
+        """Return the edge server for the client, or None if a new edge server is needed."""
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    def update(self, edge: EdgeServer):
+        """Called after the load of an edge server changed."""
+        pass
@@ -0,0 +1,23 @@
+from .PlacementStrategy import PlacementStrategy
+from .FillFirst import FillFirst
+from .LeastLoaded import LeastLoaded, WeightedLeastLoaded, LatencyAware
+from .ConsistentHash import ConsistentHash
+
+PLACEMENT_STRATEGIES = {
+    "fill": FillFirst,
+    "least_loaded": LeastLoaded,
+    "weighted": WeightedLeastLoaded,
+    "latency": LatencyAware,
+    "consistent_hash": ConsistentHash,
+}
+
+def build_placement(max_clients_per_edge_server: int, config: dict | None = None) -> PlacementStrategy:
+    """Instantiate the placement strategy named in the `placement` config section."""
+    config = config or {}
+    name = config.get("strategy", "fill")
+    if name not in PLACEMENT_STRATEGIES:
+        raise ValueError(f"Unknown placement strategy {name}, choose one of {list(PLACEMENT_STRATEGIES)}")
+    return PLACEMENT_STRATEGIES[name](max_clients_per_edge_server, config)
+
+__all__ = ["PlacementStrategy", "FillFirst", "LeastLoaded", "WeightedLeastLoaded", "LatencyAware", "ConsistentHash",
+           "PLACEMENT_STRATEGIES", "build_placement"]
@@ -0,0 +1,136 @@
+import json
+import os
+import sqlite3
+import threading
+from coordinator.state.StateStore import StateStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sequence (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS edges (
+    name TEXT PRIMARY KEY,
+    id INTEGER NOT NULL,
+    placeable INTEGER NOT NULL,
+    meta TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS allocations (
+    client_id TEXT PRIMARY KEY,
+    edge TEXT NOT NULL,
+    weight REAL NOT NULL,
+    num_examples INTEGER
+);
+CREATE INDEX IF NOT EXISTS allocations_edge ON allocations (edge);
+"""
+
+class SQLiteStore(StateStore):
+    """State store in an embedded SQLite database in WAL mode.
+    Every change is one short transaction, so an allocation is recorded entirely or not
+    at all, and removing an edge server drops its allocations atomically. With WAL and
+    `synchronous=NORMAL` a commit appends to the log without waiting for an fsync: the
+    state survives a crash of the orchestrator, the last commits may be lost on power loss.
+    The connection is opened by the first access of each process, a forked process
+    never reuses the one of its parent.
+    """
+
+    def __init__(self, config: dict | None = None):
+        super().__init__(config)
+        self.path = self.config.get("path", "orchestrator/state/coordinator.db")
+        self.synchronous = self.config.get("synchronous", "NORMAL")
+        self.lock = threading.Lock()
+        self.connection = None
+        self.pid = None
+
+    def __connect(self) -> sqlite3.Connection:
+        if self.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # isolation_level=None: transactions are opened explicitly
+            connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={self.synchronous}")
+            connection.executescript(SCHEMA)
+            self.connection = connection
+            self.pid = os.getpid()
+        return self.connection
+
+    def __transaction(self, statements: list[tuple[str, tuple]]):
+        with self.lock:
+            connection = self.__connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    connection.execute(sql, params)
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def next_edge_id(self) -> int:
+        with self.lock:
+            connection = self.__connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT INTO sequence (name, value) VALUES ('edge', 1) "
+                    "ON CONFLICT (name) DO UPDATE SET value = value + 1"
+                )
+                (value,) = connection.execute("SELECT value FROM sequence WHERE name = 'edge'").fetchone()
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return value
+
+    def save_edge(self, name: str, edge_id: int, placeable: bool, meta: dict | None = None):
+        self.__transaction([(
+            "INSERT INTO edges (name, id, placeable, meta) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET id = excluded.id, placeable = excluded.placeable, meta = excluded.meta",
+            (name, edge_id, int(placeable), json.dumps(meta or {})),
+        )])
+
+    def remove_edge(self, name: str):
+        self.__transaction([
+            ("DELETE FROM allocations WHERE edge = ?", (name,)),
+            ("DELETE FROM edges WHERE name = ?", (name,)),
+        ])
+
+    def save_allocation(self, client_id: str, edge_name: str, weight: float, num_examples: int | None):
+        self.save_allocations([(client_id, edge_name, weight, num_examples)])
+
+    def save_allocations(self, allocations: list[tuple[str, str, float, int | None]]):
+        if not allocations:
+            return
+        with self.lock:
+            connection = self.__connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany(
+                    "INSERT INTO allocations (client_id, edge, weight, num_examples) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (client_id) DO UPDATE SET edge = excluded.edge, weight = excluded.weight, "
+                    "num_examples = excluded.num_examples",
+                    allocations,
+                )
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def load(self) -> tuple[list[dict], list[dict]]:
+        with self.lock:
+            connection = self.__connect()
+            edges = [
+                {"name": name, "id": edge_id, "placeable": bool(placeable), "meta": json.loads(meta)}
+                for name, edge_id, placeable, meta in connection.execute(
+                    "SELECT name, id, placeable, meta FROM edges ORDER BY id")
+            ]
+            allocations = [
+                {"client_id": client_id, "edge": edge, "weight": weight, "num_examples": num_examples}
+                for client_id, edge, weight, num_examples in connection.execute(
+                    "SELECT client_id, edge, weight, num_examples FROM allocations ORDER BY rowid")
+            ]
+        return edges, allocations
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None and self.pid == os.getpid():
+                self.connection.close()
+            self.connection = None
+            self.pid = None
@@ -0,0 +1,46 @@
+from abc import ABC, abstractmethod
+
+class StateStore(ABC):
+    """Durable record of the coordinator state: edge servers, client allocations and the
+    edge server sequence. The coordinator keeps serving reads from its in-memory maps,
+    the store is written through on every change and only read back by `load`
+    when the orchestrator restarts.
+    """
+
+    def __init__(self, config: dict | None = None):
+        self.config = config or {}
+
+    @abstractmethod
+    def next_edge_id(self) -> int:
+        """Next edge server id. Ids are never reused, across restarts included."""
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    @abstractmethod
+    def save_edge(self, name: str, edge_id: int, placeable: bool, meta: dict | None = None):
+        """Create or update the record of an edge server.
+        `meta` holds what the backend needs to reach it again (e.g. its port)."""
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    @abstractmethod
+    def remove_edge(self, name: str):
+        """Forget an edge server together with the allocations of its clients."""
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    @abstractmethod
+    def save_allocation(self, client_id: str, edge_name: str, weight: float, num_examples: int | None):
+        """Record (or move) the allocation of a client."""
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    def save_allocations(self, allocations: list[tuple[str, str, float, int | None]]):
+        """Record many allocations `(client_id, edge_name, weight, num_examples)` at once."""
+        for allocation in allocations:
+            self.save_allocation(*allocation)
+
+    @abstractmethod
+    def load(self) -> tuple[list[dict], list[dict]]:
+        """Edge servers (`name`, `id`, `placeable`, `meta`) ordered by id, and allocations
+        (`client_id`, `edge`, `weight`, `num_examples`)."""
+        raise NotImplementedError("This method should be implemented by subclasses.")
+
+    def close(self):
+        pass
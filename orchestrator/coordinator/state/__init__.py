@@ -0,0 +1,18 @@
+from .StateStore import StateStore
+from .MemoryStore import MemoryStore
+from .SQLiteStore import SQLiteStore
+
+STATE_STORES = {
+    "memory": MemoryStore,
+    "sqlite": SQLiteStore,
+}
+
+def build_state_store(config: dict | None = None) -> StateStore:
+    """Instantiate the state store named in the `state` config section."""
+    config = config or {}
+    name = config.get("backend", "memory")
+    if name not in STATE_STORES:
+        raise ValueError(f"Unknown state backend {name}, choose one of {list(STATE_STORES)}")
+    return STATE_STORES[name](config)
+
+__all__ = ["StateStore", "MemoryStore", "SQLiteStore", "STATE_STORES", "build_state_store"]
@@ -1,3 +1,4 @@
 from .run_sh import run_shell_script 
+from .ports import find_free_port
 
-__all__ = ["run_shell_script"]
\ No newline at end of file
+__all__ = ["run_shell_script", "find_free_port"]
@@ -0,0 +1,16 @@
+from typing import Optional
+from flwr.server.client_manager import SimpleClientManager
+
+
+class BoundedClientManager(SimpleClientManager):
+    """SimpleClientManager whose waits for clients are bounded by `wait_timeout` seconds,
+    instead of the day Flower waits by default. A round that cannot gather the clients
+    it needs in time samples none and is skipped, rather than holding the global round
+    of the orchestrator."""
+
+    def __init__(self, wait_timeout: float = 60.0):
+        super().__init__()
+        self.wait_timeout = wait_timeout
+
+    def wait_for(self, num_clients: int, timeout: Optional[float] = None) -> bool:
+        return super().wait_for(num_clients, timeout=self.wait_timeout if timeout is None else timeout)
@@ -0,0 +1,90 @@
+import concurrent.futures
+import threading
+from typing import Optional
+import flwr as fl
+from flwr.common import Code, parameters_to_ndarrays
+from flwr.server.server import fit_client, evaluate_clients
+
+
+class BufferedServer(fl.server.Server):
+    """Flower server for buffered asynchronous aggregation (FedBuff).
+    Fit instructions are dispatched only to clients that are not already training, and a
+    round is closed as soon as the strategy buffer holds `buffer_size` updates. Slower
+    clients keep training: their update is buffered in a later round with the number of
+    rounds elapsed since dispatch as staleness. Stragglers therefore never decide the
+    round time. Must be used with a strategy providing `aggregate_buffered` (FedBuffLogger).
+    """
+
+    def __init__(self, *, client_manager, strategy):
+        super().__init__(client_manager=client_manager, strategy=strategy)
+        self.executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="BufferedFit")
+        # future -> (client, round in which it was dispatched)
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def busy_clients(self) -> set:
+        with self.lock:
+            return {client.cid for client, _ in self.in_flight.values()}
+
+    def fit_round(self, server_round: int, timeout: Optional[float]):
+        """Dispatch fit to idle clients and aggregate the first `buffer_size` updates."""
+        busy = self.busy_clients()
+        client_instructions = self.strategy.configure_fit(
+            server_round=server_round,
+            parameters=self.parameters,
+            client_manager=self._client_manager,
+        )
+        with self.lock:
+            for client, ins in client_instructions:
+                if client.cid in busy:
+                    continue
+                future = self.executor.submit(fit_client, client, ins, timeout, server_round)
+                self.in_flight[future] = (client, server_round)
+            pending = set(self.in_flight)
+
+        if not pending:
+            return None
+
+        buffered, failures = [], []
+        while pending and len(buffered) < self.strategy.buffer_size:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                with self.lock:
+                    _, dispatched = self.in_flight.pop(future)
+                failure = future.exception()
+                if failure is not None:
+                    failures.append(failure)
+                    continue
+                client, res = future.result()
+                if res.status.code == Code.OK:
+                    buffered.append((client, res, server_round - dispatched))
+                else:
+                    failures.append((client, res))
+
+        current = parameters_to_ndarrays(self.parameters) if self.parameters.tensors else None
+        parameters_aggregated, metrics_aggregated = self.strategy.aggregate_buffered(
+            server_round, current, buffered, failures
+        )
+        return parameters_aggregated, metrics_aggregated, ([(c, r) for c, r, _ in buffered], failures)
+
+    def evaluate_round(self, server_round: int, timeout: Optional[float]):
+        """Evaluate only on clients that are not training, a client serves one request at a time."""
+        busy = self.busy_clients()
+        if not busy:
+            return super().evaluate_round(server_round, timeout)
+        client_instructions = [
+            (client, ins)
+            for client, ins in self.strategy.configure_evaluate(
+                server_round=server_round,
+                parameters=self.parameters,
+                client_manager=self._client_manager,
+            )
+            if client.cid not in busy
+        ]
+        if not client_instructions:
+            return None
+        results, failures = evaluate_clients(
+            client_instructions, max_workers=self.max_workers, timeout=timeout, group_id=server_round
+        )
+        loss_aggregated, metrics_aggregated = self.strategy.aggregate_evaluate(server_round, results, failures)
+        return loss_aggregated, metrics_aggregated, (results, failures)
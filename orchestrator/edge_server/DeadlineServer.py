@@ -0,0 +1,92 @@
+import concurrent.futures
+import threading
+import time
+from typing import Optional
+import flwr as fl
+from flwr.common import Code
+from flwr.server.server import fit_client
+from common.telemetry import telemetry
+
+
+class DeadlineServer(fl.server.Server):
+    """Flower server closing synchronous fit rounds at a deadline.
+    The strategy (FedAvgLogger with a ClientSelector) over-selects clients, and a round
+    ends as soon as the `target` updates the strategy asked for have arrived or when the
+    deadline of the selector expires. The updates received by then are aggregated, weighted
+    by their number of examples. Slower clients keep training: they are not sampled again
+    until they answer, and their late update only feeds the fit durations of the selector.
+    """
+
+    def __init__(self, *, client_manager, strategy):
+        super().__init__(client_manager=client_manager, strategy=strategy)
+        self.selector = strategy.selector
+        self.executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="DeadlineFit")
+        # future -> client still training
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def busy_clients(self) -> set:
+        with self.lock:
+            return {client.cid for client in self.in_flight.values()}
+
+    def fit_round(self, server_round: int, timeout: Optional[float]):
+        """Dispatch fit to the selected idle clients and aggregate what arrived by the deadline."""
+        busy = self.busy_clients()
+        client_instructions = [
+            (client, ins)
+            for client, ins in self.strategy.configure_fit(
+                server_round=server_round,
+                parameters=self.parameters,
+                client_manager=self._client_manager,
+            )
+            if client.cid not in busy
+        ]
+        if not client_instructions:
+            return None
+        target = min(self.strategy.target or len(client_instructions), len(client_instructions))
+        deadline = self.selector.deadline([client.cid for client, _ in client_instructions], target)
+        if timeout is not None:
+            deadline = min(deadline, timeout)
+
+        start = time.monotonic()
+        pending = set()
+        for client, ins in client_instructions:
+            future = self.executor.submit(self.__fit, client, ins, timeout, server_round)
+            with self.lock:
+                self.in_flight[future] = client
+            future.add_done_callback(self.__done)
+            pending.add(future)
+
+        results, failures = [], []
+        while pending and len(results) < target:
+            remaining = start + deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = concurrent.futures.wait(pending, timeout=remaining, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                failure = future.exception()
+                if failure is not None:
+                    failures.append(failure)
+                    continue
+                client, res = future.result()
+                if res.status.code == Code.OK:
+                    results.append((client, res))
+                else:
+                    failures.append((client, res))
+
+        telemetry.count("edge_late_clients", len(pending))
+        self.strategy.record_deadline(server_round, deadline, time.monotonic() - start, len(results), len(pending))
+        self.selector.end_round()
+        parameters_aggregated, metrics_aggregated = self.strategy.aggregate_fit(server_round, results, failures)
+        return parameters_aggregated, metrics_aggregated, (results, failures)
+
+    def __fit(self, client, ins, timeout, group_id):
+        start = time.monotonic()
+        client, res = fit_client(client, ins, timeout, group_id)
+        if res.status.code == Code.OK:
+            self.selector.record(client.cid, time.monotonic() - start, (res.metrics or {}).get("client_id"))
+        return client, res
+
+    def __done(self, future):
+        with self.lock:
+            self.in_flight.pop(future, None)
@@ -1,37 +1,196 @@
 import flwr as fl
 import os
 import numpy as np 
-from flwr.common import FitRes, EvaluateRes
+from concurrent.futures import ThreadPoolExecutor
+from flwr.common import FitRes, EvaluateRes, ndarrays_to_parameters, parameters_to_ndarrays
+from flwr.server.server import evaluate_clients
 from typing import List, Tuple, Dict
+from common.compression import UpdateCodec
+from upload import ModelUploader
+from common.telemetry import telemetry
+from common.log import get_logger
 
 
 class EdgeAggregatorClient(fl.client.NumPyClient):
     """
     Flower client for federated learning.
-    This class is responsible for training and evaluating the model on the local dataset.
+    The edge server seen by the orchestrator: each global round (`fit`) starts from the
+    global model and runs `num_rounds` edge rounds on the clients connected to `server`,
+    which stays up for the whole training.
+    Every `evaluate_every` edge rounds (0 never) the model of the round is evaluated on the
+    clients sampled by the strategy (`fraction_evaluate`). With `concurrent_evaluation` the
+    evaluation runs in background while the next edge round trains, at most one at a time;
+    the round waits for the clients it samples that are still being evaluated.
+    The last completed evaluation is sent upwards with the fit metrics (`eval_loss`,
+    `eval_accuracy`, `eval_samples`, `eval_round`), so the orchestrator gets global curves
+    without evaluation rounds of its own.
+    With an `uploader`, the update is streamed to the orchestrator over HTTP and the fit
+    result only carries its `upload_id`; it is sent in the fit result if the upload fails.
+    With a parameter schema on the strategy, the global model must match it and the fit
+    metrics carry its hash (`schema`) for the orchestrator.
+    Requests to the clients (fit, evaluate, get_parameters) time out after `round_timeout`
+    seconds (None waits forever).
     """
     
-    def __init__(self, strategy, server_name="edge_server", log_path="./logs/"):
+    def __init__(self, strategy, server: fl.server.Server, num_rounds=1, server_name="edge_server", log_path="./logs/", codec: UpdateCodec | None = None,
+                 evaluate_every=1, concurrent_evaluation=True, uploader: ModelUploader | None = None, round_timeout: float | None = None):
         self.strategy = strategy
+        self.server = server
+        self.num_rounds = num_rounds
+        self.round_timeout = round_timeout
+        # edge rounds keep counting across global rounds and restarts (checkpoints, FedBuff staleness)
+        self.rounds = max(strategy.checkpoints.rounds(), default=0)
+        self.client_updates = 0
+        # compression of the aggregated model sent to the orchestrator
+        self.codec = codec or UpdateCodec()
         log_path = os.path.join(log_path, server_name)
         os.makedirs(log_path, exist_ok=True)
-        self.log_path = os.path.join(log_path, "aggregation.log")
+        self.log = get_logger(log_path, "aggregation.log")
+        self.evaluate_every = evaluate_every
+        self.evaluator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="EdgeEvaluate") if concurrent_evaluation else None
+        self.pending_evaluation = None
+        # summary of the last completed evaluation, sent with the next fit result
+        self.evaluation = None
+        self.uploader = uploader
 
     def get_parameters(self, config) -> List[np.ndarray]:
-        with open(self.log_path, "a") as f:
-            f.write(f"[CLIENT] get_parameters called on the edge_server.\n")
+        self.log.info("get_parameters called on the edge_server.")
+        if self.strategy.last_parameters is None:
+            # before the first global round: loaded checkpoint, else the model of one of the clients
+            self.log.info("No aggregated model yet, sending the initial parameters.")
+            try:
+                parameters = self.server._get_initial_parameters(server_round=0, timeout=self.round_timeout)
+            except IndexError:
+                # no client connected within the wait of the client manager
+                raise RuntimeError("No client connected to get the initial parameters from")
+            return parameters_to_ndarrays(parameters)
         return self.strategy.last_parameters
 
+    @telemetry.timed("edge_global_round")
     def fit(self, parameters, config) -> Tuple[List[np.ndarray], int, Dict]:
-        with open(self.log_path, "a") as f:
-            f.write(f"[CLIENT] fit called on the edge_server. Parameters are just loaded, no training performed.\n")
+        self.log.info(f"fit called on the edge_server: {self.num_rounds} edge rounds from the global model.")
+        if self.strategy.schema is not None:
+            self.strategy.schema.validate(parameters)
+        self.server.parameters = ndarrays_to_parameters(parameters)
+        updates = 0
+        samples = 0
+        for _ in range(self.num_rounds):
+            self.rounds += 1
+            with telemetry.span("edge_fit_round"):
+                res_fit = self.server.fit_round(server_round=self.rounds, timeout=self.round_timeout)
+            if res_fit is not None:
+                parameters_prime, _, (results, _) = res_fit
+                # a round whose updates were all rejected leaves the model as it was
+                if parameters_prime:
+                    updates += len(results)
+                    samples = self.strategy.client_samples
+                    self.server.parameters = parameters_prime
+            if self.evaluate_every and self.rounds % self.evaluate_every == 0:
+                self._schedule_evaluation(self.rounds, self.server.parameters)
+        self.client_updates += updates
+        if not updates:
+            raise RuntimeError(f"No client update aggregated in edge rounds {self.rounds - self.num_rounds + 1}-{self.rounds}")
+        self.log.info(f"Edge rounds {self.rounds - self.num_rounds + 1}-{self.rounds} completed, {updates} client updates.",
+                      extra={"fields": {"first_round": self.rounds - self.num_rounds + 1, "last_round": self.rounds, "updates": updates}})
+        with telemetry.span("edge_encode"):
+            encoded, metrics = self.codec.encode(parameters_to_ndarrays(self.server.parameters), reference=parameters)
+        telemetry.count("edge_wire_bytes_sent", metrics["wire_bytes"])
+        if "server_round" in config:
+            metrics["server_round"] = config["server_round"]
+        if self.strategy.schema is not None:
+            metrics["schema"] = self.strategy.schema.hash
+        if self.evaluation is not None:
+            metrics.update(self.evaluation)
+        if self.uploader is not None and self.uploader.accepts(encoded):
+            encoded = self._upload(encoded, metrics)
+        self.log.info(f"Sending {metrics['wire_bytes']} bytes to the orchestrator (dense {metrics['dense_bytes']}).",
+                      extra={"fields": {"wire_bytes": metrics["wire_bytes"], "dense_bytes": metrics["dense_bytes"]}})
         return (
-            self.strategy.last_parameters,
-            self.strategy.client_samples,
-            {}
+            encoded,
+            samples,
+            metrics
         )
 
+    def _upload(self, encoded, metrics):
+        """Stream the update to the orchestrator; returns what is left to send in the fit result."""
+        try:
+            with telemetry.span("edge_upload"):
+                ack = self.uploader.upload(encoded, meta={"server_name": self.uploader.name, "round": self.rounds})
+        except RuntimeError as e:
+            self.log.error(f"{e}, sending the update in the fit result")
+            return encoded
+        metrics["upload_id"] = ack["upload_id"]
+        metrics["upload_bytes"] = ack["bytes"]
+        self.log.info(f"Update streamed to the orchestrator as upload {ack['upload_id']} ({ack['bytes']} bytes).",
+                      extra={"fields": {"upload_id": ack["upload_id"], "upload_bytes": ack["bytes"]}})
+        return []
+
     def evaluate(self, parameters, config):
-        with open(self.log_path, "a") as f:
-            f.write(f"[CLIENT] evaluate called on the edge_server. Evaluation is not performed on Edge Server.\nSent dummy results.\n")
-        return None
\ No newline at end of file
+        """Evaluate the given model on the clients sampled by the strategy, synchronously."""
+        self.log.info("evaluate called on the edge_server.")
+        self._wait_evaluation()
+        summary = self._evaluate_round(max(self.rounds, 1), ndarrays_to_parameters(parameters))
+        if summary is None:
+            return 0.0, 0, {}
+        metrics = {"accuracy": summary["eval_accuracy"]} if "eval_accuracy" in summary else {}
+        return summary["eval_loss"], summary["eval_samples"], metrics
+
+    def _schedule_evaluation(self, rnd, parameters):
+        """Evaluate the model of edge round `rnd`, in background with concurrent evaluation.
+        `parameters` is the model of the round: the next round replaces, never mutates, it.
+        The clients are sampled here, before the next round samples its own: the strategy
+        makes that round wait for those of them still being evaluated."""
+        if self.evaluator is None:
+            self._evaluate_round(rnd, parameters)
+            return
+        # a slow evaluation delays the next one, never the edge rounds that do not evaluate
+        self._wait_evaluation()
+        instructions = self._evaluation_instructions(rnd, parameters)
+        if not instructions:
+            return
+        self.strategy.begin_evaluation(instructions)
+        self.pending_evaluation = self.evaluator.submit(self._evaluate_clients, rnd, instructions)
+
+    def _wait_evaluation(self):
+        if self.pending_evaluation is not None:
+            try:
+                self.pending_evaluation.result()
+            except Exception as e:
+                self.log.error(f"Evaluation failed: {e}")
+            self.pending_evaluation = None
+
+    def _evaluation_instructions(self, rnd, parameters):
+        instructions = self.strategy.configure_evaluate(rnd, parameters, self.server.client_manager())
+        # BufferedServer, DeadlineServer: a client still training serves one request at a time
+        busy = self.server.busy_clients() if hasattr(self.server, "busy_clients") else set()
+        return [(client, ins) for client, ins in instructions if client.cid not in busy]
+
+    def _evaluate_round(self, rnd, parameters):
+        """Evaluate `parameters` on the sampled clients and keep the weighted summary."""
+        instructions = self._evaluation_instructions(rnd, parameters)
+        if not instructions:
+            return None
+        return self._evaluate_clients(rnd, instructions)
+
+    @telemetry.timed("edge_evaluate_round")
+    def _evaluate_clients(self, rnd, instructions):
+        try:
+            results, failures = evaluate_clients(instructions, max_workers=self.server.max_workers, timeout=self.round_timeout, group_id=rnd)
+        finally:
+            self.strategy.end_evaluation(instructions)
+        loss, metrics = self.strategy.aggregate_evaluate(rnd, results, failures)
+        if loss is None:
+            return None
+        summary = {"eval_round": rnd, "eval_loss": float(loss), "eval_samples": int(metrics["samples"])}
+        if "accuracy" in metrics:
+            summary["eval_accuracy"] = float(metrics["accuracy"])
+        self.evaluation = summary
+        return summary
+
+    def close(self):
+        """Wait for the evaluation in progress, if any."""
+        if self.evaluator is not None:
+            self._wait_evaluation()
+            self.evaluator.shutdown(wait=True)
+        if self.uploader is not None:
+            self.uploader.close()
@@ -1,6 +1,13 @@
 from typing import Callable, Sequence, Any
 import numpy as np
 import os
+import requests
+from common.checkpoint import is_checkpoint, load_checkpoint, latest_checkpoint, read_header
+from common.models import ParameterSchema
+
+LATEST = "latest"
+# local copy of the last global model fetched from the orchestrator
+GLOBAL_MODEL = "global.ckpt"
 
 def load_ckpt_as_parameters(
     path: str,
@@ -8,12 +15,30 @@ def load_ckpt_as_parameters(
     ordered_keys: Sequence[str] | None = None,
     sort_fn: Callable[[str], Any] | None = None,
     strict: bool = True,
+    schema: ParameterSchema | None = None,
 ) -> list[np.ndarray] | None:
-    if not os.path.exists(path):
+    """Load a checkpoint as a list of ndarrays, or None if there is none.
+    Raw checkpoints (common.checkpoint) are memory mapped and read lazily, `.npz` files
+    are read eagerly. A path ending in "latest" selects the most recent raw checkpoint
+    of its directory. With a `schema`, arrays named as in the schema are loaded by name
+    and the checkpoint must match its shapes (ValueError otherwise)."""
+    if os.path.basename(path) == LATEST:
+        path = latest_checkpoint(os.path.dirname(path))
+    if path is None or not os.path.exists(path):
         return None
 
+    if is_checkpoint(path):
+        if schema is not None and ordered_keys is None:
+            names = {entry["name"] for entry in read_header(path)[0]["arrays"]}
+            if names.issuperset(schema.names):
+                ordered_keys = schema.names
+        ndarrays = load_checkpoint(path, names=ordered_keys)
+        return schema.validate(ndarrays) if schema is not None else ndarrays
+
     with np.load(path, allow_pickle=True) as data:
         keys = list(data.files)
+        if schema is not None and ordered_keys is None and set(keys).issuperset(schema.names):
+            ordered_keys = schema.names
 
         # 1. Ordine esplicito
         if ordered_keys is not None:
@@ -34,4 +59,28 @@ def load_ckpt_as_parameters(
         else:
             selected = keys
 
-        return [data[k] for k in selected]
+        ndarrays = [data[k] for k in selected]
+    return schema.validate(ndarrays) if schema is not None else ndarrays
+
+
+def fetch_global_model(url: str, cache_path: str, timeout: float = 5.0, schema: ParameterSchema | None = None) -> list[np.ndarray] | None:
+    """Fetch the current global model from the orchestrator (GET /model) into `cache_path`.
+    The request carries the content hash of the cached copy: if the global model has not
+    changed the orchestrator answers 304 and the cached copy is used without downloading it.
+    Returns None when the orchestrator has no global model yet. With a `schema`, the model
+    must match it (ValueError otherwise)."""
+    headers = {}
+    if is_checkpoint(cache_path):
+        cached_hash = read_header(cache_path)[0]["meta"].get("hash")
+        if cached_hash:
+            headers["If-None-Match"] = f'"{cached_hash}"'
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 404:
+        return None
+    if response.status_code != 304:
+        response.raise_for_status()
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(response.content)
+        os.replace(tmp_path, cache_path)
+    return load_ckpt_as_parameters(cache_path, schema=schema)
@@ -0,0 +1,113 @@
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+import requests
+
+
+class ClientSelector:
+    """Straggler-aware selection of the clients of an edge round.
+    Keeps an exponentially weighted moving average (`alpha`) of the fit duration of every
+    client. Rounds sample `over_selection` more clients than the strategy asks for, and are
+    closed once the requested number of updates arrived or at a deadline: `slack` times the
+    expected duration of the slowest client needed, the `target`-th fastest of the selected
+    clients, bounded by `min_deadline` and `max_deadline` (the bound until every selected
+    client has been seen once). With `report`, the fit durations are handed to it (client
+    id -> seconds) in background after every `report_every` rounds, e.g. to the orchestrator
+    whose placement spreads slow clients over the edge servers.
+    """
+
+    def __init__(self,
+                 over_selection: float = 0.3,
+                 alpha: float = 0.3,
+                 slack: float = 1.5,
+                 min_deadline: float = 5.0,
+                 max_deadline: float = 600.0,
+                 report: Callable[[dict], None] | None = None,
+                 report_every: int = 1,
+                ):
+        self.over_selection = over_selection
+        self.alpha = alpha
+        self.slack = slack
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+        # cid -> EWMA of the fit duration, and the client id it reported (fit metrics)
+        self.durations = {}
+        self.client_ids = {}
+        self.lock = threading.Lock()
+        self.report = report
+        self.report_every = max(report_every, 1)
+        self.reporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="SelectionReport") if report else None
+        self.rounds = 0
+
+    @classmethod
+    def from_config(cls, config: dict | None = None, report: Callable[[dict], None] | None = None) -> "ClientSelector | None":
+        """Build a selector from the `selection` section of a config file, None when disabled."""
+        config = config or {}
+        if not config.get("enabled", False):
+            return None
+        return cls(
+            over_selection=config.get("over_selection", 0.3),
+            alpha=config.get("alpha", 0.3),
+            slack=config.get("slack", 1.5),
+            min_deadline=config.get("min_deadline", 5.0),
+            max_deadline=config.get("max_deadline", 600.0),
+            report=report,
+            report_every=config.get("report_every", 1),
+        )
+
+    def over_select(self, sample_size: int, num_available: int) -> int:
+        """Number of clients to sample for `sample_size` updates."""
+        return min(num_available, math.ceil(sample_size * (1.0 + self.over_selection)))
+
+    def record(self, cid: str, duration: float, client_id: str | None = None):
+        """Fold the duration of a completed fit (late ones included) into the average of the client."""
+        with self.lock:
+            previous = self.durations.get(cid)
+            self.durations[cid] = duration if previous is None else previous + self.alpha * (duration - previous)
+            if client_id is not None:
+                self.client_ids[cid] = client_id
+
+    def deadline(self, cids, target: int) -> float:
+        """Seconds the round waits for `target` updates from the clients `cids`."""
+        expected = sorted(d for d in (self.durations.get(cid) for cid in cids) if d is not None)
+        target = min(max(target, 1), len(cids))
+        if len(expected) < len(cids) or target == 0:
+            # a client never seen may be the slowest one
+            return self.max_deadline
+        return min(self.max_deadline, max(self.min_deadline, self.slack * expected[target - 1]))
+
+    def forget(self, connected):
+        """Drop the averages of the clients that are gone."""
+        with self.lock:
+            self.durations = {cid: d for cid, d in self.durations.items() if cid in connected}
+            self.client_ids = {cid: c for cid, c in self.client_ids.items() if cid in connected}
+
+    def end_round(self):
+        """Report the averages every `report_every` rounds, without blocking the round."""
+        self.rounds += 1
+        if self.reporter is None or self.rounds % self.report_every:
+            return
+        with self.lock:
+            stats = {self.client_ids.get(cid, cid): round(d, 3) for cid, d in self.durations.items()}
+        if stats:
+            self.reporter.submit(self.__report, stats)
+
+    def __report(self, stats: dict):
+        try:
+            self.report(stats)
+        except Exception as e:
+            print(f"[ERROR] Client statistics not reported: {e}")
+
+    def close(self):
+        if self.reporter is not None:
+            self.reporter.shutdown(wait=True)
+
+
+def http_report(url: str, timeout: float = 5.0) -> Callable[[dict], None]:
+    """Report function posting the fit durations as JSON to `url` (orchestrator API)."""
+    session = requests.Session()
+
+    def report(stats: dict):
+        session.post(url, json=stats, timeout=timeout).raise_for_status()
+    return report
@@ -1,8 +1,20 @@
 import flwr as fl
 from configs.utils import load_config
-from strategy import FedAvgLogger
+from strategy import FedAvgLogger, FedBuffLogger
+from BufferedServer import BufferedServer
+from DeadlineServer import DeadlineServer
+from selection import ClientSelector, http_report
+from upload import ModelUploader
+from flwr.common import ndarrays_to_parameters
+from BoundedClientManager import BoundedClientManager
+from flwr.server.superlink.fleet.grpc_bidi.grpc_server import start_grpc_server
 from EdgeAggregatorClient import EdgeAggregatorClient
-from load_ckpts import load_ckpt_as_parameters
+from load_ckpts import load_ckpt_as_parameters, fetch_global_model, GLOBAL_MODEL
+from common.compression import UpdateCodec
+from common.secagg import SecAggServer
+from common.models import DEFAULT_MODEL, model_schema
+from common.telemetry import telemetry
+from common import log
 import argparse
 import os
 
@@ -21,30 +33,68 @@ parser.add_argument(
 	help="Name of the edge server",
 )
 
+parser.add_argument(
+	"--port",
+	type=int,
+	default=None,
+	help="Port on which the edge server listens for clients (overrides the config file)",
+)
+
 args = parser.parse_args()
 config = load_config(args.config)
 # Load the configuration file
 cfg = load_config(args.config)
-log_path = os.path.join(cfg["logging"]["log_path"], args.name,)
-os.makedirs(log_path, exist_ok=True)
-log_path = os.path.join(log_path, "server.log")
-with open(log_path, "w") as f:
-	f.write(f"[INIT] Starting Flower server with configuration: {args.config}\n")
+if args.port is not None:
+	cfg["network"]["port"] = args.port
+telemetry.configure(cfg.get("telemetry"), service=args.name)
+log.configure(cfg.get("logging"))
+server_log = log.get_logger(os.path.join(cfg["logging"]["log_path"], args.name), "server.log")
+server_log.info(f"Starting Flower server with configuration: {args.config}")
+
+# arrays of the model of the federation (model.architecture): checkpoints, the global model
+# and the client updates are checked against it
+architecture = cfg["model"].get("architecture") or {}
+schema = model_schema(architecture)
+server_log.info(f"Model {architecture.get('name', DEFAULT_MODEL)}: {len(schema)} arrays, {schema.nbytes} bytes, schema {schema.hash}")
+
+# the current global model of the orchestrator, else the local checkpoint
+initial_parameters = None
+if cfg["orchestrator"].get("api_port"):
+	model_url = f"http://{cfg['orchestrator']['ip']}:{cfg['orchestrator']['api_port']}/model"
+	global_path = os.path.join(cfg["model"]["save_path"], args.name, GLOBAL_MODEL)
+	os.makedirs(os.path.dirname(global_path), exist_ok=True)
+	try:
+		server_log.info(f"Fetching the global model from {model_url}")
+		initial_parameters = fetch_global_model(model_url, global_path, schema=schema)
+		if initial_parameters is None:
+			server_log.warning("The orchestrator has no global model yet.")
+		else:
+			server_log.info(f"Initial parameters set to the global model, cached in {global_path}")
+	except Exception as e:
+		server_log.warning(f"Failed to fetch the global model: {e}")
 
 load_path = os.path.join(cfg["model"]["save_path"], args.name, cfg["model"]["load_path"])
-with open(log_path, "a") as f:
+if initial_parameters is None:
 	try:
-		f.write(f"[INIT] Attempting to load initial parameters from {load_path}\n")
-		initial_parameters = load_ckpt_as_parameters(load_path,)
+		server_log.info(f"Attempting to load initial parameters from {load_path}")
+		initial_parameters = load_ckpt_as_parameters(load_path, schema=schema)
 		if initial_parameters is None:
-			f.write("[WARNING] No initial parameters found, using default initialization.\n")
+			server_log.warning("No initial parameters found, using default initialization.")
 		else:
-			f.write(f"[INIT] Initial parameters loaded from {load_path}\n")
+			server_log.info(f"Initial parameters loaded from {load_path}")
 	except Exception as e:
-		f.write(f"[ERROR] Failed to load initial parameters: {e}\n")
+		server_log.error(f"Failed to load initial parameters: {e}")
 		initial_parameters = None
 
-strategy = FedAvgLogger(
+# fit durations of the clients, posted to the orchestrator for its placement decisions
+stats_report = None
+if cfg["orchestrator"].get("api_port"):
+	stats_report = http_report(f"http://{cfg['orchestrator']['ip']}:{cfg['orchestrator']['api_port']}/edges/{args.name}/stats")
+
+# sent to the clients with every fit instruction (local_epochs, local_steps, lr)
+fit_config = cfg.get("fit_config") or {}
+
+strategy_kwargs = dict(
 	min_fit_clients       	= cfg["fed_avg"]["min_fit_clients"],
     min_available_clients 	= cfg["fed_avg"]["min_available_clients"],
     min_evaluate_clients  	= cfg["fed_avg"]["min_evaluate_clients"],
@@ -52,36 +102,80 @@ strategy = FedAvgLogger(
     fraction_evaluate     	= cfg["fed_avg"]["fraction_evaluate"],
     num_rounds            	= cfg["config"]["num_rounds"],
     model_path 				= cfg["model"]["save_path"],
+    keep_checkpoints		= cfg["model"].get("keep_last", 3),
+    broadcast_cache			= cfg["model"].get("broadcast_cache", True),
+    on_fit_config_fn		= (lambda server_round: dict(fit_config)) if fit_config else None,
+    secagg					= SecAggServer.from_config(cfg.get("secagg")),
+    selector				= ClientSelector.from_config(cfg.get("selection"), report=stats_report),
+    schema					= schema,
     log_path				= cfg["logging"]["log_path"],
     server_name 	   		= args.name,
-	initial_parameters 		= initial_parameters,	
+	initial_parameters 		= ndarrays_to_parameters(initial_parameters) if initial_parameters is not None else None,
 )
 
-config = fl.server.ServerConfig(
-	num_rounds=cfg["config"]["num_rounds"],
-)
+# rounds wait at most `config.client_wait` seconds for the clients they need
+client_manager = BoundedClientManager(wait_timeout=cfg["config"].get("client_wait", 60))
+round_timeout = cfg["config"].get("round_timeout")
 
+# sync: FedAvg rounds waiting for every sampled client
+# buffered: FedBuff rounds closed after `buffer_size` updates, stragglers are folded in later rounds
+aggregation_cfg = cfg.get("aggregation", {})
+if aggregation_cfg.get("mode", "sync") == "buffered":
+	strategy = FedBuffLogger(
+		buffer_size         = aggregation_cfg.get("buffer_size", 2),
+		staleness_exponent  = aggregation_cfg.get("staleness_exponent", 0.5),
+		server_lr           = aggregation_cfg.get("server_lr", 1.0),
+		max_staleness       = aggregation_cfg.get("max_staleness", 10),
+		**strategy_kwargs,
+	)
+	server = BufferedServer(client_manager=client_manager, strategy=strategy)
+else:
+	strategy = FedAvgLogger(**strategy_kwargs)
+	if strategy.selector is not None:
+		# over-selected rounds closed at a deadline, see selection.ClientSelector
+		server = DeadlineServer(client_manager=client_manager, strategy=strategy)
+	else:
+		server = fl.server.Server(client_manager=client_manager, strategy=strategy)
+
+# the clients stay connected for the whole training: every global round pushed by the
+# orchestrator runs `config.num_rounds` edge rounds on this server (EdgeAggregatorClient.fit)
 ip = f"[::]:{cfg['network']['port']}"
-fl.server.start_server(
+grpc_server = start_grpc_server(
+	client_manager=server.client_manager(),
 	server_address=ip,
-	config=config,
-	strategy=strategy
 )
 
-with open(log_path, "a") as f:
-	f.write(f"Flower server completed with strategy: {strategy.__class__.__name__}\n")
-	f.write(f"Server address: {ip}\n")
-	f.write(f"[INIT] Edge server is now a client in the federated learning process.\n")
+server_log.info(f"Flower server started with strategy: {strategy.__class__.__name__}, address: {ip}",
+				extra={"fields": {"strategy": strategy.__class__.__name__, "address": ip}})
+# join the orchestrator only once an edge round can run: an idle edge (warm pool, or still
+# short of clients) sampled by the orchestrator would hold every global round
+min_clients = max(strategy.min_fit_clients, strategy.min_available_clients)
+while not client_manager.wait_for(min_clients):
+	server_log.info(f"Waiting for {min_clients} clients before joining the orchestrator, {client_manager.num_available()} connected.")
+server_log.info("Edge server is now a client in the federated learning process.")
 
+# evaluation of the edge models on the sampled clients (fed_avg.fraction_evaluate)
+evaluation_cfg = cfg.get("evaluation", {})
+# the aggregated model is streamed to the orchestrator web API instead of the fit result
+uploader = None
+if cfg["orchestrator"].get("api_port"):
+	uploader = ModelUploader.from_config(f"http://{cfg['orchestrator']['ip']}:{cfg['orchestrator']['api_port']}", args.name, cfg.get("upload"))
 try:
 	client = EdgeAggregatorClient(
 		strategy=strategy,
+		server=server,
+		num_rounds=cfg["config"]["num_rounds"],
 		server_name=args.name,
 		log_path=cfg["logging"]["log_path"],
+		codec=UpdateCodec.from_config(cfg.get("compression")),
+		evaluate_every=evaluation_cfg.get("every", 1),
+		concurrent_evaluation=evaluation_cfg.get("concurrent", True),
+		uploader=uploader,
+		round_timeout=round_timeout,
 	)
 except Exception as e:
-	with open(log_path, "a") as f:
-		f.write(f"[ERROR] Failed to initialize EdgeAggregatorClient: {e}\n")
+	server_log.error(f"Failed to initialize EdgeAggregatorClient: {e}")
+	grpc_server.stop(grace=1)
 	exit(1)
 
 try:
@@ -90,6 +184,14 @@ try:
         client=client,
 	)
 except Exception as e:
-	with open(log_path, "a") as f:
-		f.write(f"[ERROR] Failed to start Flower client: {e}\n")
-	exit(1)
\ No newline at end of file
+	server_log.error(f"Failed to start Flower client: {e}")
+	exit(1)
+finally:
+	# training is over (or the orchestrator is gone): release the clients
+	client.close()
+	if strategy.selector is not None:
+		strategy.selector.close()
+	server.disconnect_all_clients(timeout=None)
+	grpc_server.stop(grace=1)
+
+server_log.info(f"Federated session completed at edge round {client.rounds}.", extra={"fields": {"round": client.rounds}})
@@ -1,63 +1,384 @@
 from flwr.server.strategy import FedAvg
 import os
-from flwr.common import parameters_to_ndarrays
+import threading
+import time
+from flwr.common import Parameters, ndarrays_to_parameters, parameters_to_ndarrays
 import numpy as np
+from common.aggregation import StreamingAggregator, staleness_weight, mix, weighted_metrics
+from common.compression import is_encoded, decode_tensors
+from common.checkpoint import CheckpointStore
+from common.hashing import content_hash
+from common.telemetry import telemetry
+from common.log import get_logger
+from common.secagg import SecAggServer
+from common.models import ParameterSchema
+from selection import ClientSelector
     
 class FedAvgLogger(FedAvg):
     """Custom FedAvg used for logging.
     This class is used to log the model parameters after each round.
     It inherits from FedAvg and overrides the `aggregate_fit` method to log the model parameters and evaluation results.
+    Client updates are folded one at a time into a StreamingAggregator, so the edge never holds
+    more than one deserialized update on top of the aggregate.
+    Compressed updates (see common.compression) are decoded on the fly against the model
+    sent in the round the client was dispatched in.
+    Checkpoints are written in background by a CheckpointStore, which keeps the last
+    `keep_checkpoints` of them.
+    With `broadcast_cache`, fit and evaluate instructions carry the content hash of the model,
+    and clients that confirmed holding that model get the hash only instead of the weights.
+    With `secagg` (a SecAggServer), clients send pairwise-masked updates and the edge server
+    only ever sees their weighted sum (see common.secagg).
+    With `selector` (a ClientSelector, used with DeadlineServer), rounds over-select clients
+    and aggregate the updates that arrived by a deadline; `target` is the number of updates
+    asked for by `fraction_fit`/`min_fit_clients`.
+    With `schema` (a ParameterSchema), the aggregation buffers are allocated upfront, client
+    updates declaring another schema (`schema` fit metric) are discarded before being folded,
+    and checkpoints name their arrays after the schema.
     """
 
-    def __init__(self, log_path="./logs/", model_path="./models/", server_name="edge_server", *args, **kwargs):
+    def __init__(self, log_path="./logs/", model_path="./models/", server_name="edge_server", keep_checkpoints=3, broadcast_cache=True, secagg: SecAggServer | None = None, selector: ClientSelector | None = None, schema: ParameterSchema | None = None, *args, **kwargs):
         """Initialize FedAvgLogger with a path to save logs and with a path to save the model weights."""
-        super().__init__()
+        # num_rounds is not a FedAvg argument, every other keyword argument is forwarded
+        fedavg_kwargs = {k: v for k, v in kwargs.items() if k != "num_rounds"}
+        super().__init__(*args, **fedavg_kwargs)
         self.log_path = os.path.join(log_path, server_name)
         os.makedirs(self.log_path, exist_ok=True)
+        self.fit_log = get_logger(self.log_path, "fit.log")
+        self.evaluate_log = get_logger(self.log_path, "evaluate.log")
         self.model_path = os.path.join(model_path, server_name)
         os.makedirs(self.model_path, exist_ok=True)
+        self.checkpoints = CheckpointStore(self.model_path, keep_last=keep_checkpoints, on_saved=self._on_checkpoint_saved)
         self.total_rounds = kwargs.get("num_rounds", 1)
         self.client_samples = 0
         self.last_parameters = None
         self.server_name = server_name
-        
-    
+        self.schema = schema
+        self.aggregator = StreamingAggregator(schema)
+        # global model sent in each of the last `reference_rounds` rounds, to decode delta updates
+        self.reference_rounds = 1
+        self.references = {}
+        self.decoded_references = {}
+        # cid -> hash of the last model the client confirmed holding
+        self.broadcast_cache = broadcast_cache
+        self.client_models = {}
+        self.model_hash = (None, None)
+        # evaluation rounds may run on another thread than fit rounds (EdgeAggregatorClient)
+        self.lock = threading.Lock()
+        # cids evaluated in background: a gRPC client serves one request at a time, so the
+        # fit rounds wait for the evaluation of the clients they sample
+        self.evaluating = set()
+        self.evaluated = threading.Condition(self.lock)
+        self.secagg = secagg
+        self.selector = selector
+        self.target = None
+        if secagg is not None and selector is not None:
+            # clients missing the deadline would count as dropouts, beyond what secagg recovers
+            raise ValueError("Secure aggregation cannot be combined with round deadlines")
+
+    def num_fit_clients(self, num_available_clients):
+        """Over-select with a selector: sample more clients than the `target` updates needed."""
+        sample_size, min_num_clients = super().num_fit_clients(num_available_clients)
+        if self.selector is not None:
+            self.target = sample_size
+            sample_size = self.selector.over_select(sample_size, num_available_clients)
+        return sample_size, min_num_clients
+
+    def configure_fit(self, server_round, parameters, client_manager):
+        """Remember the model sent to the clients and tell them the round it belongs to."""
+        instructions = super().configure_fit(server_round, parameters, client_manager)
+        self._wait_evaluated(server_round, [client for client, _ in instructions])
+        if self.selector is not None:
+            self.selector.forget(client_manager.all())
+        self.references[server_round] = parameters
+        for rnd in [r for r in self.references if r <= server_round - self.reference_rounds]:
+            self.references.pop(rnd)
+            self.decoded_references.pop(rnd, None)
+        for _, fit_ins in instructions:
+            fit_ins.config["server_round"] = server_round
+        if self.secagg is not None:
+            with telemetry.span("secagg_configure"):
+                instructions = self.secagg.configure(server_round, instructions, client_manager.all())
+        return self._broadcast(server_round, parameters, instructions, client_manager)
+
+    def configure_evaluate(self, server_round, parameters, client_manager):
+        instructions = super().configure_evaluate(server_round, parameters, client_manager)
+        return self._broadcast(server_round, parameters, instructions, client_manager)
+
+    def begin_evaluation(self, instructions):
+        """Mark the clients of an evaluation dispatched in background."""
+        with self.lock:
+            self.evaluating.update(client.cid for client, _ in instructions)
+
+    def end_evaluation(self, instructions):
+        with self.evaluated:
+            self.evaluating.difference_update(client.cid for client, _ in instructions)
+            self.evaluated.notify_all()
+
+    def _wait_evaluated(self, rnd, clients):
+        """Wait until none of `clients` is being evaluated."""
+        cids = {client.cid for client in clients}
+        with self.evaluated:
+            if self.evaluating.isdisjoint(cids):
+                return
+            start = time.perf_counter()
+            self.evaluated.wait_for(lambda: self.evaluating.isdisjoint(cids))
+        self.fit_log.info(f"Round {rnd} waited {time.perf_counter() - start:.2f}s for the evaluation of its clients",
+                          extra={"fields": {"round": rnd, "evaluation_wait": time.perf_counter() - start}})
+
+    def _broadcast(self, rnd, parameters, instructions, client_manager):
+        """Tag the instructions with the hash of the model, and replace the weights with
+        the hash only for the clients that already hold that model."""
+        if not self.broadcast_cache or not instructions or not parameters.tensors:
+            return instructions
+        if self.model_hash[0] is not parameters:
+            self.model_hash = (parameters, content_hash(parameters_to_ndarrays(parameters)))
+        model_hash = self.model_hash[1]
+        connected = client_manager.all()
+        with self.lock:
+            self.client_models = {cid: h for cid, h in self.client_models.items() if cid in connected}
+            held = {client.cid for client, _ in instructions if self.client_models.get(client.cid) == model_hash}
+
+        tagged, skipped = [], 0
+        for client, ins in instructions:
+            config = dict(ins.config, model_hash=model_hash)
+            if client.cid in held:
+                ins = type(ins)(parameters=Parameters(tensors=[], tensor_type=parameters.tensor_type), config=config)
+                skipped += 1
+            else:
+                ins = type(ins)(parameters=parameters, config=config)
+            tagged.append((client, ins))
+        if skipped:
+            model_bytes = sum(len(tensor) for tensor in parameters.tensors)
+            telemetry.count("edge_broadcast_bytes_saved", skipped * model_bytes)
+            self.fit_log.info(f"Round {rnd} model {model_hash[:8]} already held by {skipped}/{len(tagged)} clients, "
+                              f"{skipped * model_bytes} bytes not sent",
+                              extra={"fields": {"round": rnd, "model_hash": model_hash, "bytes_saved": skipped * model_bytes}})
+        return tagged
+
+    def _confirm(self, results, failures):
+        """Remember which model every client answered from (clients echo `model_hash`)."""
+        with self.lock:
+            for client, res in results:
+                model_hash = res.metrics.get("model_hash") if res.metrics else None
+                if model_hash is not None:
+                    self.client_models[client.cid] = model_hash
+            for failure in failures:
+                if isinstance(failure, tuple):
+                    self.client_models.pop(failure[0].cid, None)
+
+    def _reference(self, rnd):
+        """Global model sent in round `rnd` as ndarrays, or None if it is not known."""
+        if rnd not in self.decoded_references:
+            parameters = self.references.get(rnd)
+            if parameters is None or not parameters.tensors:
+                return None
+            self.decoded_references[rnd] = parameters_to_ndarrays(parameters)
+        return self.decoded_references[rnd]
+
+    def _conforming(self, rnd, results):
+        """The results whose update matches the schema: same hash in the fit metrics or, for
+        clients that do not send it, as many layers. The layer shapes are checked while folding."""
+        if self.schema is None:
+            return results
+        accepted = []
+        for client, res in results:
+            declared = res.metrics.get("schema") if res.metrics else None
+            if declared is not None and declared != self.schema.hash:
+                self.fit_log.error(f"Round {rnd} discarded the update of client {client.cid}: schema {declared}, expected {self.schema.hash}",
+                                   extra={"fields": {"round": rnd, "cid": client.cid, "schema": declared}})
+            elif declared is None and self.secagg is None and len(res.parameters.tensors) != len(self.schema):
+                self.fit_log.error(f"Round {rnd} discarded the update of client {client.cid}: {len(res.parameters.tensors)} layers, expected {len(self.schema)}",
+                                   extra={"fields": {"round": rnd, "cid": client.cid}})
+            else:
+                accepted.append((client, res))
+        return accepted
+
+    def _fold_all(self, rnd, updates):
+        """Fold (client, FitRes, weight) updates; an update that does not fit the model is
+        rolled back, logged and left out. Returns the folded (client, FitRes) and their wire bytes."""
+        self.aggregator.reset()
+        folded, wire_bytes = [], 0
+        for client, res, weight in updates:
+            try:
+                wire_bytes += self._fold(res, weight)
+            except ValueError as e:
+                self.fit_log.error(f"Round {rnd} discarded the update of client {client.cid}: {e}",
+                                   extra={"fields": {"round": rnd, "cid": client.cid, "error": str(e)}})
+                continue
+            folded.append((client, res))
+        return folded, wire_bytes
+
+    def _fold(self, res, weight) -> int:
+        """Fold a client update into the aggregator, decoding it if it is compressed.
+        Returns the number of bytes the update took on the wire."""
+        if is_encoded(res.metrics):
+            reference = self._reference(res.metrics.get("server_round"))
+            self.aggregator.add_ndarrays(decode_tensors(res.parameters.tensors, reference), weight)
+        else:
+            self.aggregator.add(res.parameters, weight)
+        return sum(len(tensor) for tensor in res.parameters.tensors)
+
+    @telemetry.timed("edge_aggregate")
     def aggregate_fit(self, rnd, results, failures):
         """Aggregate model parameters and log the results."""
-        log_file = os.path.join(self.log_path, f"fit.log")
         if failures:
-            with open(log_file, "a") as f:
-                f.write(f"[ERROR] Round {rnd} failed for clients: {failures}\n")
+            self.fit_log.error(f"Round {rnd} failed for clients: {failures}")
+        self._confirm(results, failures)
+        results = self._conforming(rnd, results)
+
+        if not results:
+            return None, {}
+        if not self.accept_failures and failures:
+            return None, {}
 
-        aggregated_weights, _ = super().aggregate_fit(rnd, results, failures)
-        weights_nd = parameters_to_ndarrays(aggregated_weights)
+        if self.secagg is not None:
+            weights_nd = self._aggregate_masked(rnd, results)
+            if weights_nd is None:
+                return None, {}
+            wire_bytes = sum(len(tensor) for _, res in results for tensor in res.parameters.tensors)
+        else:
+            results, wire_bytes = self._fold_all(rnd, [(client, res, res.num_examples) for client, res in results])
+            if not results:
+                return None, {}
+            weights_nd = self.aggregator.result()
         self.client_samples = sum(res.num_examples for _, res in results)
+        self._record_round(rnd, weights_nd, wire_bytes, len(results))
+
+        metrics = {}
+        if self.fit_metrics_aggregation_fn:
+            metrics = self.fit_metrics_aggregation_fn([(res.num_examples, res.metrics) for _, res in results])
+        metrics["wire_bytes"] = wire_bytes
+
+        # Return the aggregated weights
+        return ndarrays_to_parameters(weights_nd), metrics
+
+    def record_deadline(self, rnd, deadline, elapsed, arrived, late):
+        """Log how a round closed by DeadlineServer ended."""
+        message = f"Round {rnd} closed after {elapsed:.2f}s (deadline {deadline:.2f}s) with {arrived}/{self.target} updates"
+        if late:
+            message += f", {late} clients still training"
+        self.fit_log.info(message, extra={"fields": {
+            "round": rnd, "deadline": deadline, "elapsed": elapsed, "arrived": arrived, "target": self.target, "late": late,
+        }})
+
+    def _aggregate_masked(self, rnd, results):
+        """Unmask the weighted average of the masked updates of a round, None if it cannot be unmasked."""
+        reference = self._reference(rnd) or self.last_parameters
+        if reference is None:
+            self.fit_log.error(f"Round {rnd} has no model to shape the masked updates on")
+            return None
+        try:
+            with telemetry.span("secagg_unmask"):
+                return self.secagg.aggregate(rnd, results, reference)
+        except RuntimeError as e:
+            self.fit_log.error(f"Round {rnd} discarded, secure aggregation failed: {e}",
+                               extra={"fields": {"round": rnd, "error": str(e)}})
+            return None
+
+    def _record_round(self, rnd, weights_nd, wire_bytes=0, num_updates=0):
+        """Keep, log and save the aggregated weights of a round."""
         self.last_parameters = weights_nd
+        dense_bytes = num_updates * sum(w.nbytes for w in weights_nd)
+        telemetry.count("edge_wire_bytes_received", wire_bytes)
+        telemetry.count("edge_client_updates", num_updates)
 
         # Log the aggregated weights
-        with open(log_file, "a") as f:
-            f.write(f"Round {rnd} aggregated weights shapes: {[w.shape for w in weights_nd]}\n")
-            f.write(f"Round {rnd} total samples: {self.client_samples}\n")
-
-        # Save the aggregated weights to a file during each round
-        save_path = os.path.join(self.model_path, f"round_{rnd}_model")
-        np.savez(save_path, *weights_nd)
-        with open(log_file, "a") as f:
-            f.write(f"Round {rnd} model saved to {save_path}\n")
-            
-        # Return the aggregated weights
-        return aggregated_weights, {}
-    
+        message = f"Round {rnd} aggregated {num_updates} updates, total samples: {self.client_samples}"
+        if wire_bytes:
+            message += f", bytes on the wire: {wire_bytes} (dense {dense_bytes}, {dense_bytes / wire_bytes:.2f}x)"
+        self.fit_log.info(message, extra={"fields": {
+            "round": rnd, "updates": num_updates, "samples": self.client_samples, "wire_bytes": wire_bytes,
+            "dense_bytes": dense_bytes, "shapes": [list(w.shape) for w in weights_nd],
+        }})
+
+        # Save the aggregated weights in background, off the aggregation path
+        meta = {"server_name": self.server_name, "samples": self.client_samples}
+        if self.schema is not None:
+            meta["schema"] = self.schema.hash
+        self.checkpoints.save(rnd, weights_nd, meta=meta, names=self.schema.names if self.schema is not None else None)
+
+    def _on_checkpoint_saved(self, rnd, path, error):
+        """Called by the checkpoint writer thread once a round is on disk."""
+        if error is None:
+            self.fit_log.info(f"Round {rnd} model saved to {path}", extra={"fields": {"round": rnd, "path": path}})
+        else:
+            self.fit_log.error(f"Round {rnd} model could not be saved to {path}: {error}", extra={"fields": {"round": rnd, "path": path}})
+
     def aggregate_evaluate(self, server_round, results, failures):
-        """Aggregate evaluation results and log them."""
-        log_file = os.path.join(self.log_path, f"evaluate.log")
+        """Aggregate evaluation results and log them.
+        Loss and accuracy are weighted by the number of examples of every client; the metrics
+        returned carry the accuracy and the number of samples and clients evaluated."""
         if failures:
-            with open(log_file, "a") as f:
-                f.write(f"[ERROR] Evaluation failed for clients: {failures}\n")
+            self.evaluate_log.error(f"Evaluation failed for clients: {failures}")
+        self._confirm(results, failures)
 
-        weighted_loss, _ = super().aggregate_evaluate(server_round, results, failures)
+        summary = weighted_metrics([(res.num_examples, dict(res.metrics or {}, loss=res.loss)) for _, res in results])
+        if summary is None:
+            self.evaluate_log.warning(f"Round {server_round} evaluation returned no samples",
+                                      extra={"fields": {"round": server_round, "failures": len(failures)}})
+            return None, {}
+        metrics = {"samples": summary["samples"], "clients": len(results)}
+        if "accuracy" in summary:
+            metrics["accuracy"] = summary["accuracy"]
 
         # Log the aggregated evaluation results
-        with open(log_file, "a") as f:
-            f.write(f"Round {server_round} aggregated evaluation loss: {weighted_loss}\n")
-        return weighted_loss, {}
\ No newline at end of file
+        self.evaluate_log.info(f"Round {server_round} aggregated evaluation loss: {summary['loss']}, "
+                               f"accuracy: {metrics.get('accuracy')} over {summary['samples']} samples of {len(results)} clients",
+                               extra={"fields": {"round": server_round, "loss": summary["loss"], **metrics}})
+        return summary["loss"], metrics
+
+
+class FedBuffLogger(FedAvgLogger):
+    """Buffered asynchronous aggregation (FedBuff) with the same logging as FedAvgLogger.
+    Used together with `BufferedServer`: a round ends as soon as `buffer_size` updates
+    have arrived, whatever round they were started in. Each update is weighted by its
+    number of examples times the staleness discount (1 + s)^-staleness_exponent, where
+    s is the number of rounds elapsed since the client received the model. The buffered
+    average is then mixed into the current model with step `server_lr`.
+    """
+
+    def __init__(self, buffer_size=2, staleness_exponent=0.5, server_lr=1.0, max_staleness=10, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.selector is not None:
+            raise ValueError("Round deadlines are not supported with buffered asynchronous aggregation, which never waits for stragglers")
+        if self.secagg is not None:
+            # masks cancel only within the clients of one round
+            raise ValueError("Secure aggregation is not supported with buffered asynchronous aggregation")
+        self.buffer_size = buffer_size
+        self.staleness_exponent = staleness_exponent
+        self.server_lr = server_lr
+        self.max_staleness = max_staleness
+        self.reference_rounds = max_staleness + 1
+
+    @telemetry.timed("edge_aggregate")
+    def aggregate_buffered(self, rnd, current_parameters, buffered, failures):
+        """Aggregate a buffer of (client, FitRes, staleness) into the current model (list of ndarrays or None)."""
+        if failures:
+            self.fit_log.error(f"Round {rnd} failed for clients: {failures}")
+        self._confirm([(client, res) for client, res, _ in buffered], failures)
+
+        conforming = {id(res) for _, res in self._conforming(rnd, [(client, res) for client, res, _ in buffered])}
+        buffered = [(client, res, s) for client, res, s in buffered if id(res) in conforming]
+        fresh = [(client, res, s) for client, res, s in buffered if s <= self.max_staleness]
+        if len(fresh) < len(buffered):
+            self.fit_log.warning(f"Round {rnd} dropped {len(buffered) - len(fresh)} updates older than {self.max_staleness} rounds")
+        if not fresh:
+            return None, {}
+
+        staleness = {id(res): s for _, res, s in fresh}
+        folded, wire_bytes = self._fold_all(rnd, [(client, res, res.num_examples * staleness_weight(s, self.staleness_exponent))
+                                                  for client, res, s in fresh])
+        fresh = [(client, res, staleness[id(res)]) for client, res in folded]
+        if not fresh:
+            return None, {}
+        weights_nd = mix(current_parameters, self.aggregator.result(), self.server_lr)
+        self.client_samples = sum(res.num_examples for _, res, _ in fresh)
+        self.fit_log.info(f"Round {rnd} buffered {len(fresh)} updates with staleness {[s for _, _, s in fresh]}",
+                          extra={"fields": {"round": rnd, "staleness": [s for _, _, s in fresh]}})
+        self._record_round(rnd, weights_nd, wire_bytes, len(fresh))
+
+        metrics = {}
+        if self.fit_metrics_aggregation_fn:
+            metrics = self.fit_metrics_aggregation_fn([(res.num_examples, res.metrics) for _, res, _ in fresh])
+        metrics["wire_bytes"] = wire_bytes
+        return ndarrays_to_parameters(weights_nd), metrics
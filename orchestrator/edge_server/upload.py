@@ -0,0 +1,74 @@
+import random
+import time
+import uuid
+import requests
+from common.checkpoint import iter_checkpoint
+from common.compression import nbytes
+
+
+class ModelUploader:
+    """Streams the update of an edge server to the orchestrator (PUT /uploads/{id}) instead of
+    returning it in the Flower fit result, whose message size is bounded by gRPC.
+    The update is sent as a raw checkpoint (common/checkpoint.py) with chunked transfer
+    encoding, read from the arrays `chunk_size` bytes at a time: neither side holds more
+    than a chunk of it besides the arrays themselves. Updates smaller than `min_bytes` are
+    left to the fit result. Failed uploads are retried from the start, with jittered backoff.
+    """
+
+    def __init__(self,
+                 url: str,
+                 name: str = "edge_server",
+                 chunk_size: int = 1 << 20,
+                 min_bytes: int = 0,
+                 max_attempts: int = 3,
+                 backoff: float = 0.5,
+                 timeout: float = 60.0,
+                ):
+        self.url = url.rstrip("/")
+        self.name = name
+        self.chunk_size = chunk_size
+        self.min_bytes = min_bytes
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    @classmethod
+    def from_config(cls, url: str, name: str, config: dict | None = None) -> "ModelUploader | None":
+        """Build an uploader from the `upload` section of a config file, None when disabled."""
+        config = config or {}
+        if not config.get("enabled", False):
+            return None
+        return cls(
+            url,
+            name=name,
+            chunk_size=config.get("chunk_size", 1 << 20),
+            min_bytes=config.get("min_bytes", 0),
+            max_attempts=config.get("max_attempts", 3),
+            backoff=config.get("backoff", 0.5),
+            timeout=config.get("timeout", 60.0),
+        )
+
+    def accepts(self, ndarrays) -> bool:
+        return nbytes(ndarrays) >= self.min_bytes
+
+    def upload(self, ndarrays, meta: dict | None = None) -> dict:
+        """Stream `ndarrays` and return the upload id and size acknowledged by the orchestrator."""
+        upload_id = f"{self.name}-{uuid.uuid4().hex}"
+        error = None
+        for attempt in range(self.max_attempts):
+            try:
+                response = self.session.put(f"{self.url}/uploads/{upload_id}",
+                                            data=iter_checkpoint(ndarrays, meta=meta, chunk_size=self.chunk_size),
+                                            headers={"Content-Type": "application/octet-stream"},
+                                            timeout=self.timeout)
+                response.raise_for_status()
+                return response.json()
+            except requests.exceptions.RequestException as e:
+                error = e
+            if attempt + 1 < self.max_attempts:
+                time.sleep(random.uniform(0.0, self.backoff * 2 ** attempt))
+        raise RuntimeError(f"Upload {upload_id} failed after {self.max_attempts} attempts: {error}")
+
+    def close(self):
+        self.session.close()
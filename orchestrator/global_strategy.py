@@ -0,0 +1,190 @@
+import json
+import os
+import time
+from flwr.server.strategy import FedAvg
+from flwr.common import ndarrays_to_parameters, parameters_to_ndarrays
+from common.aggregation import StreamingAggregator, weighted_metrics
+from common.compression import is_encoded, decode_tensors
+from common.checkpoint import SUFFIX, CheckpointStore, load_checkpoint
+from common.hashing import content_hash
+from common.telemetry import telemetry
+
+class FedAvgGlobal(FedAvg):
+    """FedAvg of the edge server models at the orchestrator.
+    Edge updates are folded one at a time into a StreamingAggregator and decoded on the fly
+    when they are compressed (see common.compression); the bytes received per round are logged.
+    With a `model_path`, the global model of every round is checkpointed there with its content
+    hash, for the edge servers fetching it (GET /model). With `resume`, round numbers continue
+    those on disk; otherwise the checkpoints and the curve of a previous run are removed.
+    The edge servers send the summary of their last evaluation with their update: the global
+    loss and accuracy of every round are their average weighted by samples evaluated, returned
+    in the fit metrics (`eval_loss`, `eval_accuracy`) and appended to `curve_path` (JSON lines).
+    Updates streamed by the edge servers (`upload_id` in the fit metrics) are read from
+    `spool_path` through a memory map and folded layer by layer; they are removed at the end of
+    the round, folded or not.
+    With `schema` (common.models.ParameterSchema), the aggregation buffers are allocated upfront
+    and edge updates declaring another schema (`schema` fit metric) are skipped.
+    """
+
+    def __init__(self, model_path=None, keep_checkpoints=3, curve_path=None, spool_path=None, schema=None, resume=False, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spool_path = spool_path
+        self.schema = schema
+        self.curve_path = curve_path
+        if curve_path:
+            os.makedirs(os.path.dirname(curve_path) or ".", exist_ok=True)
+            if not resume and os.path.exists(curve_path):
+                os.remove(curve_path)
+        self.aggregator = StreamingAggregator(schema)
+        self.reference = None
+        self.checkpoints = CheckpointStore(model_path, keep_last=keep_checkpoints) if model_path else None
+        if self.checkpoints is not None and not resume:
+            # round 0 is the initial model of this run, never the last model of another one
+            self.checkpoints.clear()
+        self.first_round = max(self.checkpoints.rounds(), default=0) if self.checkpoints else 0
+
+    def _save(self, server_round, ndarrays):
+        if self.checkpoints is not None:
+            meta = {"hash": content_hash(ndarrays)}
+            if self.schema is not None:
+                meta["schema"] = self.schema.hash
+            self.checkpoints.save(self.first_round + server_round, ndarrays, meta=meta,
+                                  names=self.schema.names if self.schema is not None else None)
+
+    def configure_fit(self, server_round, parameters, client_manager):
+        """Remember the global model sent to the edge servers and tell them the round."""
+        instructions = super().configure_fit(server_round, parameters, client_manager)
+        self.reference = (server_round, parameters)
+        if server_round == 1 and self.first_round == 0 and parameters.tensors:
+            # initial model, served to the edge servers until the first aggregation
+            self._save(0, parameters_to_ndarrays(parameters))
+        for _, fit_ins in instructions:
+            fit_ins.config["server_round"] = server_round
+        return instructions
+
+    @telemetry.timed("global_aggregate")
+    def aggregate_fit(self, server_round, results, failures):
+        try:
+            return self._aggregate_fit(server_round, results, failures)
+        finally:
+            # an upload is folded at most once: skipped, failed or folded, it leaves the spool
+            self._discard_uploads(results + [failure for failure in failures if isinstance(failure, tuple)])
+
+    def _aggregate_fit(self, server_round, results, failures):
+        if failures:
+            print(f"[ERROR] Round {server_round} failed for edge servers: {failures}")
+        if not results:
+            return None, {}
+        if not self.accept_failures and failures:
+            return None, {}
+
+        reference = None
+        self.aggregator.reset()
+        wire_bytes = 0
+        folded = []
+        for client, res in self._conforming(server_round, results):
+            if is_encoded(res.metrics) and reference is None and self.reference is not None and self.reference[1].tensors:
+                reference = parameters_to_ndarrays(self.reference[1])
+            path = None
+            upload_id = res.metrics.get("upload_id") if res.metrics else None
+            if upload_id is not None:
+                path = self._spooled(upload_id)
+                if path is None:
+                    print(f"[ERROR] Round {server_round} upload {upload_id} of edge server {client.cid} not found, update skipped")
+                    continue
+            try:
+                wire_bytes += self._fold(res, reference, path)
+            except ValueError as e:
+                # rolled back by the aggregator, the other updates of the round are kept
+                print(f"[ERROR] Round {server_round} update of edge server {client.cid} skipped: {e}")
+                continue
+            folded.append((client, res))
+        results = folded
+        if not self.aggregator.count:
+            return None, {}
+        weights_nd = self.aggregator.result()
+        self._save(server_round, weights_nd)
+
+        dense_bytes = len(results) * sum(w.nbytes for w in weights_nd)
+        telemetry.count("global_wire_bytes_received", wire_bytes)
+        print(f"[LOG] Round {server_round} bytes on the wire: {wire_bytes} for {len(results)} edge updates "
+              f"(dense {dense_bytes}, {dense_bytes / max(wire_bytes, 1):.2f}x)")
+
+        metrics = {}
+        if self.fit_metrics_aggregation_fn:
+            metrics = self.fit_metrics_aggregation_fn([(res.num_examples, res.metrics) for _, res in results])
+        metrics["wire_bytes"] = wire_bytes
+        metrics.update(self._global_evaluation(server_round, results))
+        return ndarrays_to_parameters(weights_nd), metrics
+
+    def _fold(self, res, reference, path=None) -> int:
+        """Fold an edge update, spooled at `path` or in the fit result; returns its bytes on the wire."""
+        if path is not None:
+            layers = load_checkpoint(path)
+            if is_encoded(res.metrics):
+                layers = decode_tensors(layers, reference, raw=False)
+            self.aggregator.add_ndarrays(layers, res.num_examples)
+            return res.metrics.get("upload_bytes", 0)
+        if is_encoded(res.metrics):
+            self.aggregator.add_ndarrays(decode_tensors(res.parameters.tensors, reference), res.num_examples)
+        else:
+            self.aggregator.add(res.parameters, res.num_examples)
+        return sum(len(tensor) for tensor in res.parameters.tensors)
+
+    def _conforming(self, server_round, results):
+        """The results whose update declares the schema of this server, or none."""
+        if self.schema is None:
+            return results
+        accepted = []
+        for client, res in results:
+            declared = res.metrics.get("schema") if res.metrics else None
+            if declared is not None and declared != self.schema.hash:
+                print(f"[ERROR] Round {server_round} update of edge server {client.cid} skipped: schema {declared}, expected {self.schema.hash}")
+            else:
+                accepted.append((client, res))
+        return accepted
+
+    def _spooled(self, upload_id):
+        """Path of a completed upload in the spool, or None."""
+        if self.spool_path is None:
+            return None
+        path = os.path.join(self.spool_path, os.path.basename(upload_id) + SUFFIX)
+        return path if os.path.exists(path) else None
+
+    def _discard_uploads(self, results):
+        for _, res in results:
+            upload_id = res.metrics.get("upload_id") if res.metrics else None
+            path = self._spooled(upload_id) if upload_id is not None else None
+            if path is not None:
+                os.remove(path)
+
+    def _global_evaluation(self, server_round, results):
+        """Weighted average of the evaluations reported by the edge servers, as fit metrics."""
+        reports = [(res.metrics.get("eval_samples", 0), {"loss": res.metrics.get("eval_loss"), "accuracy": res.metrics.get("eval_accuracy")})
+                   for _, res in results if res.metrics]
+        summary = weighted_metrics(reports)
+        if summary is None:
+            return {}
+        point = {"round": self.first_round + server_round, "loss": summary["loss"], "accuracy": summary.get("accuracy"),
+                 "samples": summary["samples"], "edge_servers": sum(1 for n, _ in reports if n), "ts": time.time()}
+        print(f"[LOG] Round {server_round} global evaluation: loss {point['loss']:.4f}, accuracy {point['accuracy']}, "
+              f"{point['samples']} samples from {point['edge_servers']} edge servers")
+        if self.curve_path:
+            try:
+                with open(self.curve_path, "a") as f:
+                    f.write(json.dumps(point) + "\n")
+            except OSError as e:
+                print(f"[ERROR] Evaluation curve not written to {self.curve_path}: {e}")
+        metrics = {"eval_loss": summary["loss"], "eval_samples": summary["samples"]}
+        if "accuracy" in summary:
+            metrics["eval_accuracy"] = summary["accuracy"]
+        return metrics
+
+    def aggregate_evaluate(self, server_round, results, failures):
+        """Loss and accuracy of the edge servers evaluating the global model, weighted by samples."""
+        if failures:
+            print(f"[ERROR] Evaluation round {server_round} failed for edge servers: {failures}")
+        summary = weighted_metrics([(res.num_examples, dict(res.metrics or {}, loss=res.loss)) for _, res in results])
+        if summary is None:
+            return None, {}
+        return summary["loss"], {k: v for k, v in summary.items() if k != "loss"}
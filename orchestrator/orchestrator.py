@@ -1,54 +1,238 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import FileResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+from pydantic import BaseModel
 from configs import load_config
 import argparse
+import asyncio
+import os
+import re
+import time
 import uvicorn
 import sys
 import signal
-from coordinator import CoordinatorSimulator
+from coordinator import CoordinatorSimulator, CoordinatorLocal
 import multiprocessing as mp
-from flwr.server.strategy import FedAvg
+from global_strategy import FedAvgGlobal
+from common.checkpoint import SUFFIX, CheckpointStore, latest_checkpoint, read_header, load_checkpoint, verify_checkpoint
+from common.models import model_schema
+from common.telemetry import telemetry
 from flwr.server import ServerConfig
+from flwr.common import ndarrays_to_parameters
 import flwr as fl
 
 parser = argparse.ArgumentParser(description="Orchestrator")
 parser.add_argument(
     "--config", type=str, default="configs/config.yaml", help="Path to the config file"
 )
+parser.add_argument(
+    "--backend", type=str, default=None, choices=["docker", "local"],
+    help="Edge server backend (overrides orchestrator.backend in the config file)"
+)
 args = parser.parse_args()
 cfg = load_config(args.config)
+if args.backend is not None:
+    cfg["orchestrator"]["backend"] = args.backend
 
-coordinator = CoordinatorSimulator(cfg)
+COORDINATORS = {
+    "docker": CoordinatorSimulator,
+    "local": CoordinatorLocal,
+}
+coordinator = COORDINATORS[cfg["orchestrator"].get("backend", "docker")](cfg)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    clear_uploads()
+    coordinator.start()
     yield
     print("Shutting down Orchestrator...")
     coordinator.cleanup_edge_servers()
 
 app = FastAPI(lifespan=lifespan)
 
+# global model checkpoints, written by the Flower server process and served by the web server
+MODEL_PATH = cfg.get("model", {}).get("save_path", "orchestrator/models/global")
+RESUME = cfg.get("model", {}).get("resume", False)
+
+# edge server updates streamed to the web server, spooled for the Flower server process
+UPLOAD_PATH = cfg.get("uploads", {}).get("spool_dir", "orchestrator/uploads")
+MAX_UPLOAD_BYTES = cfg.get("uploads", {}).get("max_bytes", 4 << 30)
+UPLOAD_ID = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+
+def clear_uploads():
+    """Remove the uploads left by a previous run: no round will ever consume them."""
+    os.makedirs(UPLOAD_PATH, exist_ok=True)
+    for name in os.listdir(UPLOAD_PATH):
+        os.remove(os.path.join(UPLOAD_PATH, name))
+
+def clear_models():
+    """Remove the global models of a previous run, which is not resumed."""
+    if os.path.isdir(MODEL_PATH):
+        for name in os.listdir(MODEL_PATH):
+            if CheckpointStore.PATTERN.match(name):
+                os.remove(os.path.join(MODEL_PATH, name))
+
+# upper bound for long-polling requests, in seconds
+MAX_ALLOCATION_WAIT = cfg["orchestrator"].get("max_allocation_wait", 30)
+# long-polls re-check the status on the event loop: a waiting client holds no worker thread
+ALLOCATION_POLL_INTERVAL = 0.05
+# clients accepted by one POST /allocate
+MAX_ALLOCATION_BATCH = cfg["orchestrator"].get("max_allocation_batch", 1000)
+
+class ClientAllocation(BaseModel):
+    client_id: str
+    num_examples: int | None = None
+
+@app.get("/health", response_model=dict)
+async def health():
+    """Readiness of the orchestrator: it answers once the coordinator state is recovered."""
+    return {"status": "ok", "edge_servers": len(coordinator.edge_servers), "clients": len(coordinator.clients)}
+
+@app.post("/allocate", response_model=dict)
+async def allocate_batch(clients: list[ClientAllocation]):
+    """Allocate many clients in one pass, returns their allocations by client id.
+    Each allocation is the one `/allocate/{client_id}` would return."""
+    if len(clients) > MAX_ALLOCATION_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_ALLOCATION_BATCH} clients per batch")
+    return await asyncio.to_thread(coordinator.allocate_batch, {c.client_id: c.num_examples for c in clients})
+
+@app.post("/allocation", response_model=dict)
+async def allocation_batch(client_ids: list[str], wait: float = 0.0):
+    """Allocations of many clients by client id, waiting up to `wait` seconds while any is pending."""
+    if len(client_ids) > MAX_ALLOCATION_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_ALLOCATION_BATCH} clients per batch")
+    deadline = time.monotonic() + min(max(wait, 0.0), MAX_ALLOCATION_WAIT)
+    statuses = {client_id: coordinator.allocation_status(client_id) for client_id in client_ids}
+    pending = [client_id for client_id, status in statuses.items() if status["status"] == coordinator.PENDING]
+    while pending and time.monotonic() < deadline:
+        await asyncio.sleep(ALLOCATION_POLL_INTERVAL)
+        statuses.update((client_id, coordinator.allocation_status(client_id)) for client_id in pending)
+        pending = [client_id for client_id in pending if statuses[client_id]["status"] == coordinator.PENDING]
+    return statuses
+
 @app.post("/allocate/{client_id}", response_model=dict)
-async def allocate(client_id: str):
-    """Allocate a client to an edge server."""
-    return coordinator.allocate(client_id)
+async def allocate(client_id: str, num_examples: int | None = None):
+    """Allocate a client to an edge server.
+    `num_examples` is the size of the client training set, used by load-aware placement.
+    The response status is "allocated" when the edge server is ready, or "pending"
+    while it is still being provisioned: in that case poll `/allocation/{client_id}`."""
+    return await asyncio.to_thread(coordinator.allocate, client_id, num_examples)
+
+@app.get("/allocation/{client_id}", response_model=dict)
+async def allocation(client_id: str, wait: float = 0.0):
+    """Return the allocation of a client, waiting up to `wait` seconds while it is pending."""
+    deadline = time.monotonic() + min(max(wait, 0.0), MAX_ALLOCATION_WAIT)
+    status = coordinator.allocation_status(client_id)
+    while status["status"] == coordinator.PENDING and time.monotonic() < deadline:
+        await asyncio.sleep(ALLOCATION_POLL_INTERVAL)
+        status = coordinator.allocation_status(client_id)
+    return status
+
+@app.get("/pool", response_model=dict)
+async def pool():
+    """Warm pool status: idle edge servers, hit/miss counters and cold start latency."""
+    return coordinator.pool.stats()
+
+@app.get("/edges", response_model=dict)
+async def edges():
+    """Cached liveness table of the edge servers, as maintained by the health monitor."""
+    return coordinator.health.table()
+
+@app.post("/edges/{edge_server}/stats", response_model=dict)
+async def edge_stats(edge_server: str, durations: dict[str, float]):
+    """Fit durations (client id -> seconds, moving average) measured by an edge server,
+    used by the latency-aware placement."""
+    if not coordinator.record_client_stats(edge_server, durations):
+        raise HTTPException(status_code=404, detail=f"Unknown edge server {edge_server}")
+    return {"status": "ok", "clients": len(durations)}
+
+@app.get("/model")
+async def model(request: Request):
+    """Latest global model, as a raw checkpoint (common/checkpoint.py).
+    The ETag is the content hash of the model: a request whose If-None-Match matches it
+    gets 304 Not Modified without the weights."""
+    path = latest_checkpoint(MODEL_PATH)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No global model yet")
+    meta = read_header(path)[0]["meta"]
+    headers = {"ETag": f'"{meta.get("hash", "")}"', "X-Model-Round": str(meta.get("round", 0))}
+    if request.headers.get("if-none-match", "").strip('"') == meta.get("hash"):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="application/octet-stream", headers=headers)
+
+@app.put("/uploads/{upload_id}", response_model=dict)
+async def upload(upload_id: str, request: Request):
+    """Update of an edge server streamed as a raw checkpoint (chunked transfer encoding).
+    It is written to the spool chunk by chunk and renamed once complete; the edge server then
+    sends its `upload_id` in the fit result and the Flower server folds the file in.
+    File I/O and the verification run in worker threads, off the event loop."""
+    if not UPLOAD_ID.match(upload_id):
+        raise HTTPException(status_code=400, detail=f"Invalid upload id {upload_id}")
+    path = os.path.join(UPLOAD_PATH, upload_id + SUFFIX)
+    part = f"{path}.part"
+    size = 0
+    try:
+        with open(part, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Upload larger than {MAX_UPLOAD_BYTES} bytes")
+                await asyncio.to_thread(f.write, chunk)
+            await asyncio.to_thread(os.fsync, f.fileno())
+        await asyncio.to_thread(verify_checkpoint, part)
+        os.replace(part, path)
+    except ValueError as e:
+        os.remove(part)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    telemetry.count("uploads_received_bytes", size)
+    return {"upload_id": upload_id, "bytes": size}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Span timers and counters of the web server process (allocation, provisioning), Prometheus text format.
+    The Flower server process writes its spans to the JSONL traces only."""
+    return PlainTextResponse(telemetry.prometheus(), media_type="text/plain; version=0.0.4")
 
 def start_web_server():
     """Start the FastAPI web server."""
+    telemetry.configure(cfg.get("telemetry"), service="orchestrator")
     uvicorn.run(app, host=cfg["network"]["ip"], port=cfg["network"]["port"])
 
 def start_flower_server():
     """Start the Flower server."""
-    strategy = FedAvg(
+    telemetry.configure(cfg.get("telemetry"), service="orchestrator-flower")
+    # arrays of the model of the federation, the same architecture as the edge servers and the clients
+    schema = model_schema(cfg.get("model", {}).get("architecture"))
+    # resume from the latest global model, otherwise it is requested to one of the edge servers
+    initial_parameters = None
+    if RESUME:
+        path = latest_checkpoint(MODEL_PATH)
+        if path is not None:
+            print(f"[LOG] Resuming from the global model {path}")
+            initial_parameters = ndarrays_to_parameters(schema.validate(load_checkpoint(path)))
+    strategy = FedAvgGlobal(
         min_fit_clients=cfg["fed_avg"]["min_fit_clients"],
         min_available_clients=cfg["fed_avg"]["min_available_clients"],
         min_evaluate_clients=cfg["fed_avg"]["min_evaluate_clients"],
         fraction_fit=cfg["fed_avg"]["fraction_fit"],
         fraction_evaluate=cfg["fed_avg"]["fraction_evaluate"],
+        initial_parameters=initial_parameters,
+        model_path=MODEL_PATH,
+        keep_checkpoints=cfg.get("model", {}).get("keep_last", 3),
+        curve_path=cfg.get("evaluation", {}).get("curve_path"),
+        spool_path=UPLOAD_PATH,
+        schema=schema,
+        resume=RESUME,
     )
     ip = f"[::]:{cfg['fed_avg']['port']}"
+    # global rounds: each one pushes the global model down and runs
+    # the edge rounds of every edge server (edge config.num_rounds)
     config = ServerConfig(
-        num_rounds=1, # orchestrator will simply aggregate the results
+        num_rounds=cfg["config"]["num_rounds"],
     )
 
     try:
@@ -83,6 +267,9 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, _signal_handler)
 
     print(f"Starting Orchestrator...")
+    if not RESUME:
+        # before GET /model is served: edge servers must not warm start from a previous run
+        clear_models()
     web_server.start()
     print(f"Orchestrator running on {cfg['network']['ip']}:{cfg['network']['port']}")
     print("Starting Flower server...")
@@ -0,0 +1,9 @@
+clear
+
+# Runs the orchestrator and its edge servers as local processes (no Docker needed).
+# Clients can be started with: PYTHONPATH=. python3 client/client.py --config <config> --client_id <client_id>
+# the repository root is on the path for the modules in common/
+export PYTHONPATH="$(pwd)${PYTHONPATH:+:$PYTHONPATH}"
+python3 orchestrator/orchestrator.py \
+  --config "orchestrator/configs/config.yaml" \
+  --backend local
@@ -0,0 +1,14 @@
+"""In-process simulation of the client / edge server / orchestrator hierarchy.
+Run it from the repository root with `python -m simulation --config simulation/configs/config.yaml`.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the tiers use script-style imports (`from strategy import ...`, `from coordinator import ...`),
+# resolved in this order: repository root, client, orchestrator, edge server
+for _path in (os.path.join(ROOT, "orchestrator", "edge_server"), os.path.join(ROOT, "orchestrator"),
+              os.path.join(ROOT, "client"), ROOT):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
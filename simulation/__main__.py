@@ -0,0 +1,20 @@
+import argparse
+
+from simulation.engine import Simulation, load_yaml
+
+parser = argparse.ArgumentParser(description="In-process simulation of the hierarchical federated learning system")
+parser.add_argument(
+    "--config", type=str, default="simulation/configs/config.yaml", help="Path to the simulation config file"
+)
+parser.add_argument("--clients", type=int, default=None, help="Number of virtual clients (overrides the config file)")
+parser.add_argument("--rounds", type=int, default=None, help="Number of global rounds (overrides the config file)")
+args = parser.parse_args()
+
+config = load_yaml(args.config)
+if args.clients is not None:
+    config["simulation"]["num_clients"] = args.clients
+if args.rounds is not None:
+    config["simulation"]["num_rounds"] = args.rounds
+
+if __name__ == "__main__":
+    Simulation(config).run()
@@ -0,0 +1,294 @@
+"""Simulation engine: the real strategies and coordinator of the hierarchy, without gRPC.
+
+- clients are FlowerClient instances multiplexed over a pool of workers (simulation.worker)
+  and reading their shard from one shared, memory mapped dataset cache;
+- edge servers are FedAvgLogger/FedBuffLogger strategies driven by a Flower Server whose
+  clients are VirtualClientProxy objects, plus the EdgeAggregatorClient facing upwards;
+- the orchestrator is the FedAvgGlobal strategy driven by a Flower Server whose clients
+  are EdgeProxy objects;
+- clients are placed on edge servers by a CoordinatorBase, exactly as by the orchestrator.
+"""
+import contextlib
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import torch
+import yaml
+from flwr.common import Code, EvaluateRes, FitRes, Status, ndarrays_to_parameters, parameters_to_ndarrays
+from flwr.server import Server
+from flwr.server.client_manager import SimpleClientManager
+
+from simulation import ROOT, worker
+from simulation.proxies import VirtualClientProxy, EdgeProxy
+from coordinator import CoordinatorBase
+from strategy import FedAvgLogger, FedBuffLogger
+from BufferedServer import BufferedServer
+from DeadlineServer import DeadlineServer
+from selection import ClientSelector
+from EdgeAggregatorClient import EdgeAggregatorClient
+from global_strategy import FedAvgGlobal
+from fl_data import build_cache, CachedDataset, Partition, SyntheticImages
+from fl_utils.exchange import ParameterExchange
+from common.compression import UpdateCodec
+from common.models import build_model, model_schema
+from common.secagg import SecAggServer
+from common.telemetry import telemetry
+from common import log
+
+
+def load_yaml(path: str) -> dict:
+    with open(path if os.path.isabs(path) else os.path.join(ROOT, path), "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+class SimulatedEdge:
+    """An edge server of the simulation, configured like `edge_server/server.py`."""
+
+    def __init__(self, name: str, cfg: dict, output_path: str, max_workers: int, report=None, schema=None):
+        self.name = name
+        fit_config = cfg.get("fit_config") or {}
+        strategy_kwargs = dict(
+            min_fit_clients=cfg["fed_avg"]["min_fit_clients"],
+            min_available_clients=cfg["fed_avg"]["min_available_clients"],
+            min_evaluate_clients=cfg["fed_avg"]["min_evaluate_clients"],
+            fraction_fit=cfg["fed_avg"]["fraction_fit"],
+            fraction_evaluate=cfg["fed_avg"]["fraction_evaluate"],
+            model_path=os.path.join(output_path, "models"),
+            log_path=os.path.join(output_path, "logs"),
+            keep_checkpoints=cfg["model"].get("keep_last", 3),
+            # a virtual client may run on a different worker each time: it holds no model
+            broadcast_cache=False,
+            server_name=name,
+            on_fit_config_fn=(lambda server_round: dict(fit_config)) if fit_config else None,
+            secagg=SecAggServer.from_config(cfg.get("secagg")),
+            selector=ClientSelector.from_config(cfg.get("selection"), report=report),
+            schema=schema,
+        )
+        self.client_manager = SimpleClientManager()
+        aggregation_cfg = cfg.get("aggregation", {})
+        if aggregation_cfg.get("mode", "sync") == "buffered":
+            self.strategy = FedBuffLogger(
+                buffer_size=aggregation_cfg.get("buffer_size", 2),
+                staleness_exponent=aggregation_cfg.get("staleness_exponent", 0.5),
+                server_lr=aggregation_cfg.get("server_lr", 1.0),
+                max_staleness=aggregation_cfg.get("max_staleness", 10),
+                **strategy_kwargs,
+            )
+            self.server = BufferedServer(client_manager=self.client_manager, strategy=self.strategy)
+        elif strategy_kwargs["selector"] is not None:
+            self.strategy = FedAvgLogger(**strategy_kwargs)
+            self.server = DeadlineServer(client_manager=self.client_manager, strategy=self.strategy)
+        else:
+            self.strategy = FedAvgLogger(**strategy_kwargs)
+            self.server = Server(client_manager=self.client_manager, strategy=self.strategy)
+        self.server.set_max_workers(max_workers)
+        self.client = EdgeAggregatorClient(
+            strategy=self.strategy,
+            server=self.server,
+            num_rounds=cfg["config"]["num_rounds"],
+            server_name=name,
+            log_path=os.path.join(output_path, "logs"),
+            codec=UpdateCodec.from_config(cfg.get("compression")),
+            evaluate_every=cfg.get("evaluation", {}).get("every", 1),
+            concurrent_evaluation=cfg.get("evaluation", {}).get("concurrent", True),
+        )
+        self.requested = {key: strategy_kwargs[key] for key in ("min_fit_clients", "min_available_clients", "min_evaluate_clients")}
+
+    def register(self, proxy: VirtualClientProxy):
+        """Attach a virtual client; the minimum numbers of clients never exceed the attached ones."""
+        self.client_manager.register(proxy)
+        available = self.client_manager.num_available()
+        for key, value in self.requested.items():
+            setattr(self.strategy, key, min(value, available))
+
+    def fit(self, parameters, config) -> FitRes:
+        """One global round: the edge rounds of EdgeAggregatorClient.fit, from the global model."""
+        update, num_examples, metrics = self.client.fit(parameters_to_ndarrays(parameters), config)
+        return FitRes(status=Status(code=Code.OK, message=""), parameters=ndarrays_to_parameters(update),
+                      num_examples=num_examples, metrics=metrics)
+
+    def evaluate(self, parameters, config) -> EvaluateRes:
+        loss, num_examples, metrics = self.client.evaluate(parameters_to_ndarrays(parameters), config)
+        return EvaluateRes(status=Status(code=Code.OK, message=""), loss=float(loss),
+                           num_examples=num_examples, metrics=metrics)
+
+    def close(self):
+        self.client.close()
+        if self.strategy.selector is not None:
+            self.strategy.selector.close()
+        self.strategy.checkpoints.close()
+
+
+class SimulatedCoordinator(CoordinatorBase):
+    """Coordinator whose edge servers are SimulatedEdge objects living in this process."""
+
+    def __init__(self, config, edge_factory):
+        super().__init__(config)
+        self.edge_factory = edge_factory
+        self.edges = {}
+
+    def _add_edge(self, edge_server_ip: str):
+        self.edges[edge_server_ip] = self.edge_factory(edge_server_ip)
+
+    def _remove_edge(self, edge_server_ip: str):
+        self.edge_servers.pop(edge_server_ip, None)
+        edge = self.edges.pop(edge_server_ip, None)
+        if edge is not None:
+            edge.close()
+
+    def _probe_edge(self, edge_server_ip: str, timeout: float = 1.0) -> bool:
+        return edge_server_ip in self.edges
+
+
+class Simulation:
+    """Runs the whole hierarchy described by a simulation config file."""
+
+    def __init__(self, config: dict):
+        self.config = config
+        sim = config["simulation"]
+        self.client_cfg = load_yaml(sim["client_config"])
+        self.edge_cfg = load_yaml(sim["edge_config"])
+        self.orchestrator_cfg = load_yaml(sim["orchestrator_config"])
+        self.num_clients = sim["num_clients"]
+        self.num_rounds = sim.get("num_rounds", self.orchestrator_cfg["config"]["num_rounds"])
+        self.workers = sim.get("workers", 0) or os.cpu_count()
+        self.output_path = os.path.abspath(sim.get("output_path", "./simulation_output"))
+        self.quiet = sim.get("quiet", True)
+        telemetry.configure(config.get("telemetry"), service="simulation")
+        log.configure(self.edge_cfg.get("logging"))
+        if self.quiet:
+            logging.getLogger("flwr").setLevel(logging.WARNING)
+
+    def prepare_data(self) -> dict:
+        """Build the shared dataset cache and the partition, and return the worker settings."""
+        sim = self.config["simulation"]
+        cache_dir = self.client_cfg.get("data", {}).get("cache_dir", "data/cache")
+        seed = self.client_cfg["training"].get("seed", 0)
+        if sim.get("dataset", "synthetic") == "synthetic":
+            samples = sim.get("synthetic_samples", 60000)
+            train_cache = build_cache(cache_dir, f"synthetic_{samples}_train", lambda: SyntheticImages(samples, seed=seed))
+            test_cache = build_cache(cache_dir, f"synthetic_{samples}_test", lambda: SyntheticImages(samples // 6, seed=seed + 1))
+        else:
+            from torchvision import datasets
+            train_cache = build_cache(cache_dir, "fashion_mnist_train", lambda: datasets.FashionMNIST(root="data", train=True, download=True))
+            test_cache = build_cache(cache_dir, "fashion_mnist_test", lambda: datasets.FashionMNIST(root="data", train=False, download=True))
+
+        partition_cfg = self.client_cfg.get("partition", {})
+        partition = Partition.load_or_build(
+            index_dir=partition_cfg.get("index_dir", "data/partitions"),
+            labels_path=train_cache[1],
+            scheme=partition_cfg.get("scheme", "iid"),
+            num_clients=self.num_clients,
+            alpha=partition_cfg.get("alpha", 0.5),
+            seed=seed,
+            min_size=partition_cfg.get("min_size", 1),
+        )
+        self.partition = partition
+        # every tier of the simulation runs the architecture of the client config, for the classes of the dataset
+        self.architecture = dict(self.client_cfg.get("model", {}).get("architecture") or {},
+                                 output_shape=CachedDataset(*train_cache).num_classes())
+        self.schema = model_schema(self.architecture)
+        test_size = len(CachedDataset(*test_cache))
+        generator = torch.Generator()
+        generator.manual_seed(seed)
+        validation_size = int(self.client_cfg["federated_split"]["validation"] * test_size)
+        return dict(
+            train_cache=train_cache,
+            test_cache=test_cache,
+            partition=(partition.offsets_path, partition.indices_path),
+            validation_indices=torch.randperm(test_size, generator=generator)[:validation_size].numpy(),
+            num_classes=CachedDataset(*train_cache).num_classes(),
+            architecture=self.architecture,
+            batch_size=self.client_cfg["training"]["batch_size"],
+            seed=seed,
+            compression=self.client_cfg.get("compression"),
+            training=self.client_cfg.get("training"),
+            torch_threads=sim.get("torch_threads", 1),
+            quiet=self.quiet,
+            telemetry=self.config.get("telemetry"),
+        )
+
+    def make_executor(self, settings: dict):
+        sim = self.config["simulation"]
+        if sim.get("executor", "process") == "thread":
+            worker.init_worker(settings, process_worker=False)
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="VirtualClient")
+        context = multiprocessing.get_context(sim.get("start_method", "spawn"))
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                   initializer=worker.init_worker, initargs=(settings,))
+
+    def place_clients(self, executor) -> SimulatedCoordinator:
+        """Allocate every virtual client through the coordinator and attach it to its edge server."""
+        sim = self.config["simulation"]
+        orchestrator_cfg = dict(self.orchestrator_cfg)
+        orchestrator_cfg["orchestrator"] = dict(
+            orchestrator_cfg["orchestrator"],
+            max_clients_per_edge_server=sim.get("clients_per_edge", orchestrator_cfg["orchestrator"]["max_clients_per_edge_server"]),
+            pool={"enabled": False},
+            state={"backend": "memory"},
+        )
+        coordinator = SimulatedCoordinator(
+            orchestrator_cfg,
+            # fit durations measured by the edge servers go straight to the placement of the coordinator
+            lambda name: SimulatedEdge(name, self.edge_cfg, self.output_path, max_workers=self.workers,
+                                       report=lambda stats: coordinator.record_client_stats(name, stats), schema=self.schema),
+        )
+        sizes = self.partition.sizes()
+        output = open(os.devnull, "w") if self.quiet else None
+        with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+            for i in range(self.num_clients):
+                coordinator.allocate(f"client_{i}", int(sizes[i]))
+            for edge in list(coordinator.edge_servers.values()):
+                edge.provisioned.wait()
+        for name, edge in list(coordinator.edge_servers.items()):
+            for client_id in list(edge.clients):
+                coordinator.edges[name].register(VirtualClientProxy(client_id, executor))
+        return coordinator
+
+    def run(self):
+        sim = self.config["simulation"]
+        start = time.perf_counter()
+        settings = self.prepare_data()
+        executor = self.make_executor(settings)
+        coordinator = self.place_clients(executor)
+        print(f"[LOG] {self.num_clients} clients on {len(coordinator.edges)} edge servers, "
+              f"{self.workers} {sim.get('executor', 'process')} workers, setup in {time.perf_counter() - start:.1f}s")
+
+        model = build_model(settings["architecture"])
+        fed_avg = self.orchestrator_cfg["fed_avg"]
+        num_edges = len(coordinator.edges)
+        strategy = FedAvgGlobal(
+            min_fit_clients=min(fed_avg["min_fit_clients"], num_edges),
+            min_available_clients=min(fed_avg["min_available_clients"], num_edges),
+            min_evaluate_clients=min(fed_avg["min_evaluate_clients"], num_edges),
+            fraction_fit=fed_avg["fraction_fit"],
+            fraction_evaluate=sim.get("fraction_evaluate", fed_avg["fraction_evaluate"]),
+            initial_parameters=ndarrays_to_parameters(ParameterExchange(model).get_ndarrays()),
+            model_path=os.path.join(self.output_path, "models", "global"),
+            curve_path=os.path.join(self.output_path, "evaluation.jsonl"),
+            schema=self.schema,
+        )
+        server = Server(client_manager=SimpleClientManager(), strategy=strategy)
+        server.set_max_workers(sim.get("edge_concurrency", 8))
+        edges = list(coordinator.edges.values())
+        for edge in edges:
+            server.client_manager().register(EdgeProxy(edge))
+
+        try:
+            history, elapsed = server.fit(num_rounds=self.num_rounds, timeout=None)
+        finally:
+            # edges first: they wait for their evaluation in progress, run on the workers
+            coordinator.cleanup_edge_servers()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        fits = sum(edge.client.client_updates for edge in edges)
+        print(f"[LOG] {self.num_rounds} global rounds in {elapsed:.1f}s, {fits} client fits ({fits / elapsed:.1f}/s)")
+        for rnd, loss in history.losses_distributed:
+            print(f"[LOG] Round {rnd} distributed loss: {loss:.4f}")
+        for rnd, accuracy in history.metrics_distributed_fit.get("eval_accuracy", []):
+            print(f"[LOG] Round {rnd} global accuracy (edge evaluations): {accuracy:.4f}")
+        return history
@@ -0,0 +1,58 @@
+"""Flower ClientProxy implementations used by the simulation in place of gRPC connections."""
+from flwr.common import (
+    Code, DisconnectRes, EvaluateRes, FitRes, GetParametersRes, GetPropertiesRes, Parameters, Status,
+)
+from flwr.server.client_proxy import ClientProxy
+
+from simulation import worker
+
+OK = Status(code=Code.OK, message="")
+
+
+class VirtualClientProxy(ClientProxy):
+    """A simulated client, run on the worker pool of the simulation."""
+
+    def __init__(self, cid: str, executor):
+        super().__init__(cid)
+        self.executor = executor
+
+    def fit(self, ins, timeout, group_id) -> FitRes:
+        parameters, num_examples, metrics = self.executor.submit(worker.fit, self.cid, ins.parameters, ins.config).result(timeout)
+        return FitRes(status=OK, parameters=parameters, num_examples=num_examples, metrics=metrics)
+
+    def evaluate(self, ins, timeout, group_id) -> EvaluateRes:
+        loss, num_examples, metrics = self.executor.submit(worker.evaluate, self.cid, ins.parameters, ins.config).result(timeout)
+        return EvaluateRes(status=OK, loss=loss, num_examples=num_examples, metrics=metrics)
+
+    def get_parameters(self, ins, timeout, group_id) -> GetParametersRes:
+        return GetParametersRes(status=OK, parameters=Parameters(tensors=[], tensor_type="numpy.ndarray"))
+
+    def get_properties(self, ins, timeout, group_id) -> GetPropertiesRes:
+        properties = self.executor.submit(worker.properties, self.cid, ins.config).result(timeout)
+        return GetPropertiesRes(status=OK, properties=properties)
+
+    def reconnect(self, ins, timeout, group_id) -> DisconnectRes:
+        return DisconnectRes(reason="")
+
+
+class EdgeProxy(ClientProxy):
+    """A simulated edge server, seen by the orchestrator as one of its clients."""
+
+    def __init__(self, edge):
+        super().__init__(edge.name)
+        self.edge = edge
+
+    def fit(self, ins, timeout, group_id) -> FitRes:
+        return self.edge.fit(ins.parameters, ins.config)
+
+    def evaluate(self, ins, timeout, group_id) -> EvaluateRes:
+        return self.edge.evaluate(ins.parameters, ins.config)
+
+    def get_parameters(self, ins, timeout, group_id) -> GetParametersRes:
+        return GetParametersRes(status=OK, parameters=self.edge.server.parameters)
+
+    def get_properties(self, ins, timeout, group_id) -> GetPropertiesRes:
+        return GetPropertiesRes(status=OK, properties={"clients": self.edge.client_manager.num_available()})
+
+    def reconnect(self, ins, timeout, group_id) -> DisconnectRes:
+        return DisconnectRes(reason="")
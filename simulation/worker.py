@@ -0,0 +1,88 @@
+"""Virtual clients: a few FlowerClient instances multiplexed over all the simulated clients.
+Each worker (process or thread) builds one FlowerClient on its first task, then every task
+only points it at the shard of the virtual client it runs. The dataset is a memory mapped
+cache shared by all the workers."""
+import os
+import sys
+import threading
+import torch
+from torchmetrics import Accuracy
+from flwr.common import Parameters, ndarrays_to_parameters, parameters_to_ndarrays
+
+from FlowerClient import FlowerClient
+from fl_utils.trainer import LocalTrainer
+from fl_data import CachedDataset, Partition, make_loader
+from common.compression import UpdateCodec
+from common.models import build_model
+from common.secagg import SecAggClient
+from common.telemetry import telemetry
+
+_settings = None
+_local = threading.local()
+
+
+def init_worker(settings: dict, process_worker: bool = True):
+    """Worker initializer; `settings` is built by the simulation engine.
+    Thread workers share the output and the telemetry of the simulation process."""
+    global _settings
+    _settings = settings
+    torch.set_num_threads(settings.get("torch_threads", 1))
+    if not process_worker:
+        return
+    if settings.get("quiet"):
+        sys.stdout = sys.stderr = open(os.devnull, "w")
+    telemetry.configure(settings.get("telemetry"), service=f"simulation-worker{os.getpid()}")
+
+
+def _worker():
+    if getattr(_local, "client", None) is None:
+        s = _settings
+        model = build_model(s["architecture"])
+        validation = CachedDataset(*s["test_cache"], indices=s["validation_indices"])
+        # num_threads is left to the torch_threads setting of the simulation
+        training = {k: v for k, v in (s.get("training") or {}).items() if k != "num_threads"}
+        _local.client = FlowerClient(
+            model=model,
+            trainloader=None,
+            testloader=make_loader(validation, s["batch_size"]),
+            metric=Accuracy(task="multiclass", num_classes=s["num_classes"]),
+            trainer=LocalTrainer.from_config(model, training),
+        )
+        _local.partition = Partition(*s["partition"])
+        _local.secagg = {}
+    return _local.client, _local.partition
+
+
+def _secagg(cid: str) -> SecAggClient:
+    """Key pair of virtual client `cid`, derived from the seed: the same on every worker."""
+    secagg = _local.secagg.get(cid)
+    if secagg is None:
+        secagg = _local.secagg[cid] = SecAggClient.from_seed(f"{_settings['seed']}:{cid}")
+    return secagg
+
+
+def fit(cid: str, parameters: Parameters, config: dict):
+    """Train virtual client `cid` from the given global model."""
+    client, partition = _worker()
+    shard = CachedDataset(*_settings["train_cache"], indices=partition.shard(cid))
+    client.trainloader = make_loader(shard, _settings["batch_size"], shuffle=True, seed=_settings["seed"])
+    # error feedback and optimizer state are not carried across rounds: a virtual client may land on any worker
+    client.codec = UpdateCodec.from_config(_settings.get("compression"))
+    client.trainer.reset()
+    client.secagg = _secagg(cid)
+    client.client_id = cid
+    update, num_examples, metrics = client.fit(parameters_to_ndarrays(parameters), config)
+    return ndarrays_to_parameters(update), num_examples, metrics
+
+
+def evaluate(cid: str, parameters: Parameters, config: dict):
+    """Evaluate the given model on the validation set, as virtual client `cid`."""
+    client, _ = _worker()
+    return client.evaluate(parameters_to_ndarrays(parameters), config)
+
+
+def properties(cid: str, config: dict):
+    """Properties of virtual client `cid` (its secure aggregation public key)."""
+    client, _ = _worker()
+    client.secagg = _secagg(cid)
+    return client.get_properties(config)